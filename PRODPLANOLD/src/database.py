@@ -1,8 +1,11 @@
 from __future__ import annotations
+import logging
 import sqlite3
 from pathlib import Path
 from typing import Optional
 
+logger = logging.getLogger('prodplan.db')
+
 DEFAULT_DB_PATH = Path("data/specifications.db")
 DATA_DIR = DEFAULT_DB_PATH.parent
 
@@ -32,17 +35,82 @@ def init_database(db_path: Optional[Path] = None) -> None:
     """
     with get_connection(db_path) as conn:
         conn.executescript(SCHEMA_SQL)
-        # Миграции схемы: добавить недостающие колонки в items (идемпотентно)
-        try:
-            cols = conn.execute("PRAGMA table_info(items)").fetchall()
-            col_names = {str(c[1]) for c in cols}
-            if "stock_qty" not in col_names:
-                conn.execute("ALTER TABLE items ADD COLUMN stock_qty REAL DEFAULT 0.0")
-            if "item_article" not in col_names:
-                conn.execute("ALTER TABLE items ADD COLUMN item_article TEXT")
-        except Exception:
-            # Мягкий фоллбек: не роняем инициализацию, если ALTER недоступен (старые SQLite и пр.)
-            pass
+        _ensure_items_columns(conn)
+        _ensure_plan_entries_key(conn)
+
+
+def _ensure_items_columns(conn: sqlite3.Connection) -> None:
+    """
+    Миграции схемы items (идемпотентно, один раз при инициализации БД):
+    недостающие колонки, в т.ч. поля синхронизации номенклатуры 1С, и индекс по item_ref1c.
+    """
+    try:
+        cols = conn.execute("PRAGMA table_info(items)").fetchall()
+        col_names = {str(c[1]) for c in cols}
+        if "stock_qty" not in col_names:
+            conn.execute("ALTER TABLE items ADD COLUMN stock_qty REAL DEFAULT 0.0")
+        if "item_article" not in col_names:
+            conn.execute("ALTER TABLE items ADD COLUMN item_article TEXT")
+        if "item_ref1c" not in col_names:
+            conn.execute("ALTER TABLE items ADD COLUMN item_ref1c TEXT")
+        if "replenishment_method" not in col_names:
+            conn.execute("ALTER TABLE items ADD COLUMN replenishment_method TEXT")
+        if "replenishment_time" not in col_names:
+            conn.execute("ALTER TABLE items ADD COLUMN replenishment_time INTEGER")
+    except Exception:
+        # Мягкий фоллбек: не роняем инициализацию, если ALTER недоступен (старые SQLite и пр.)
+        pass
+    try:
+        conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS ux_items_ref1c ON items(item_ref1c)")
+    except Exception:
+        # например, в старых данных есть дубликаты item_ref1c
+        pass
+    # Индексы под постраничный просмотр плана по ключу (поле сортировки, item_id):
+    # item_id — rowid, он уже входит в каждый индекс, поэтому достаточно одной колонки
+    try:
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_items_name ON items(item_name)")
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_items_article ON items(COALESCE(item_article, ''))")
+    except Exception:
+        pass
+
+# Версия схемы в PRAGMA user_version: разовые миграции данных выполняются только при её повышении
+# 1 — уникальный ключ плана ux_plan_item_stagekey_date (повторы при stage_id IS NULL схлопнуты)
+SCHEMA_VERSION_PLAN_KEY = 1
+
+
+def _ensure_plan_entries_key(conn: sqlite3.Connection) -> None:
+    """
+    Разовая миграция (user_version < SCHEMA_VERSION_PLAN_KEY): уникальный ключ плана
+    (item_id, COALESCE(stage_id, -1), date) для INSERT ... ON CONFLICT.
+    Индекс ux_plan_item_stage_date не ловит повторы при stage_id IS NULL (NULL != NULL),
+    поэтому перед созданием индекса такие дубликаты схлопываются до последней записи (с записью в лог).
+    Если индекс создать не удалось, версия не повышается, а запись плана идёт через UPDATE + INSERT.
+    """
+    version = int(conn.execute("PRAGMA user_version").fetchone()[0])
+    if version >= SCHEMA_VERSION_PLAN_KEY:
+        return
+    try:
+        with conn:
+            merged = conn.execute(
+                """
+                DELETE FROM production_plan_entries
+                 WHERE id NOT IN (
+                       SELECT MAX(id) FROM production_plan_entries
+                        GROUP BY item_id, COALESCE(stage_id, -1), date
+                 )
+                """
+            ).rowcount
+            conn.execute(
+                "CREATE UNIQUE INDEX IF NOT EXISTS ux_plan_item_stagekey_date "
+                "ON production_plan_entries(item_id, COALESCE(stage_id, -1), date)"
+            )
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION_PLAN_KEY}")
+    except sqlite3.Error:
+        logger.exception("Миграция плана: не удалось создать ux_plan_item_stagekey_date, изменения отменены")
+        return
+    if merged:
+        logger.warning("Миграция плана: объединено повторяющихся записей production_plan_entries: %d", merged)
+
 
 SCHEMA_SQL = """
 PRAGMA foreign_keys = ON;
@@ -129,6 +197,9 @@ CREATE TABLE IF NOT EXISTS production_plan_entries (
 CREATE UNIQUE INDEX IF NOT EXISTS ux_plan_item_stage_date
   ON production_plan_entries(item_id, stage_id, date);
 CREATE INDEX IF NOT EXISTS ix_plan_stage_date ON production_plan_entries(stage_id, date);
+-- Покрывающий индекс для агрегатов плана по окну дат: диапазон по date без обращения к таблице
+CREATE INDEX IF NOT EXISTS ix_plan_date_item_stage_qty
+  ON production_plan_entries(date, item_id, stage_id, planned_qty);
 
 -- Пользовательские заказы (на закупку/производство)
 CREATE TABLE IF NOT EXISTS user_orders (
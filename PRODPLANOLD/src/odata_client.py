@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import json
+import os
 import urllib.request
 import urllib.parse
 import urllib.error
@@ -8,6 +9,21 @@ from typing import Dict, List, Optional, Any
 from pathlib import Path
 
 
+_METADATA_SUFFIX = "$metadata"
+
+
+def normalize_base_url(u: Optional[str]) -> str:
+    """
+    Базовый URL OData без завершающих "/" и "$metadata"
+    (суффикс убирается, если его по ошибке указали как базовый URL; регистр не важен).
+    """
+    s = (u or "").strip().rstrip("/")
+    n = len(_METADATA_SUFFIX)
+    if s[-n:].lower() == _METADATA_SUFFIX:
+        s = s[:-n].rstrip("/")
+    return s
+
+
 class OData1CClient:
     """
     Клиент для работы с OData API 1С.
@@ -24,12 +40,7 @@ class OData1CClient:
             password: Пароль для Basic аутентификации
             token: Токен для Bearer аутентификации
         """
-        # Нормализация base_url:
-        # - убираем конечный "/$metadata" если его по ошибке указали как базовый URL
-        u = (base_url or "").strip().rstrip("/")
-        if u.lower().endswith("$metadata"):
-            u = u[: -len("$metadata")].rstrip("/")
-        self.base_url = u
+        self.base_url = normalize_base_url(base_url)
 
         self.username = username
         self.password = password
@@ -41,16 +52,21 @@ class OData1CClient:
             'Content-Type': 'application/json'
         }
     
-    def _make_request(self, endpoint: str, params: Optional[Dict[str, Any]] = None, timeout: int = 60) -> Dict[str, Any]:
+    def _make_request(self, endpoint: str, params: Optional[Dict[str, Any]] = None, timeout: int = 60,
+                      stream_to: Optional[Path] = None,
+                      extra_headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
         """
         Выполнить GET запрос к OData сервису.
         
         Args:
             endpoint: Конечная точка API
             params: Параметры запроса
+            stream_to: Файл, в который тело ответа пишется блоками без декодирования (для крупного $metadata)
+            extra_headers: Дополнительные заголовки (например, If-None-Match / If-Modified-Since)
             
         Returns:
-            Результат запроса в формате JSON
+            Результат запроса в формате JSON; при stream_to — {"_file", "_bytes", "_etag", "_last_modified", ...};
+            при ответе 304 Not Modified — {"_not_modified": True, "_url"}
             
         Raises:
             urllib.error.URLError: При ошибках запроса
@@ -71,6 +87,9 @@ class OData1CClient:
         # Добавляем заголовки
         for key, value in self.default_headers.items():
             request.add_header(key, value)
+        for key, value in (extra_headers or {}).items():
+            if value:
+                request.add_header(key, value)
         
         # Настройка аутентификации
         if self.token:
@@ -84,6 +103,8 @@ class OData1CClient:
         # Выполняем запрос
         try:
             with urllib.request.urlopen(request, timeout=timeout) as response:
+                if stream_to is not None:
+                    return self._stream_response(response, Path(stream_to), url)
                 data = response.read()
                 # Определяем тип контента и пытаемся корректно разобрать ответ
                 content_type = ""
@@ -101,10 +122,14 @@ class OData1CClient:
                 # Это покрывает, например, $metadata, который обычно отдаётся в XML/EDMX
                 return {
                     "_raw": text,
+                    "_bytes": len(data),
                     "_content_type": content_type,
                     "_url": url,
                 }
         except urllib.error.HTTPError as e:
+            # Условный запрос: ресурс не изменился, тело не передаётся
+            if e.code == 304:
+                return {"_not_modified": True, "_url": url}
             # Читаем тело ошибки для лучшей диагностики
             error_data = ""
             try:
@@ -114,6 +139,43 @@ class OData1CClient:
             raise urllib.error.URLError(f"HTTP Error {e.code}: {e.reason}. URL: {url}. Details: {error_data}")
         except urllib.error.URLError as e:
             raise urllib.error.URLError(f"URL Error: {str(e)}. URL: {url}")
+
+    @staticmethod
+    def _stream_response(response, path: Path, url: str, chunk_size: int = 65536) -> Dict[str, Any]:
+        """
+        Записать тело ответа в файл блоками по chunk_size байт, не держа его целиком в памяти.
+        Запись идёт во временный файл <path>.part и заменяет path только после полного приёма тела:
+        при обрыве соединения прежний файл остаётся нетронутым.
+        """
+        path.parent.mkdir(parents=True, exist_ok=True)
+        part = path.with_name(path.name + '.part')
+        total = 0
+        try:
+            with open(part, 'wb') as f:
+                while True:
+                    chunk = response.read(chunk_size)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    total += len(chunk)
+            os.replace(part, path)
+        except BaseException:
+            part.unlink(missing_ok=True)
+            raise
+        headers = getattr(response, 'headers', None)
+        try:
+            content_type = headers.get('Content-Type', '') or ""
+        except Exception:
+            content_type = ""
+        return {
+            "_file": str(path),
+            "_bytes": total,
+            "_content_type": content_type,
+            "_etag": (headers.get('ETag') if headers is not None else None) or None,
+            "_last_modified": (headers.get('Last-Modified') if headers is not None else None) or None,
+            "_url": url,
+        }
+
     def _sanitize_select_fields(self, select_fields: Optional[List[str]]) -> Optional[List[str]]:
         """
         Удалить из $select вложенные пути (field/subfield), т.к. не все сущности поддерживают навигацию/expand.
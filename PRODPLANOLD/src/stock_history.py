@@ -14,7 +14,10 @@ from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Dict, Optional, List, Tuple, Union
 
-from .database import get_connection
+from .database import get_connection, DEFAULT_DB_PATH
+
+# Пути БД, для которых таблица истории уже инициализирована в этом процессе
+_initialized: set[Path] = set()
 
 
 def init_stock_history_table(db_path: Optional[Path] = None) -> None:
@@ -240,8 +243,11 @@ def sync_stock_with_history(
     
     # Если не в режиме пробного запуска, сохраняем снимок
     if not dry_run:
-        # Инициализируем таблицу истории (если еще не создана)
-        init_stock_history_table(Path(db_path) if db_path else None)
+        # Инициализируем таблицу истории (один раз на процесс для каждого пути БД)
+        history_db = Path(db_path) if db_path else DEFAULT_DB_PATH
+        if history_db not in _initialized:
+            init_stock_history_table(history_db)
+            _initialized.add(history_db)
         
         # Сохраняем текущие остатки как снимок
         save_stock_snapshot(Path(db_path) if db_path else None)
@@ -9,23 +9,97 @@ PRODPLAN: Точка входа NiceGUI
 """
 
 from nicegui import ui, app as ng_app
-from fastapi import FastAPI, BackgroundTasks
-from fastapi.responses import StreamingResponse
-from pydantic import BaseModel
+from fastapi import FastAPI, Request
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field, field_validator
+from collections import deque
+from dataclasses import dataclass, replace
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from typing import Optional, Tuple
+from datetime import date, datetime
+import asyncio
+import logging
+import threading
+import zlib
+import importlib.util
+import csv
 import io
-import pandas as pd
+from openpyxl import Workbook
 from pathlib import Path
 import json
-import requests
-from src.odata_client import OData1CClient
+import os
+import httpx
+import ijson  # потоковый разбор JSON-страниц OData
+import orjson  # быстрая (де)сериализация JSON
+import pyarrow as pa
+import pyarrow.parquet as pq  # полная выгрузка номенклатуры в Parquet
+from apscheduler.schedulers.asyncio import AsyncIOScheduler  # планировщик автосинхронизации
+from apscheduler.triggers.interval import IntervalTrigger
 from src.database import init_database, get_connection
+from src.odata_client import normalize_base_url
 from src.planner import generate_production_plan
+from src.stock_history import sync_stock_with_history
+from .services.search_service import search_items_with_index
+from .services.sync_schedule import ScheduleCfg, parse_schedule_cfg, should_run
+from .services.odata_files import (
+    LAST_SYNC_PATH,
+    ODATA_CONFIG_PATH,
+    OUTPUT_GROUPS,
+    OUTPUT_GROUPS_FOLDERS,
+    OUTPUT_SUMMARY,
+    METADATA_CHUNK_BYTES,
+    OUTPUT_XML,
+    OUTPUT_XML_VALIDATORS,
+    SYNC_CONFIG_PATH,
+    MetadataSummaryFeed,
+    json_loads,
+    mtime_cached,
+    parse_metadata_summary,
+    write_bytes_atomic,
+    write_json,
+)
 from .services.plan_service import query_plan_overview_paginated, fetch_plan_dataset, query_plan_matrix_paginated, upsert_plan_entry, delete_plan_rows_for_item, bulk_upsert_plan_entries, ensure_root_product_by_code
 
 
+class _RingBufferHandler(logging.Handler):
+    """Хранит последние capacity записей лога в памяти (для /sync/logs)."""
+
+    def __init__(self, capacity: int = 1024):
+        super().__init__(logging.INFO)
+        self._records: deque = deque(maxlen=capacity)
+        self._lock_ring = threading.Lock()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        entry = {'ts': record.created, 'level': record.levelname, 'message': record.getMessage()}
+        with self._lock_ring:
+            self._records.append(entry)
+
+    def snapshot(self, limit: int) -> list:
+        with self._lock_ring:
+            items = list(self._records)
+        return items[-limit:]
+
+
+# Диагностика фоновых задач: INFO — в кольцевой буфер, в консоль — только WARNING и выше
+logger = logging.getLogger('prodplan.sync')
+logger.setLevel(logging.INFO)
+logger.propagate = False
+_log_ring = _RingBufferHandler(capacity=1024)
+logger.addHandler(_log_ring)
+_log_console = logging.StreamHandler()
+_log_console.setLevel(logging.WARNING)
+_log_console.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(message)s'))
+logger.addHandler(_log_console)
+
+
 # FastAPI приложение для API-эндпоинтов (монтируется внутрь NiceGUI)
-fastapi_app = FastAPI(title='PRODPLAN API', version='1.6')
+fastapi_app = FastAPI(
+    title='PRODPLAN API',
+    version='1.6',
+    # ответы API сериализуются orjson
+    default_response_class=ORJSONResponse,
+)
 
 
 @fastapi_app.get('/health')
@@ -40,7 +114,17 @@ class GeneratePlanReq(BaseModel):
     start_date: Optional[str] = None
     out: Optional[str] = 'output/production_plan.xlsx'
     db: Optional[str] = None
-    auto_width: Optional[bool] = True
+    auto_width: bool = True
+
+    @field_validator('days', mode='before')
+    @classmethod
+    def _days_default(cls, v):
+        return v or 30
+
+    @field_validator('auto_width', mode='before')
+    @classmethod
+    def _auto_width_default(cls, v):
+        return True if v is None else v
 
 class SyncStockHistoryReq(BaseModel):
     dir: Optional[str] = 'ostatki'
@@ -53,49 +137,63 @@ class SyncSpecsReq(BaseModel):
     db: Optional[str] = None
 
 
-class PlanQueryReq(BaseModel):
-    start_date: Optional[str] = None
-    days: int = 30
+def _today_iso() -> str:
+    return date.today().isoformat()
+
+
+class _PlanWindowReq(BaseModel):
+    """Общие поля окна плана; пустые значения заменяются значениями по умолчанию при валидации."""
+    start_date: str = Field(default_factory=_today_iso)
+    days: int = Field(30, ge=1, le=1000)
     stage_id: Optional[int] = None
-    page: int = 1
-    page_size: int = 50
-    sort_by: str = 'item_name'
-    sort_dir: str = 'asc'
     db: Optional[str] = None
 
-class PlanMatrixReq(BaseModel):
-    start_date: Optional[str] = None
-    days: int = 30
-    stage_id: Optional[int] = None
-    page: int = 1
-    page_size: int = 30
+    @field_validator('start_date', mode='before')
+    @classmethod
+    def _start_date_default(cls, v):
+        return v or _today_iso()
+
+    @field_validator('days', mode='before')
+    @classmethod
+    def _days_default(cls, v):
+        return v or 30
+
+
+class PlanQueryReq(_PlanWindowReq):
+    page: int = Field(1, ge=1)
+    page_size: int = Field(50, ge=1, le=1000)
     sort_by: str = 'item_name'
     sort_dir: str = 'asc'
-    db: Optional[str] = None
+    # Курсор следующей страницы (next_cursor из предыдущего ответа) — выборка по ключу вместо OFFSET
+    cursor: Optional[str] = None
+
+    @field_validator('page', 'page_size', 'sort_by', 'sort_dir', mode='before')
+    @classmethod
+    def _empty_to_default(cls, v, info):
+        return v or cls.model_fields[info.field_name].default
+
+class PlanMatrixReq(PlanQueryReq):
+    page_size: int = Field(30, ge=1, le=1000)
 
 class UpsertPlanReq(BaseModel):
     item_id: int
     date: str
-    qty: int
+    qty: int = 0
     stage_id: Optional[int] = None
     db: Optional[str] = None
 
-class BulkUpsertEntry(BaseModel):
-    item_id: int
-    date: str
-    qty: int
-    stage_id: Optional[int] = None
+    @field_validator('date', mode='before')
+    @classmethod
+    def _strip_date(cls, v):
+        return str(v or '').strip()
 
-class BulkUpsertReq(BaseModel):
-    entries: list[BulkUpsertEntry] = []
-    db: Optional[str] = None
+    @field_validator('qty', mode='before')
+    @classmethod
+    def _qty_default(cls, v):
+        return v or 0
 
-class DeleteRowReq(BaseModel):
+class DeleteRowReq(_PlanWindowReq):
     item_id: int
-    start_date: Optional[str] = None
-    days: int = 30
-    stage_id: Optional[int] = None
-    db: Optional[str] = None
 
 
 class EnsureItemReq(BaseModel):
@@ -104,6 +202,16 @@ class EnsureItemReq(BaseModel):
     item_article: Optional[str] = None
     db: Optional[str] = None
 
+    @field_validator('item_code', mode='before')
+    @classmethod
+    def _strip_code(cls, v):
+        return str(v or '').strip()
+
+    @field_validator('item_name', 'item_article', mode='before')
+    @classmethod
+    def _empty_to_none(cls, v):
+        return v or None
+
 
 
 # Монтируем FastAPI в NiceGUI под /api
@@ -113,11 +221,61 @@ ng_app.mount('/api', fastapi_app)
 # Идемпотентная инициализация схемы БД (гарантирует наличие таблиц)
 init_database()
 
+# ---------------------------
+# Очередь фоновых задач
+# ---------------------------
+# Тяжёлые задачи выполняются по одной воркером; при переполнении очереди запрос отклоняется
+JOB_QUEUE_SIZE = 4
+_job_q: asyncio.Queue = asyncio.Queue(maxsize=JOB_QUEUE_SIZE)
+# Ссылки на запущенные фоновые задачи (чтобы asyncio не собрал их сборщиком мусора)
+_background_tasks: set = set()
+_BUSY_RESPONSE = {'status': 'busy', 'message': 'Очередь фоновых задач заполнена, повторите позже'}
+
+
+async def _job_worker() -> None:
+    while True:
+        job = await _job_q.get()
+        try:
+            await job()
+        except Exception:
+            logger.exception('[jobs] error')
+        finally:
+            _job_q.task_done()
+
+
+def _start_job_worker() -> None:
+    task = asyncio.create_task(_job_worker())
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+# Отдельный поток для блокирующей части фоновых задач (БД, файлы, генерация плана):
+# тяжёлая работа не занимает пул потоков по умолчанию, которым пользуются обработчики запросов
+_job_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='prodplan-job')
+
+
+def _run_blocking_job(fn, *args, **kwargs):
+    """Awaitable: выполняет fn в потоке фоновых задач."""
+    return asyncio.get_running_loop().run_in_executor(_job_executor, partial(fn, *args, **kwargs))
+
+
+def _enqueue_job(job) -> bool:
+    """Ставит корутинную функцию job в очередь; False — очередь заполнена."""
+    try:
+        _job_q.put_nowait(job)
+        return True
+    except asyncio.QueueFull:
+        return False
+
+
+ng_app.on_startup(_start_job_worker)
+ng_app.on_shutdown(lambda: _job_executor.shutdown(wait=False))
+
 # ---------------------------
 # API эндпоинты фоновых операций
 # ---------------------------
 @fastapi_app.post('/generate/plan')
-async def api_generate_plan(req: GeneratePlanReq, bg: BackgroundTasks):
+async def api_generate_plan(req: GeneratePlanReq):
     def _task():
         try:
             out_path = Path(req.out) if req.out else Path('output/production_plan.xlsx')
@@ -125,26 +283,27 @@ async def api_generate_plan(req: GeneratePlanReq, bg: BackgroundTasks):
             result_path = generate_production_plan(
                 db_path=db_path,
                 output_path=out_path,
-                horizon_days=int(req.days or 30),
-                start_date=None if not req.start_date else __import__('datetime').date.fromisoformat(req.start_date),
-                auto_width=True if req.auto_width is None else bool(req.auto_width),
+                horizon_days=req.days,
+                start_date=None if not req.start_date else date.fromisoformat(req.start_date),
+                auto_width=req.auto_width,
             )
-            print(f'[generate/plan] done: {result_path}')
-        except Exception as e:
-            print(f'[generate/plan] error: {e!r}')
-    bg.add_task(_task)
-    return {'status': 'accepted', 'message': 'Генерация плана запущена в фоне', 'out': req.out, 'auto_width': True if req.auto_width is None else bool(req.auto_width)}
+            logger.info('[generate/plan] done: %s', result_path)
+        except Exception:
+            logger.exception('[generate/plan] error')
+    if not _enqueue_job(lambda: _run_blocking_job(_task)):
+        return _BUSY_RESPONSE
+    return {'status': 'accepted', 'message': 'Генерация плана запущена в фоне', 'out': req.out, 'auto_width': req.auto_width}
 
 @fastapi_app.post('/sync/stock-history')
-async def api_sync_stock_history(req: SyncStockHistoryReq, bg: BackgroundTasks):
+async def api_sync_stock_history(req: SyncStockHistoryReq):
     def _task():
         try:
-            from src.stock_history import sync_stock_with_history
-            sync_stock_with_history(stock_path=req.dir, db_path=req.db, dry_run=bool(req.dry_run))
-            print(f'[sync/stock-history] done (dir={req.dir}, dry_run={req.dry_run})')
-        except Exception as e:
-            print(f'[sync/stock-history] error: {e!r}')
-    bg.add_task(_task)
+            sync_stock_with_history(stock_path=req.dir, db_path=req.db, dry_run=req.dry_run)
+            logger.info('[sync/stock-history] done (dir=%s, dry_run=%s)', req.dir, req.dry_run)
+        except Exception:
+            logger.exception('[sync/stock-history] error')
+    if not _enqueue_job(lambda: _run_blocking_job(_task)):
+        return _BUSY_RESPONSE
     return {'status': 'accepted', 'message': 'Синхронизация остатков (с историей) запущена в фоне', 'dir': req.dir, 'dry_run': req.dry_run}
 
 @fastapi_app.post('/sync/specs')
@@ -155,42 +314,44 @@ async def api_sync_specs(req: SyncSpecsReq):
 
 @fastapi_app.post('/plan/query')
 async def api_plan_query(req: PlanQueryReq):
-    data = query_plan_overview_paginated(
-        start_date_str=req.start_date or __import__('datetime').date.today().isoformat(),
-        days=int(req.days or 30),
+    data = await asyncio.to_thread(
+        query_plan_overview_paginated,
+        start_date_str=req.start_date,
+        days=req.days,
         stage_id=req.stage_id,
-        page=int(req.page or 1),
-        page_size=int(req.page_size or 50),
-        sort_by=req.sort_by or 'item_name',
-        sort_dir=req.sort_dir or 'asc',
+        page=req.page,
+        page_size=req.page_size,
+        sort_by=req.sort_by,
+        sort_dir=req.sort_dir,
         db_path=req.db,
+        cursor=req.cursor,
     )
     return data
 
 
 @fastapi_app.post('/plan/matrix')
 async def api_plan_matrix(req: PlanMatrixReq):
-    data = query_plan_matrix_paginated(
-        start_date_str=req.start_date or __import__('datetime').date.today().isoformat(),
-        days=int(req.days or 30),
+    data = await asyncio.to_thread(
+        query_plan_matrix_paginated,
+        start_date_str=req.start_date,
+        days=req.days,
         stage_id=req.stage_id,
-        page=int(req.page or 1),
-        page_size=int(req.page_size or 30),
-        sort_by=req.sort_by or 'item_name',
-        sort_dir=req.sort_dir or 'asc',
+        page=req.page,
+        page_size=req.page_size,
+        sort_by=req.sort_by,
+        sort_dir=req.sort_dir,
         db_path=req.db,
+        cursor=req.cursor,
     )
     return data
 
 @fastapi_app.post('/plan/upsert')
 async def api_plan_upsert(req: UpsertPlanReq):
     try:
-        d = str(req.date or '').strip()
-        qty = int(req.qty or 0)
         upsert_plan_entry(
-            item_id=int(req.item_id),
-            date_str=d,
-            planned_qty=qty,
+            item_id=req.item_id,
+            date_str=req.date,
+            planned_qty=req.qty,
             stage_id=req.stage_id,
             db_path=req.db,
         )
@@ -207,9 +368,9 @@ async def api_plan_ensure_item(req: EnsureItemReq):
     """
     try:
         item_id = ensure_root_product_by_code(
-            item_code=str(req.item_code or '').strip(),
-            item_name=(req.item_name or None),
-            item_article=(req.item_article or None),
+            item_code=req.item_code,
+            item_name=req.item_name,
+            item_article=req.item_article,
             db_path=req.db,
         )
         return {'status': 'ok', 'item_id': int(item_id)}
@@ -217,18 +378,24 @@ async def api_plan_ensure_item(req: EnsureItemReq):
         return {'status': 'error', 'message': str(e)}
 
 @fastapi_app.post('/plan/bulk_upsert')
-async def api_plan_bulk_upsert(req: BulkUpsertReq):
+async def api_plan_bulk_upsert(request: Request):
+    """
+    Пакетное сохранение изменений матрицы плана.
+    Тело: {entries: [{item_id, date, qty, stage_id?}], db?}. Проверяется только «конверт» запроса,
+    записи валидируются и приводятся к типам один раз — в bulk_upsert_plan_entries.
+    """
     try:
-        payload = [
-            {
-                'item_id': int(e.item_id),
-                'date': str(e.date),
-                'qty': int(e.qty),
-                'stage_id': (int(e.stage_id) if e.stage_id is not None and str(e.stage_id).strip() != '' else None),
-            }
-            for e in (req.entries or [])
-        ]
-        saved = bulk_upsert_plan_entries(payload, db_path=req.db)
+        payload = await request.json()
+        if not isinstance(payload, dict):
+            return {'status': 'error', 'message': 'Ожидается JSON-объект {entries: [...]}'}
+        entries = payload.get('entries') or []
+        db = payload.get('db')
+        if not isinstance(entries, list):
+            return {'status': 'error', 'message': 'Поле entries должно быть списком'}
+        if db is not None and not isinstance(db, str):
+            return {'status': 'error', 'message': 'Поле db должно быть строкой'}
+        # Одна транзакция на всю вставку — в пуле потоков, event loop остальных клиентов не блокируется
+        saved = await asyncio.to_thread(bulk_upsert_plan_entries, entries, db_path=db)
         return {'status': 'ok', 'saved': int(saved)}
     except Exception as e:
         return {'status': 'error', 'message': str(e)}
@@ -236,11 +403,10 @@ async def api_plan_bulk_upsert(req: BulkUpsertReq):
 @fastapi_app.post('/plan/delete_row')
 async def api_plan_delete_row(req: DeleteRowReq):
     try:
-        start_date = req.start_date or __import__('datetime').date.today().isoformat()
         deleted = delete_plan_rows_for_item(
-            start_date_str=start_date,
-            days=int(req.days or 30),
-            item_id=int(req.item_id),
+            start_date_str=req.start_date,
+            days=req.days,
+            item_id=req.item_id,
             stage_id=req.stage_id,
             db_path=req.db,
         )
@@ -249,6 +415,23 @@ async def api_plan_delete_row(req: DeleteRowReq):
         return {'status': 'error', 'message': str(e)}
 
 
+# Размер порции строк при потоковой выдаче CSV
+EXPORT_CSV_CHUNK_ROWS = 10_000
+
+
+def _plan_rows_to_xlsx(rows: list[dict], fields: list[str]) -> io.BytesIO:
+    # write-only книга openpyxl: строки пишутся потоком, без DataFrame
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('Sheet1')
+    ws.append(fields)
+    for r in rows:
+        ws.append([r.get(f) for f in fields])
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    buffer.seek(0)
+    return buffer
+
+
 @fastapi_app.get('/plan/export')
 async def api_plan_export(
     format: str = 'csv',
@@ -257,28 +440,39 @@ async def api_plan_export(
     stage_id: Optional[int] = None,
     db: Optional[str] = None,
 ):
-    rows = fetch_plan_dataset(
-        start_date_str=start_date or __import__('datetime').date.today().isoformat(),
+    rows = await asyncio.to_thread(
+        fetch_plan_dataset,
+        start_date_str=start_date or _today_iso(),
         days=int(days or 30),
         stage_id=stage_id,
         db_path=db,
     )
-    df = pd.DataFrame(rows)
+    fields = list(rows[0].keys()) if rows else []
     if format.lower() in {'excel', 'xlsx'}:
-        buffer = io.BytesIO()
-        with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
-            df.to_excel(writer, index=False)
-        buffer.seek(0)
+        buffer = await asyncio.to_thread(_plan_rows_to_xlsx, rows, fields)
         return StreamingResponse(
             buffer,
             media_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
             headers={'Content-Disposition': 'attachment; filename="plan_export.xlsx"'},
         )
     else:
-        csv_buf = io.StringIO()
-        df.to_csv(csv_buf, index=False)
+        def _csv_chunks():
+            # CSV отдаётся порциями: первый байт уходит клиенту без сборки всего файла в памяти.
+            # stdlib csv, а не pyarrow.csv: строки-словари пишутся как есть, без построения Arrow-таблицы
+            # (копия всех колонок и ошибка на разнотипных значениях)
+            buf = io.StringIO()
+            writer = csv.writer(buf, lineterminator='\n')
+            writer.writerow(fields)
+            for i in range(0, len(rows), EXPORT_CSV_CHUNK_ROWS):
+                writer.writerows([r.get(f) for f in fields] for r in rows[i:i + EXPORT_CSV_CHUNK_ROWS])
+                yield buf.getvalue()
+                buf.seek(0)
+                buf.truncate(0)
+            if buf.tell():
+                yield buf.getvalue()
+
         return StreamingResponse(
-            iter([csv_buf.getvalue()]),
+            _csv_chunks(),
             media_type='text/csv; charset=utf-8',
             headers={'Content-Disposition': 'attachment; filename="plan_export.csv"'},
         )
@@ -295,8 +489,6 @@ async def api_nomenclature_search(q: str = '', limit: int = 20):
     Возвращает {items: [{item_id?, item_name, item_article, item_code, label}], error?}
     """
     try:
-        # Импорт внутри обработчика, чтобы избежать циклов импорта при старте
-        from .services.search_service import search_items_with_index  # type: ignore
         limit = int(limit or 20)
         limit = max(1, min(50, limit))  # safety cap
 
@@ -330,80 +522,134 @@ class ODataConfigReq(BaseModel):
     username: Optional[str] = None
     password: Optional[str] = None
 
-CONFIG_PATH = Path('config') / 'odata_config.json'
-OUTPUT_XML = Path('output') / 'odata_metadata.xml'
-OUTPUT_SUMMARY = Path('output') / 'odata_metadata_summary.json'
-OUTPUT_GROUPS = Path('output') / 'odata_groups_nomenclature.json'
-# Полная выгрузка номенклатуры (результат синхронизации)
-OUTPUT_NOMENCLATURE_FULL = Path('output') / 'odata_catalog_nomenclature_full.json'
-# Файл отметки времени последней синхронизации
-LAST_SYNC_PATH = Path('config') / 'last_sync_time.json'
-# (опционально) выбранные группы каталога Номенклатура
-GROUPS_SELECTED_PATH = Path('config') / 'odata_groups_selected.json'
+# Полная выгрузка номенклатуры (результат синхронизации); прочие пути config/output — в services.odata_files.
+# Данные пишутся в Parquet; если pyarrow не может построить таблицу (разнотипные значения в колонке) —
+# в JSON {'value': [...], 'total': N}. Актуален ровно один из двух файлов: второй удаляется.
+OUTPUT_NOMENCLATURE_PARQUET = Path('output') / 'odata_catalog_nomenclature_full.parquet'
+OUTPUT_NOMENCLATURE_FULL = OUTPUT_NOMENCLATURE_PARQUET.with_suffix('.json')
 
 def _build_auth(username: Optional[str], password: Optional[str]) -> Optional[Tuple[str, str]]:
     """
-    Подготовка auth для requests. Возвращает (username, password) или None.
+    Подготовка auth для HTTP-клиента (httpx). Возвращает (username, password) или None.
     """
     if username is None and password is None:
         return None
     return (str(username or ''), str(password or ''))
 
 
-def _normalize_base_url(u: Optional[str]) -> str:
-    s = (u or '').strip().rstrip('/')
-    if s.lower().endswith('$metadata'):
-        s = s[: -len('$metadata')].rstrip('/')
-    return s
+# HTTP/2 включаем только при наличии пакета h2 (httpx[http2])
+_HTTP2_AVAILABLE = importlib.util.find_spec('h2') is not None
+# Сколько страниц OData запрашивать параллельно (ограничение нагрузки на сервер 1С)
+ODATA_PAGE_CONCURRENCY = 8
+# Таймаут запроса страницы каталога при синхронизации номенклатуры, секунды
+SYNC_REQUEST_TIMEOUT_SEC = 120
+
+
+# Долгоживущий HTTP-клиент OData: keep-alive пул переиспользуется между вызовами. Учётные данные
+# и таймаут передаются в каждый запрос (auth=, timeout=) — клиент от них не зависит и не пересоздаётся
+_ODATA_HTTP: list = [None]
+
+
+def _odata_client() -> httpx.AsyncClient:
+    """
+    Асинхронный HTTP-клиент для OData 1С, общий для модуля: TCP/TLS-соединения не открываются заново
+    на каждый запрос. Клиент не закрывается вызывающей стороной.
+    """
+    client = _ODATA_HTTP[0]
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            http2=_HTTP2_AVAILABLE,
+            limits=httpx.Limits(max_connections=16, max_keepalive_connections=16),
+            # повтор при ошибках установления соединения
+            transport=httpx.AsyncHTTPTransport(http2=_HTTP2_AVAILABLE, retries=3),
+        )
+        _ODATA_HTTP[0] = client
+    return client
+
+
+async def _close_odata_clients() -> None:
+    client, _ODATA_HTTP[0] = _ODATA_HTTP[0], None
+    if client is not None:
+        await client.aclose()
+
+
+ng_app.on_shutdown(_close_odata_clients)
+
+
+async def _odata_get_json(
+    client: httpx.AsyncClient, url: str, params: dict, auth: Optional[Tuple[str, str]], timeout: float,
+):
+    """GET с разбором JSON; фолбэк на windows-1251 для «кривых» ответов 1С."""
+    r = await client.get(url, params=params, auth=auth, timeout=timeout)
+    r.raise_for_status()
+    try:
+        return json_loads(r.content)
+    except Exception:
+        return json.loads(r.content.decode('windows-1251', errors='replace'))
+
+
+# Разобранный config/odata_config.json; инвалидация по mtime файла
+_CFG_CACHE = {'mtime': -1, 'data': None}
+
 
 def _load_odata_config() -> dict:
     try:
-        if CONFIG_PATH.exists():
-            with CONFIG_PATH.open('r', encoding='utf-8') as f:
-                data = json.load(f)
-                if isinstance(data, dict):
-                    return {
-                        'base_url': str(data.get('base_url') or ''),
-                        'username': str(data.get('username') or ''),
-                        'password': str(data.get('password') or ''),
-                    }
+        st = ODATA_CONFIG_PATH.stat()
+    except FileNotFoundError:
+        return {'base_url': '', 'username': '', 'password': ''}
+    if st.st_mtime_ns == _CFG_CACHE['mtime'] and _CFG_CACHE['data'] is not None:
+        # копия — вызывающие стороны модифицируют результат
+        return dict(_CFG_CACHE['data'])
+    cfg = {'base_url': '', 'username': '', 'password': ''}
+    try:
+        data = json_loads(ODATA_CONFIG_PATH.read_bytes())
+        if isinstance(data, dict):
+            cfg = {
+                'base_url': str(data.get('base_url') or ''),
+                'username': str(data.get('username') or ''),
+                'password': str(data.get('password') or ''),
+            }
     except Exception:
         pass
-    return {'base_url': '', 'username': '', 'password': ''}
+    _CFG_CACHE['mtime'] = st.st_mtime_ns
+    _CFG_CACHE['data'] = cfg
+    return dict(cfg)
 
 def _save_odata_config(cfg: dict) -> None:
-    CONFIG_PATH.parent.mkdir(parents=True, exist_ok=True)
-    with CONFIG_PATH.open('w', encoding='utf-8') as f:
-        json.dump({
-            'base_url': str(cfg.get('base_url') or ''),
-            'username': str(cfg.get('username') or ''),
-            'password': str(cfg.get('password') or ''),
-            # сохраняем прочие поля как есть, если они были
-        }, f, ensure_ascii=False, indent=2)
-
-def _parse_metadata_summary(xml: str) -> dict:
-    summary = {
-        "entities": [],
-        "entity_sets": [],
-        "functions": [],
-        "actions": [],
-    }
+    ODATA_CONFIG_PATH.parent.mkdir(parents=True, exist_ok=True)
+    write_json(ODATA_CONFIG_PATH, {
+        'base_url': str(cfg.get('base_url') or ''),
+        'username': str(cfg.get('username') or ''),
+        'password': str(cfg.get('password') or ''),
+        # сохраняем прочие поля как есть, если они были
+    })
+
+def _to_int_or_none(raw) -> Optional[int]:
     try:
-        for line in xml.splitlines():
-            s = line.strip()
-            if 'EntitySet Name=' in s and 'EntityType=' in s:
-                start = s.find('Name="') + 6
-                end = s.find('"', start)
-                if start > 5 and end > start:
-                    summary['entity_sets'].append(s[start:end])
-            elif '<EntityType Name=' in s:
-                start = s.find('Name="') + 6
-                end = s.find('"', start)
-                if start > 5 and end > start:
-                    summary['entities'].append(s[start:end])
+        return int(raw) if raw is not None and str(raw).strip() != '' else None
     except Exception:
-        pass
-    return summary
+        return None
+
+
+def _nomenclature_db_rows(items: list[dict]) -> list[tuple]:
+    """
+    Нормализация записей каталога 1С в кортежи
+    (code, name, article, ref1c, replenishment_method, replenishment_time); строки без кода/наименования пропускаются.
+    """
+    rows = []
+    for it in items:
+        code = str(it.get('Code') or '').strip()
+        name = str(it.get('Description') or '').strip()
+        if not code or not name:
+            continue
+        article = it.get('Артикул')
+        article = None if article is None else str(article).strip()
+        ref1c = str(it.get('Ref_Key') or '').strip() or None
+        repl_method = it.get('СпособПополнения')
+        repl_method = None if repl_method is None else str(repl_method).strip()
+        rows.append((code, name, article, ref1c, repl_method, _to_int_or_none(it.get('СрокПополнения'))))
+    return rows
+
 
 # Запись полной выгрузки номенклатуры в БД (таблица items)
 def _upsert_nomenclature_to_db(items: list[dict], db_path: Optional[Path] = None) -> tuple[int, int]:
@@ -415,32 +661,14 @@ def _upsert_nomenclature_to_db(items: list[dict], db_path: Optional[Path] = None
       - item_ref1c       ← Ref_Key
       - replenishment_method ← СпособПополнения
       - replenishment_time   ← СрокПополнения (int)
-    Идемпотентно добавляет недостающие колонки в items.
+    Колонки item_ref1c/replenishment_* добавляются миграцией в init_database().
     """
-    inserted = 0
-    updated = 0
-    with get_connection(db_path) as conn:
-        # Идемпотентно добавим недостающие колонки
-        try:
-            cols = conn.execute("PRAGMA table_info(items)").fetchall()
-            col_names = {str(c[1]) for c in cols}
-            if "item_article" not in col_names:
-                conn.execute("ALTER TABLE items ADD COLUMN item_article TEXT")
-            if "item_ref1c" not in col_names:
-                conn.execute("ALTER TABLE items ADD COLUMN item_ref1c TEXT")
-                conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS ux_items_ref1c ON items(item_ref1c)")
-            if "replenishment_method" not in col_names:
-                conn.execute("ALTER TABLE items ADD COLUMN replenishment_method TEXT")
-            if "replenishment_time" not in col_names:
-                conn.execute("ALTER TABLE items ADD COLUMN replenishment_time INTEGER")
-        except Exception:
-            # не роняем процесс синхронизации из‑за ALTER
-            pass
+    rows = _nomenclature_db_rows(items)
 
-        conn.execute("BEGIN")
+    with get_connection(db_path) as conn:
         sql = """
         INSERT INTO items (item_code, item_name, item_article, item_ref1c, replenishment_method, replenishment_time, updated_at)
-        VALUES (:code, :name, :article, :ref1c, :replenishment_method, :replenishment_time, datetime('now'))
+        VALUES (?, ?, ?, ?, ?, ?, datetime('now'))
         ON CONFLICT(item_code) DO UPDATE SET
             item_name = excluded.item_name,
             item_article = excluded.item_article,
@@ -449,36 +677,13 @@ def _upsert_nomenclature_to_db(items: list[dict], db_path: Optional[Path] = None
             replenishment_time = excluded.replenishment_time,
             updated_at = datetime('now')
         """
-        for it in items:
-            code = str(it.get('Code') or '').strip()
-            name = str(it.get('Description') or '').strip()
-            article = it.get('Артикул')
-            article = None if article is None else str(article).strip()
-            ref1c = str(it.get('Ref_Key') or '').strip() or None
-            repl_method = it.get('СпособПополнения')
-            repl_method = None if repl_method is None else str(repl_method).strip()
-            repl_time_raw = it.get('СрокПополнения')
-            try:
-                repl_time = int(repl_time_raw) if repl_time_raw is not None and str(repl_time_raw).strip() != '' else None
-            except Exception:
-                repl_time = None
-
-            if not code or not name:
-                continue
-
-            existed = conn.execute("SELECT 1 FROM items WHERE item_code = ?", (code,)).fetchone() is not None
-            conn.execute(sql, {
-                "code": code,
-                "name": name,
-                "article": article,
-                "ref1c": ref1c,
-                "replenishment_method": repl_method,
-                "replenishment_time": repl_time,
-            })
-            if existed:
-                updated += 1
-            else:
-                inserted += 1
+        # Счётчики вставок/обновлений — по одному снимку существующих кодов, без SELECT на каждую строку
+        existing_codes = {r[0] for r in conn.execute("SELECT item_code FROM items").fetchall()}
+        inserted = len({r[0] for r in rows} - existing_codes)
+        updated = len(rows) - inserted
+
+        conn.execute("BEGIN IMMEDIATE")
+        conn.executemany(sql, rows)
         conn.commit()
     return inserted, updated
 
@@ -486,64 +691,84 @@ def _upsert_nomenclature_to_db(items: list[dict], db_path: Optional[Path] = None
 async def api_odata_save_config(req: ODataConfigReq):
     cur = _load_odata_config()
     if req.base_url is not None:
-        cur['base_url'] = _normalize_base_url(req.base_url)
+        cur['base_url'] = normalize_base_url(req.base_url)
     if req.username is not None:
         cur['username'] = req.username or ''
     if req.password is not None:
         cur['password'] = req.password or ''
     _save_odata_config(cur)
-    return {'status': 'ok', 'message': 'Конфигурация сохранена', 'path': str(CONFIG_PATH)}
+    return {'status': 'ok', 'message': 'Конфигурация сохранена', 'path': str(ODATA_CONFIG_PATH)}
 
 @fastapi_app.post('/odata/test')
 async def api_odata_test(req: ODataConfigReq):
     cfg = _load_odata_config()
-    base_url = _normalize_base_url(req.base_url or cfg.get('base_url'))
+    base_url = normalize_base_url(req.base_url or cfg.get('base_url'))
     username = req.username if req.username is not None else cfg.get('username') or None
     password = req.password if req.password is not None else cfg.get('password') or None
     if not base_url:
         return {'status': 'error', 'message': 'Не указан base_url (введите и сохраните настройки).'}
 
     try:
-        client = OData1CClient(base_url=base_url, username=username or None, password=password or None, token=None)
-        resp = client._make_request('$metadata')
-        if isinstance(resp, dict) and '_raw' in resp:
-            raw = str(resp.get('_raw') or '')
-            size = len(raw.encode('utf-8', errors='ignore'))
-            return {'status': 'ok', 'message': f'Подключение успешно. Получено $metadata ({size} bytes).'}
-        else:
+        r = await _odata_client().get(f'{base_url}/$metadata', auth=_build_auth(username, password), timeout=30)
+        r.raise_for_status()
+        size = len(r.content)
+        if 'json' in r.headers.get('content-type', ''):
             # Некоторые серверы могут вернуть JSON-обертку
-            size = len(json.dumps(resp, ensure_ascii=False))
             return {'status': 'ok', 'message': f'Подключение успешно. Ответ разобран как JSON ({size} bytes).'}
+        return {'status': 'ok', 'message': f'Подключение успешно. Получено $metadata ({size} bytes).'}
     except Exception as e:
         return {'status': 'error', 'message': f'Ошибка подключения: {e}'}
 
+def _prepare_metadata_output() -> None:
+    OUTPUT_XML.parent.mkdir(parents=True, exist_ok=True)
+    # XML перезаписывается без условного GET — валидаторы страницы настроек больше не соответствуют файлу
+    OUTPUT_XML_VALIDATORS.unlink(missing_ok=True)
+
+
+def _save_metadata_json_response(body: bytes) -> dict:
+    xml_text = f'<!-- non-XML response -->\n{json.dumps(json_loads(body), ensure_ascii=False, indent=2)}'
+    write_bytes_atomic(OUTPUT_XML, xml_text.encode('utf-8'))
+    return parse_metadata_summary(xml_text)
+
+
+def _write_metadata_chunk(f, feed: MetadataSummaryFeed, chunk: bytes) -> None:
+    f.write(chunk)
+    feed.feed(chunk)
+
+
 @fastapi_app.post('/odata/metadata')
 async def api_odata_metadata(req: ODataConfigReq):
     cfg = _load_odata_config()
-    base_url = _normalize_base_url(req.base_url or cfg.get('base_url'))
+    base_url = normalize_base_url(req.base_url or cfg.get('base_url'))
     username = req.username if req.username is not None else cfg.get('username') or None
     password = req.password if req.password is not None else cfg.get('password') or None
     if not base_url:
         return {'status': 'error', 'message': 'Не указан base_url (введите и сохраните настройки).'}
 
+    part = OUTPUT_XML.with_name(OUTPUT_XML.name + '.part')
     try:
-        client = OData1CClient(base_url=base_url, username=username or None, password=password or None, token=None)
-        resp = client._make_request('$metadata')
-        xml_text = None
-        if isinstance(resp, dict) and '_raw' in resp:
-            xml_text = str(resp.get('_raw') or '')
-        else:
-            # Если сервер вернул не raw-XML — сериализуем как JSON для диагностики
-            xml_text = f'<!-- non-XML response -->\n{json.dumps(resp, ensure_ascii=False, indent=2)}'
-
-        # Сохраняем файлы
-        OUTPUT_XML.parent.mkdir(parents=True, exist_ok=True)
-        with OUTPUT_XML.open('w', encoding='utf-8') as f:
-            f.write(xml_text)
+        # Файловые операции и разбор XML — в пуле потоков, event loop занят только сетью
+        await asyncio.to_thread(_prepare_metadata_output)
+        auth = _build_auth(username, password)
+        async with _odata_client().stream('GET', f'{base_url}/$metadata', auth=auth, timeout=120) as r:
+            r.raise_for_status()
+            if 'json' in r.headers.get('content-type', ''):
+                # Если сервер вернул не raw-XML — сериализуем как JSON для диагностики
+                body = await r.aread()
+                summary = await asyncio.to_thread(_save_metadata_json_response, body)
+            else:
+                # XML пишется на диск порциями и параллельно разбирается — документ целиком в памяти не держим
+                feed = MetadataSummaryFeed()
+                f = await asyncio.to_thread(part.open, 'wb')
+                try:
+                    async for chunk in r.aiter_bytes(METADATA_CHUNK_BYTES):
+                        await asyncio.to_thread(_write_metadata_chunk, f, feed, chunk)
+                finally:
+                    await asyncio.to_thread(f.close)
+                await asyncio.to_thread(os.replace, part, OUTPUT_XML)
+                summary = await asyncio.to_thread(feed.close, OUTPUT_XML)
 
-        summary = _parse_metadata_summary(xml_text)
-        with OUTPUT_SUMMARY.open('w', encoding='utf-8') as f:
-            json.dump(summary, f, ensure_ascii=False, indent=2)
+        await asyncio.to_thread(write_json, OUTPUT_SUMMARY, summary)
 
         return {
             'status': 'ok',
@@ -555,11 +780,14 @@ async def api_odata_metadata(req: ODataConfigReq):
         }
     except Exception as e:
         return {'status': 'error', 'message': f'Ошибка выгрузки метаданных: {e}'}
+    finally:
+        # недописанный файл после ошибки или обрыва не остаётся рядом с выгрузкой
+        await asyncio.to_thread(part.unlink, missing_ok=True)
 
 @fastapi_app.post('/odata/categories/export_groups')
 async def api_odata_export_groups(req: ODataConfigReq | None = None):
     cfg = _load_odata_config()
-    base_url = _normalize_base_url((req.base_url if req and req.base_url else cfg.get('base_url')))
+    base_url = normalize_base_url((req.base_url if req and req.base_url else cfg.get('base_url')))
     username = req.username if (req and req.username is not None) else (cfg.get('username') or None)
     password = req.password if (req and req.password is not None) else (cfg.get('password') or None)
     if not base_url:
@@ -573,23 +801,30 @@ async def api_odata_export_groups(req: ODataConfigReq | None = None):
             '$orderby': 'Code',
         }
         auth = _build_auth(username, password)
-        r = requests.get(url, params=params, auth=auth, timeout=60)
-        r.raise_for_status()
-        try:
-            data = r.json()
-        except Exception:
-            text = r.content.decode('windows-1251', errors='replace')
-            data = json.loads(text)
+        data = await _odata_get_json(_odata_client(), url, params, auth, timeout=60)
 
         OUTPUT_GROUPS.parent.mkdir(parents=True, exist_ok=True)
-        with OUTPUT_GROUPS.open('w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        await asyncio.to_thread(write_json, OUTPUT_GROUPS, data)
 
         vals = data.get('value', data)
         if isinstance(vals, dict):
             vals = [vals]
         total = len(vals) if isinstance(vals, list) else 0
-        groups_count = sum(1 for v in vals if isinstance(v, dict) and v.get('IsFolder') is True)
+        # Отбор и сортировка групп выполняются один раз при выгрузке, а не при каждом открытии страницы
+        folders = sorted(
+            (
+                {
+                    'id': str(v.get('Ref_Key') or ''),
+                    'code': str(v.get('Code') or ''),
+                    'name': str(v.get('Description') or ''),
+                }
+                for v in (vals if isinstance(vals, list) else [])
+                if isinstance(v, dict) and v.get('IsFolder') is True
+            ),
+            key=lambda g: (g['code'], g['name']),
+        )
+        await asyncio.to_thread(write_json, OUTPUT_GROUPS_FOLDERS, folders)
+        groups_count = len(folders)
 
         return {
             'status': 'ok',
@@ -607,46 +842,165 @@ async def api_odata_reindex():
     return {'status': 'not_implemented', 'message': 'Принудительная индексация номенклатуры пока не подключена в NiceGUI.'}
 
 # Хранилище статуса синхронизации
-_sync_status = {
-    'running': False,
-    'progress': 0,
-    'message': 'Готов к синхронизации'
-}
+# Снимок статуса неизменяем: писатели публикуют новый объект одной заменой ссылки,
+# поэтому читатель никогда не увидит «наполовину обновлённый» статус.
+@dataclass(frozen=True, slots=True)
+class SyncStatus:
+    running: bool = False
+    progress: int = 0
+    message: str = 'Готов к синхронизации'
 
-@fastapi_app.post('/nomenclature/sync')
-async def api_nomenclature_sync(bg: BackgroundTasks):
-    def _task():
-        global _sync_status
+
+_sync_status_ref: list = [SyncStatus()]
+
+
+def _set_sync_status(**fields) -> None:
+    """Публикует новый снимок статуса синхронизации с изменёнными полями."""
+    _sync_status_ref[0] = replace(_sync_status_ref[0], **fields)
+
+
+# Через сколько секунд после завершения синхронизации статус возвращается в «Готов»
+SYNC_STATUS_RESET_DELAY_SEC = 3
+
+
+def _reset_sync_progress() -> None:
+    if not _sync_status_ref[0].running:
+        _set_sync_status(progress=0, message='Готов к синхронизации')
+
+# Поля каталога Номенклатура, запрашиваемые при полной выгрузке
+NOMENCLATURE_SELECT = 'Ref_Key,Code,Description,Артикул,СпособПополнения,СрокПополнения,ЕдиницаИзмерения_Key,КатегорияНоменклатуры_Key,ТипНоменклатуры'
+
+
+def _nomenclature_row(v) -> Optional[dict]:
+    """Оставляет из записи каталога только нужные поля; группы (папки) отбрасываются."""
+    if not isinstance(v, dict):
+        return None
+    # Отсекаем группы (папки) на клиенте для надежности
+    if v.get('IsFolder') is True:
+        return None
+    return {
+        'Ref_Key': v.get('Ref_Key'),
+        'Code': v.get('Code'),
+        'Description': v.get('Description'),
+        'Артикул': v.get('Артикул'),
+        'Parent_Key': v.get('Parent_Key'),
+    }
+
+
+def _collect_nomenclature_page(data, items: list) -> int:
+    """
+    Добавляет в items элементы страницы OData (без групп).
+    Возвращает количество записей на странице (для определения последней страницы).
+    """
+    vals = data.get('value', data) if isinstance(data, dict) else data
+    if isinstance(vals, dict):
+        vals = [vals]
+    if not vals or not isinstance(vals, list):
+        return 0
+    for v in vals:
+        row = _nomenclature_row(v)
+        if row is not None:
+            items.append(row)
+    return len(vals)
+
+
+class _AsyncByteReader:
+    """Адаптер потока httpx под интерфейс async read(n), который ожидает ijson."""
+
+    def __init__(self, response: httpx.Response):
+        self._chunks = response.aiter_bytes()
+        self._buf = b''
+
+    async def read(self, n: int = -1) -> bytes:
+        while n < 0 or len(self._buf) < n:
+            try:
+                self._buf += await self._chunks.__anext__()
+            except StopAsyncIteration:
+                break
+        if n < 0:
+            out, self._buf = self._buf, b''
+        else:
+            out, self._buf = self._buf[:n], self._buf[n:]
+        return out
+
+
+async def _fetch_nomenclature_page(
+    client: httpx.AsyncClient, url: str, params: dict, auth: Optional[Tuple[str, str]], timeout: float,
+) -> tuple[list, int]:
+    """
+    Загружает страницу каталога и возвращает (строки без групп, число записей на странице).
+    Ответ разбирается потоково (ijson) — без построения полного JSON-дерева страницы.
+    """
+    rows: list = []
+    try:
+        n = 0
+        async with client.stream('GET', url, params=params, auth=auth, timeout=timeout) as r:
+            r.raise_for_status()
+            async for v in ijson.items_async(_AsyncByteReader(r), 'value.item', use_float=True):
+                n += 1
+                row = _nomenclature_row(v)
+                if row is not None:
+                    rows.append(row)
+        return rows, n
+    except httpx.HTTPError:
+        raise
+    except Exception:
+        # Ответ не разобрался потоково (например, не UTF-8) — повторяем с полным разбором
+        rows = []
+    data = await _odata_get_json(client, url, params, auth, timeout)
+    n = _collect_nomenclature_page(data, rows)
+    return rows, n
+
+
+def _run_nomenclature_sync() -> dict:
+    """
+    Ставит полную выгрузку каталога Номенклатура в очередь фоновых задач (кнопка и планировщик).
+    Вызывается из event loop; по окончании выгрузки отметку времени ставит _record_sync().
+    """
+    async def _task():
         try:
-            _sync_status['running'] = True
-            _sync_status['progress'] = 0
-            _sync_status['message'] = 'Подготовка…'
-            print('[nomenclature/sync] started')
+            _set_sync_status(running=True, progress=0, message='Подготовка…')
+            logger.info('[nomenclature/sync] started')
 
             # Загружаем конфиг OData
             cfg = _load_odata_config()
-            base_url = _normalize_base_url(cfg.get('base_url'))
+            base_url = normalize_base_url(cfg.get('base_url'))
             username = cfg.get('username') or None
             password = cfg.get('password') or None
 
             if not base_url:
-                _sync_status['message'] = 'Ошибка: не указан base_url в config/odata_config.json'
+                _set_sync_status(message='Ошибка: не указан base_url в config/odata_config.json')
                 return
 
             url = f"{base_url}/Catalog_Номенклатура"
             auth = _build_auth(username, password)
+            top = 1000
+            items = []
 
+            def _page_params(skip: int) -> dict:
+                return {
+                    '$format': 'json',
+                    '$select': NOMENCLATURE_SELECT,
+                    '$filter': 'IsFolder eq false',
+                    '$orderby': 'Code',
+                    '$top': top,
+                    '$skip': skip,
+                }
+
+            def _update_progress(loaded: int, page_no: int) -> None:
+                if total:
+                    prog = min(95, max(1, int(loaded * 100 / max(1, total))))
+                else:
+                    # При неизвестном total — плавный рост с потолком до 95%
+                    prog = min(95, 5 + page_no * 3)
+                _set_sync_status(progress=prog, message=f'Получено: {len(items)}')
+
+            client = _odata_client()
             # Попытка получить общее количество записей
             total = None
             try:
                 params_count = {'$format': 'json', '$count': 'true', '$top': 1, '$filter': 'IsFolder eq false'}
-                rc = requests.get(url, params=params_count, auth=auth, timeout=60)
-                rc.raise_for_status()
-                try:
-                    data_c = rc.json()
-                except Exception:
-                    text_c = rc.content.decode('windows-1251', errors='replace')
-                    data_c = json.loads(text_c)
+                data_c = await _odata_get_json(client, url, params_count, auth, SYNC_REQUEST_TIMEOUT_SEC)
                 for k in ('@odata.count', 'odata.count', 'Count', 'count', '@count'):
                     if isinstance(data_c, dict) and k in data_c and str(data_c[k]).isdigit():
                         total = int(data_c[k])
@@ -654,129 +1008,143 @@ async def api_nomenclature_sync(bg: BackgroundTasks):
             except Exception:
                 total = None  # сервер мог не поддержать $count — работаем без него
 
-            # Пагинация
-            top = 1000
             skip = 0
             page_no = 0
-            items = []
+            last_page_full = True
 
-            while True:
-                _sync_status['message'] = f'Загрузка страницы {page_no + 1}…'
-                params = {
-                    '$format': 'json',
-                    '$select': 'Ref_Key,Code,Description,Артикул,СпособПополнения,СрокПополнения,ЕдиницаИзмерения_Key,КатегорияНоменклатуры_Key,ТипНоменклатуры',
-                    '$orderby': 'Code',
-                    '$top': top,
-                    '$skip': skip
-                }
+            # Известен total — запрашиваем страницы параллельно пачками
+            if total:
+                offsets = list(range(0, total, top))
                 try:
-                    r = requests.get(url, params=params, auth=auth, timeout=120)
-                    r.raise_for_status()
-                    try:
-                        data = r.json()
-                    except Exception:
-                        text = r.content.decode('windows-1251', errors='replace')
-                        data = json.loads(text)
+                    for i in range(0, len(offsets), ODATA_PAGE_CONCURRENCY):
+                        chunk = offsets[i:i + ODATA_PAGE_CONCURRENCY]
+                        _set_sync_status(message=f'Загрузка страниц {page_no + 1}–{page_no + len(chunk)}…')
+                        pages = await asyncio.gather(*[_fetch_nomenclature_page(client, url, _page_params(s), auth, SYNC_REQUEST_TIMEOUT_SEC) for s in chunk])
+                        for rows, n in pages:
+                            items.extend(rows)
+                            skip += n
+                            page_no += 1
+                            last_page_full = n >= top
+                        _update_progress(skip, page_no)
                 except Exception as e:
-                    _sync_status['message'] = f'Ошибка загрузки: {e}'
-                    print(f'[nomenclature/sync] page error: {e!r}')
-                    break
+                    _set_sync_status(message=f'Ошибка загрузки: {e}')
+                    logger.warning('[nomenclature/sync] page error: %r', e)
+                    last_page_full = False
 
-                vals = data.get('value', data)
-                if isinstance(vals, dict):
-                    vals = [vals]
-                if not vals or not isinstance(vals, list):
+            # Последовательная пагинация: total неизвестен или каталог вырос с момента $count
+            while last_page_full:
+                _set_sync_status(message=f'Загрузка страницы {page_no + 1}…')
+                try:
+                    rows, n = await _fetch_nomenclature_page(client, url, _page_params(skip), auth, SYNC_REQUEST_TIMEOUT_SEC)
+                except Exception as e:
+                    _set_sync_status(message=f'Ошибка загрузки: {e}')
+                    logger.warning('[nomenclature/sync] page error: %r', e)
                     break
 
-                # Накопление результатов
-                for v in vals:
-                    if not isinstance(v, dict):
-                        continue
-                    # Отсекаем группы (папки) на клиенте для надежности
-                    if v.get('IsFolder') is True:
-                        continue
-                    items.append({
-                        'Ref_Key': v.get('Ref_Key'),
-                        'Code': v.get('Code'),
-                        'Description': v.get('Description'),
-                        'Артикул': v.get('Артикул'),
-                        'Parent_Key': v.get('Parent_Key'),
-                    })
-
-                skip += len(vals)
+                if not n:
+                    break
+                items.extend(rows)
+                skip += n
                 page_no += 1
-
-                # Обновление прогресса
-                if total:
-                    prog = min(95, max(1, int(skip * 100 / max(1, total))))
-                else:
-                    # При неизвестном total — плавный рост с потолком до 95%
-                    prog = min(95, 5 + page_no * 3)
-                _sync_status['progress'] = prog
-                _sync_status['message'] = f'Получено: {len(items)}'
+                _update_progress(skip, page_no)
 
                 # Признак последней страницы
-                if len(vals) < top:
-                    break
+                last_page_full = n >= top
                 # Защита от бесконечного цикла
                 if page_no >= 2000:
-                    _sync_status['message'] = 'Достигнут предел страниц (safety cap)'
+                    _set_sync_status(message='Достигнут предел страниц (safety cap)')
                     break
 
-            # Сохранение результата
+            # Сохранение результата (дисковый I/O — вне event loop)
+            def _save_full() -> Path:
+                try:
+                    table = pa.Table.from_pylist(items)
+                except pa.ArrowException as e:
+                    logger.warning('[nomenclature/sync] parquet skipped, saving JSON: %s', e)
+                    write_json(OUTPUT_NOMENCLATURE_FULL, {'value': items, 'total': len(items)})
+                    OUTPUT_NOMENCLATURE_PARQUET.unlink(missing_ok=True)
+                    return OUTPUT_NOMENCLATURE_FULL
+                OUTPUT_NOMENCLATURE_PARQUET.parent.mkdir(parents=True, exist_ok=True)
+                tmp = OUTPUT_NOMENCLATURE_PARQUET.with_name(OUTPUT_NOMENCLATURE_PARQUET.name + '.tmp')
+                pq.write_table(table, tmp, compression='zstd')
+                os.replace(tmp, OUTPUT_NOMENCLATURE_PARQUET)
+                OUTPUT_NOMENCLATURE_FULL.unlink(missing_ok=True)
+                return OUTPUT_NOMENCLATURE_PARQUET
+
+            saved_path = None
             try:
-                OUTPUT_NOMENCLATURE_FULL.parent.mkdir(parents=True, exist_ok=True)
-                with OUTPUT_NOMENCLATURE_FULL.open('w', encoding='utf-8') as f:
-                    json.dump({'value': items, 'total': len(items)}, f, ensure_ascii=False, indent=2)
+                saved_path = await _run_blocking_job(_save_full)
             except Exception as e:
-                _sync_status['message'] = f'Ошибка сохранения: {e}'
-                print(f'[nomenclature/sync] save error: {e!r}')
+                _set_sync_status(message=f'Ошибка сохранения: {e}')
+                logger.exception('[nomenclature/sync] save error')
 
             # Запись полной выгрузки в БД выполняется ниже через _upsert_nomenclature_to_db(items)
 
             # Запись в БД items (полная выгрузка сущности)
             try:
-                _sync_status['message'] = 'Запись в БД…'
-                _sync_status['progress'] = min(99, max(_sync_status.get('progress', 0), 96))
-                inserted, updated = _upsert_nomenclature_to_db(items)
-                _sync_status['message'] = f'В БД: вставлено {inserted}, обновлено {updated}'
+                _set_sync_status(message='Запись в БД…', progress=min(99, max(_sync_status_ref[0].progress, 96)))
+                inserted, updated = await _run_blocking_job(_upsert_nomenclature_to_db, items)
+                _set_sync_status(message=f'В БД: вставлено {inserted}, обновлено {updated}')
             except Exception as e:
-                _sync_status['message'] = f'Ошибка записи в БД: {e}'
-                print(f'[nomenclature/sync] db upsert error: {e!r}')
+                _set_sync_status(message=f'Ошибка записи в БД: {e}')
+                logger.exception('[nomenclature/sync] db upsert error')
 
-            # Отметка времени последней синхронизации
-            try:
-                now_iso = __import__('datetime').datetime.now().isoformat()
-                LAST_SYNC_PATH.parent.mkdir(parents=True, exist_ok=True)
-                with LAST_SYNC_PATH.open('w', encoding='utf-8') as f:
-                    json.dump({'last_sync': now_iso}, f, ensure_ascii=False, indent=2)
-            except Exception as e:
-                print(f'[nomenclature/sync] last_sync update error: {e!r}')
+            # Отметка времени последней синхронизации (на диск — отложенно, см. _flush_last_sync)
+            _record_sync(datetime.now())
 
-            _sync_status['progress'] = 100
-            _sync_status['message'] = f'Синхронизация завершена: {len(items)} позиций'
-            print(f'[nomenclature/sync] done: {len(items)} items -> {OUTPUT_NOMENCLATURE_FULL}')
+            _set_sync_status(progress=100, message=f'Синхронизация завершена: {len(items)} позиций')
+            logger.info('[nomenclature/sync] done: %d items -> %s', len(items), saved_path)
         except Exception as e:
-            _sync_status['message'] = f'Ошибка: {e}'
-            print(f'[nomenclature/sync] error: {e!r}')
+            _set_sync_status(message=f'Ошибка: {e}')
+            logger.exception('[nomenclature/sync] error')
         finally:
-            _sync_status['running'] = False
-            # Сбрасываем прогресс через 3 секунды
-            import threading
-            import time as _time
-            def reset_progress():
-                _time.sleep(3)
-                if not _sync_status['running']:
-                    _sync_status['progress'] = 0
-                    _sync_status['message'] = 'Готов к синхронизации'
-            threading.Thread(target=reset_progress, daemon=True).start()
-    bg.add_task(_task)
+            _set_sync_status(running=False)
+            # Сбрасываем прогресс через 3 секунды (таймер event loop, без отдельного потока)
+            asyncio.get_running_loop().call_later(SYNC_STATUS_RESET_DELAY_SEC, _reset_sync_progress)
+    # Проверка и установка running без await между ними — атомарны в event loop:
+    # повторный клик или срабатывание планировщика не поставит в очередь вторую выгрузку
+    prev = _sync_status_ref[0]
+    if prev.running:
+        return {'status': 'busy', 'message': 'Синхронизация уже идёт'}
+    _set_sync_status(running=True, progress=0, message='В очереди…')
+    if not _enqueue_job(_task):
+        _sync_status_ref[0] = prev
+        return _BUSY_RESPONSE
     return {'status': 'accepted', 'message': 'Синхронизация номенклатуры запущена в фоне'}
 
+
+@fastapi_app.post('/nomenclature/sync')
+async def api_nomenclature_sync():
+    return _run_nomenclature_sync()
+
+# Сериализованный снимок статуса: (снимок, JSON-байты, ETag); пересобирается только при смене снимка
+_sync_status_body: list = [(None, b'', '')]
+
+
+def _sync_status_payload() -> tuple:
+    st = _sync_status_ref[0]
+    cached = _sync_status_body[0]
+    if cached[0] is not st:
+        body = orjson.dumps(st)
+        cached = (st, body, f'"{zlib.crc32(body):08x}"')
+        _sync_status_body[0] = cached
+    return cached
+
+
 @fastapi_app.get('/nomenclature/sync/status')
-async def api_nomenclature_sync_status():
-    global _sync_status
-    return _sync_status
+async def api_nomenclature_sync_status(request: Request):
+    _, body, etag = _sync_status_payload()
+    # no-cache (а не no-store): браузер перепроверяет ответ по ETag и получает 304 без тела
+    headers = {'Cache-Control': 'no-cache', 'ETag': etag}
+    if request.headers.get('if-none-match') == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type='application/json', headers=headers)
+
+@fastapi_app.get('/sync/logs')
+async def api_sync_logs(limit: int = 200):
+    """Последние записи лога фоновых задач (кольцевой буфер в памяти)."""
+    limit = max(1, min(1024, int(limit or 200)))
+    return {'items': _log_ring.snapshot(limit)}
 
 def _register_routes() -> None:
     """Импорт и регистрация страниц NiceGUI."""
@@ -790,79 +1158,117 @@ _register_routes()
 
 def run_dev(port: int = 8080, reload: bool = True, show: bool = False) -> None:
     """Запуск дев-сервера NiceGUI (горячая перезагрузка)."""
+    _log_console.setLevel(logging.INFO)
     ui.run(port=port, reload=reload, show=show)
 
 
-# Функция для автоматической синхронизации по расписанию
-def schedule_nomenclature_sync():
+def _parse_schedule_cfg(path: Path) -> ScheduleCfg:
+    return parse_schedule_cfg(json_loads(path.read_bytes()))
+
+
+def _load_schedule_cfg() -> Optional[ScheduleCfg]:
+    """Настройки расписания; разбор — только при изменении файла. None — конфиг отсутствует."""
+    return mtime_cached(SYNC_CONFIG_PATH, _parse_schedule_cfg)
+
+
+# Отметка последней синхронизации: в памяти сразу, на диск — не чаще раза в LAST_SYNC_FLUSH_SEC
+LAST_SYNC_FLUSH_SEC = 30
+_last_sync_state: dict = {'value': None, 'dirty': False}
+
+
+def _parse_last_sync(path: Path) -> Optional[datetime]:
+    raw = json_loads(path.read_bytes()).get('last_sync') or None
     try:
-        from pathlib import Path
-        import json
-        import datetime
-        from datetime import time as dt_time
-        
-        # Загружаем настройки синхронизации
-        sync_cfg_path = Path('config') / 'nomenclature_sync_config.json'
-        if sync_cfg_path.exists():
-            sync_cfg = json.loads(sync_cfg_path.read_text('utf-8'))
-            interval_hours = int(sync_cfg.get('interval_hours', 1))
-            start_time_str = str(sync_cfg.get('start_time', '09:00'))
-            
-            # Парсим время начала
-            try:
-                start_time = datetime.datetime.strptime(start_time_str, '%H:%M').time()
-            except ValueError:
-                start_time = dt_time(9, 0)  # По умолчанию 09:00
-            
-            # Получаем текущее время
-            now = datetime.datetime.now()
-            current_time = now.time()
-            current_date = now.date()
-            
-            # Загружаем время последней синхронизации
-            last_sync_path = Path('config') / 'last_sync_time.json'
-            last_sync_time = None
-            if last_sync_path.exists():
-                try:
-                    last_sync_data = json.loads(last_sync_path.read_text('utf-8'))
-                    last_sync_str = last_sync_data.get('last_sync')
-                    if last_sync_str:
-                        last_sync_time = datetime.datetime.fromisoformat(last_sync_str)
-                except Exception:
-                    pass
-            
-            # Проверяем, нужно ли запустить синхронизацию
-            should_sync = False
-            
-            # Если время последней синхронизации не сегодня, проверяем время начала
-            if last_sync_time is None or last_sync_time.date() != current_date:
-                if current_time >= start_time:
-                    should_sync = True
-            # Если сегодня еще не было синхронизации и прошло достаточно времени с момента последней синхронизации
-            elif last_sync_time.date() == current_date:
-                # Проверяем, прошел ли интервал с момента последней синхронизации
-                time_since_last_sync = now - last_sync_time
-                if time_since_last_sync.total_seconds() >= interval_hours * 3600:
-                    should_sync = True
-            
-            if should_sync:
-                print(f'[schedule] Starting nomenclature sync at {now}')
-                # Здесь будет вызов функции синхронизации
-                # Пока что просто выводим информацию в консоль
-                
-                # Обновляем время последней синхронизации
-                try:
-                    last_sync_path.parent.mkdir(parents=True, exist_ok=True)
-                    last_sync_path.write_text(
-                        json.dumps({'last_sync': now.isoformat()}, ensure_ascii=False, indent=2),
-                        encoding='utf-8'
-                    )
-                except Exception as e:
-                    print(f'[schedule] Error updating last sync time: {e!r}')
-        else:
-            print('[schedule] Nomenclature sync config not found')
-    except Exception as e:
-        print(f'[schedule] Error in nomenclature sync scheduler: {e!r}')
+        return datetime.fromisoformat(raw) if raw else None
+    except ValueError:
+        return None
+
+
+def _load_last_sync() -> Optional[datetime]:
+    if _last_sync_state['value'] is not None:
+        return _last_sync_state['value']
+    try:
+        return mtime_cached(LAST_SYNC_PATH, _parse_last_sync)
+    except Exception:
+        return None
+
+
+def _record_sync(now: datetime) -> None:
+    """Запоминает отметку времени последней синхронизации; запись файла — в _flush_last_sync()."""
+    _last_sync_state['value'] = now
+    _last_sync_state['dirty'] = True
+
+
+def _flush_last_sync() -> None:
+    """Записывает накопленную отметку последней синхронизации, если она менялась."""
+    if not _last_sync_state['dirty']:
+        return
+    _last_sync_state['dirty'] = False
+    try:
+        LAST_SYNC_PATH.parent.mkdir(parents=True, exist_ok=True)
+        write_json(LAST_SYNC_PATH, {'last_sync': _last_sync_state['value'].isoformat()})
+    except Exception:
+        _last_sync_state['dirty'] = True
+        logger.exception('[schedule] Error updating last sync time')
+
+
+# Пора ли запускать автоматическую синхронизацию по расписанию (чтение файлов — вызывается в пуле потоков)
+def schedule_nomenclature_sync() -> bool:
+    try:
+        cfg = _load_schedule_cfg()
+        if cfg is None:
+            logger.debug('[schedule] Nomenclature sync config not found')
+            return False
+        if not _load_odata_config().get('base_url'):
+            logger.debug('[schedule] OData base_url is not configured')
+            return False
+        return should_run(datetime.now(), _load_last_sync(), cfg)
+    except Exception:
+        logger.exception('[schedule] Error in nomenclature sync scheduler')
+        return False
+
+
+# Интервал проверки расписания, секунды: решение о запуске принимает should_run() по актуальному конфигу
+SCHEDULE_POLL_SEC = 60
+_scheduler = None
+
+
+async def _scheduled_sync_check() -> None:
+    if not await asyncio.to_thread(schedule_nomenclature_sync):
+        return
+    # Постановка в очередь — в event loop; идущая выгрузка (running) повторно не запускается
+    result = _run_nomenclature_sync()
+    logger.info('[schedule] Nomenclature sync: %s', result['message'])
+
+
+async def _flush_last_sync_async() -> None:
+    # запись файла — в пуле потоков, event loop не блокируется на дисковом I/O
+    await asyncio.to_thread(_flush_last_sync)
+
+
+def _start_scheduler() -> None:
+    """
+    Запускает проверку расписания автосинхронизации в event loop приложения (без отдельного потока):
+    раз в SCHEDULE_POLL_SEC вызывается schedule_nomenclature_sync(), которая перечитывает конфиг
+    (по mtime) и решает, пора ли синхронизировать; если пора — выгрузка ставится в очередь фоновых задач.
+    """
+    global _scheduler
+    _scheduler = AsyncIOScheduler()
+    job_opts = {'max_instances': 1, 'coalesce': True}
+    _scheduler.add_job(_flush_last_sync_async, IntervalTrigger(seconds=LAST_SYNC_FLUSH_SEC), **job_opts)
+    _scheduler.add_job(_scheduled_sync_check, IntervalTrigger(seconds=SCHEDULE_POLL_SEC), **job_opts)
+    _scheduler.start()
+
+
+def _stop_scheduler() -> None:
+    if _scheduler is not None and _scheduler.running:
+        _scheduler.shutdown(wait=False)
+    # несохранённая отметка последней синхронизации не должна потеряться при остановке
+    _flush_last_sync()
+
+
+ng_app.on_startup(_start_scheduler)
+ng_app.on_shutdown(_stop_scheduler)
 
 
 # Экспортируем ASGI-приложение для продакшн запуска через uvicorn:
@@ -871,16 +1277,4 @@ asgi_app = ng_app
 
 
 if __name__ in {'__main__', '__mp_main__'}:
-    # Запускаем планировщик синхронизации
-    import threading
-    import time
-    
-    def scheduler_loop():
-        while True:
-            schedule_nomenclature_sync()
-            time.sleep(60)  # Проверяем расписание каждую минуту
-    
-    scheduler_thread = threading.Thread(target=scheduler_loop, daemon=True)
-    scheduler_thread.start()
-    
-    run_dev()
\ No newline at end of file
+    run_dev()
@@ -3,114 +3,112 @@
 PRODPLAN: Общий каркас (shell) для страниц NiceGUI
 - Верхний header с названием и быстрыми действиями
 - Левый drawer с навигацией
+
+Содержимое header/drawer — статический HTML, собранный при импорте модуля (по варианту на каждый
+пункт навигации). Кнопки действий обрабатываются одним делегирующим JS-обработчиком по data-атрибутам,
+без отдельного серверного callback на каждую кнопку.
 """
 
+import json
+from html import escape
+
 from nicegui import ui
 
-def _nav_link(label: str, href: str, active: bool = False) -> None:
-    classes = 'w-full justify-start'
-    if active:
-        classes += ' text-primary font-medium'
-    with ui.row().classes('w-full'):
-        ui.link(label, href).classes(classes)
+
+def _js(value) -> str:
+    """JS-литерал значения (JSON без экранирования кириллицы)."""
+    return json.dumps(value, ensure_ascii=False)
+
+
+# Действия: (подпись, адрес API, JSON-тело или None для GET, префикс текста ошибки)
+ACT_HEALTH = ('Проверка API', '/api/health', None, 'Health error')
+ACT_SYNC_STOCK = ('Обновить остатки', '/api/sync/stock-history', {'dir': 'ostatki', 'dry_run': False}, 'Ошибка sync-stock-history')
+ACT_SYNC_SPECS = ('Обновить спецификации', '/api/sync/specs', {'path': 'specs'}, 'Ошибка sync-specs')
+ACT_GENERATE_PLAN = ('Сгенерировать план', '/api/generate/plan', {'days': 30}, 'Ошибка generate-plan')
+
+_HEADER_BUTTONS = (ACT_SYNC_STOCK, ACT_SYNC_SPECS, ACT_GENERATE_PLAN)
+_DRAWER_BUTTONS = (ACT_HEALTH, ACT_SYNC_STOCK, ACT_GENERATE_PLAN)
+
+# Пункты навигации: (подпись, адрес, ключ active)
+_NAV_ITEMS = (
+    ('Главная', '/', 'home'),
+    ('План выпуска техники', '/plan', 'plan'),
+    ('Этапы', '/stages', 'stages'),
+    ('Настройки синхронизации 1С', '/settings/odata', 'settings'),
+)
+_CLS_INACTIVE = 'block w-full px-2 py-1 text-left'
+_CLS_ACTIVE = _CLS_INACTIVE + ' text-primary font-medium'
+
+_CLS_HEADER_BTN = 'px-3 py-1 rounded text-white uppercase text-sm hover:bg-white/10'
+_CLS_DRAWER_BTN = 'w-full px-2 py-1 rounded border border-current text-primary uppercase text-sm hover:bg-black/5'
+
+# Один обработчик кликов на документ: кнопка описывается атрибутами data-fetch / data-body / data-err
+_SHELL_JS = '''<script>
+if (!window.__prodplanShell) {
+  window.__prodplanShell = true;
+  document.addEventListener('click', (ev) => {
+    const b = ev.target.closest('[data-fetch]');
+    if (!b) return;
+    const body = b.dataset.body;
+    const opts = body ? {method: 'POST', headers: {'Content-Type': 'application/json'}, body: body} : undefined;
+    fetch(b.dataset.fetch, opts)
+      .then(r => r.json())
+      .then(j => window.$nicegui.notify(j.message || JSON.stringify(j)))
+      .catch(e => window.$nicegui.notify((b.dataset.err || 'Ошибка') + ': ' + e, 'negative'));
+  });
+}
+</script>'''
+
+
+def _button_html(action: tuple, classes: str) -> str:
+    label, url, body, err = action
+    body_attr = '' if body is None else f' data-body="{escape(_js(body))}"'
+    return (
+        f'<button type="button" class="{classes}" data-fetch="{escape(url)}"{body_attr}'
+        f' data-err="{escape(err)}">{escape(label)}</button>'
+    )
+
+
+def action_button(action: tuple, props: str = '') -> ui.button:
+    """
+    Кнопка Quasar, обрабатываемая тем же делегирующим JS-обработчиком, что и кнопки каркаса
+    (data-атрибуты вместо серверного callback с ui.run_javascript). Действует на страницах, где вызван shell().
+    """
+    label, url, body, err = action
+    btn = ui.button(label).props(f"data-fetch={url} data-err='{err}'")
+    if body is not None:
+        btn.props(f"data-body='{_js(body)}'")
+    return btn.props(props) if props else btn
+
+
+def _drawer_html(active: str) -> str:
+    nav = ''.join(
+        f'<a class="{_CLS_ACTIVE if key == active else _CLS_INACTIVE}" href="{escape(href)}">{escape(label)}</a>'
+        for label, href, key in _NAV_ITEMS
+    )
+    buttons = ''.join(_button_html(a, _CLS_DRAWER_BTN) for a in _DRAWER_BUTTONS)
+    return (
+        '<div class="text-subtitle2 px-2 py-2">Навигация</div><hr class="q-separator">'
+        f'<nav class="flex flex-col">{nav}</nav>'
+        '<hr class="q-separator my-2"><div class="text-subtitle2 px-2 py-2">Операции</div>'
+        f'<div class="flex flex-col px-2 gap-2">{buttons}</div>'
+    )
+
+
+# Разметка собирается один раз при импорте: кнопки header общие, drawer — по варианту на пункт навигации
+_HEADER_HTML = '<div class="flex gap-2">' + ''.join(_button_html(a, _CLS_HEADER_BTN) for a in _HEADER_BUTTONS) + '</div>'
+_SHELL_CACHE: dict[str, str] = {key: _drawer_html(key) for _, _, key in _NAV_ITEMS}
+
 
 def shell(active: str = 'home') -> None:
     """Компонует общий layout страницы."""
+    ui.add_body_html(_SHELL_JS)
     with ui.header().classes('justify-between bg-primary'):
         ui.label('PRODPLAN').classes('text-h6 text-white')
-        
-        with ui.row().classes('gap-2'):
-            
-            
-            ui.button(
-                'Обновить остатки',
-                on_click=lambda: ui.run_javascript(
-                    "fetch('/api/sync/stock-history', {"
-                    "  method: 'POST',"
-                    "  headers: {'Content-Type': 'application/json'},"
-                    "  body: JSON.stringify({dir: 'ostatki', dry_run: false})"
-                    "})"
-                    ".then(r => r.json())"
-                    ".then(j => window.$nicegui.notify(j.message || JSON.stringify(j)))"
-                    ".catch(e => window.$nicegui.notify('Ошибка sync-stock-history: ' + e, 'negative'))"
-                ),
-            ).props('flat color=white')
-            
-            ui.button(
-                'Обновить спецификации',
-                on_click=lambda: ui.run_javascript(
-                    "fetch('/api/sync/specs', {"
-                    "  method: 'POST',"
-                    "  headers: {'Content-Type': 'application/json'},"
-                    "  body: JSON.stringify({path: 'specs'})"
-                    "})"
-                    ".then(r => r.json())"
-                    ".then(j => window.$nicegui.notify(j.message || JSON.stringify(j)))"
-                    ".catch(e => window.$nicegui.notify('Ошибка sync-specs: ' + e, 'negative'))"
-                ),
-            ).props('flat color=white')
-            
-            ui.button(
-                'Сгенерировать план',
-                on_click=lambda: ui.run_javascript(
-                    "fetch('/api/generate/plan', {"
-                    "  method: 'POST',"
-                    "  headers: {'Content-Type': 'application/json'},"
-                    "  body: JSON.stringify({days: 30})"
-                    "})"
-                    ".then(r => r.json())"
-                    ".then(j => window.$nicegui.notify(j.message || JSON.stringify(j)))"
-                    ".catch(e => window.$nicegui.notify('Ошибка generate-plan: ' + e, 'negative'))"
-                ),
-            ).props('flat color=white')
+        ui.html(_HEADER_HTML)
 
     with ui.left_drawer(top_corner=True, bottom_corner=True).props('width=200'):
-        ui.label('Навигация').classes('text-subtitle2 px-2 py-2')
-        ui.separator()
-        _nav_link('Главная', '/', active == 'home')
-        _nav_link('План выпуска техники', '/plan', active == 'plan')
-        _nav_link('Этапы', '/stages', active == 'stages')
-        _nav_link('Настройки синхронизации 1С', '/settings/odata', active == 'settings')
-        ui.separator().classes('my-2')
-        ui.label('Операции').classes('text-subtitle2 px-2 py-2')
-        with ui.column().classes('px-2 gap-2'):
-            ui.button(
-                'Проверка API',
-                on_click=lambda: ui.run_javascript(
-                    "fetch('/api/health')"
-                    ".then(r => r.json())"
-                    ".then(j => window.$nicegui.notify(JSON.stringify(j)))"
-                    ".catch(e => window.$nicegui.notify('Health error: ' + e, 'negative'))"
-                ),
-            ).props('outline dense color=primary')
-            
-            ui.button(
-                'Обновить остатки',
-                on_click=lambda: ui.run_javascript(
-                    "fetch('/api/sync/stock-history', {"
-                    "  method: 'POST',"
-                    "  headers: {'Content-Type': 'application/json'},"
-                    "  body: JSON.stringify({dir: 'ostatki', dry_run: false})"
-                    "})"
-                    ".then(r => r.json())"
-                    ".then(j => window.$nicegui.notify(j.message || JSON.stringify(j)))"
-                    ".catch(e => window.$nicegui.notify('Ошибка sync-stock-history: ' + e, 'negative'))"
-                ),
-            ).props('outline dense color=primary')
-            
-            ui.button(
-                'Сгенерировать план',
-                on_click=lambda: ui.run_javascript(
-                    "fetch('/api/generate/plan', {"
-                    "  method: 'POST',"
-                    "  headers: {'Content-Type': 'application/json'},"
-                    "  body: JSON.stringify({days: 30})"
-                    "})"
-                    ".then(r => r.json())"
-                    ".then(j => window.$nicegui.notify(j.message || JSON.stringify(j)))"
-                    ".catch(e => window.$nicegui.notify('Ошибка generate-plan: ' + e, 'negative'))"
-                ),
-            ).props('outline dense color=primary')
+        ui.html(_SHELL_CACHE.get(active) or _drawer_html(active)).classes('w-full')
 
     # Общий контейнер страницы
     ui.space()
@@ -5,9 +5,18 @@ PRODPLAN: Регистрация страниц NiceGUI
 - Общий каркас (shell) подключается из components/layout.py
 """
 
+import asyncio
+from collections import OrderedDict
+from functools import lru_cache
+import datetime as _dt
+import json
+import time
+from pathlib import Path
 from nicegui import ui
+from src.database import DEFAULT_DB_PATH
+from src.odata_client import OData1CClient, normalize_base_url
 from datetime import date as _date
-from .components.layout import shell
+from .components.layout import shell, action_button, ACT_HEALTH, ACT_SYNC_STOCK, ACT_GENERATE_PLAN
 from .services.plan_service import (
     fetch_plan_overview,
     fetch_stages,
@@ -17,7 +26,406 @@ from .services.plan_service import (
     query_plan_matrix_paginated,
     ensure_root_product_by_code,
 )
-from .services.search_service import search_items_with_index
+from .services.search_service import NOMENCLATURE_INDEX_PATH, search_items_with_index
+from .services.odata_files import (
+    GROUPS_SELECTED_PATH,
+    ODATA_CONFIG_PATH,
+    OUTPUT_GROUPS,
+    OUTPUT_GROUPS_FOLDERS,
+    OUTPUT_SUMMARY,
+    OUTPUT_XML,
+    OUTPUT_XML_VALIDATORS,
+    SYNC_CONFIG_PATH,
+    json_dumps,
+    json_loads,
+    load_json_cached,
+    metadata_summary_file,
+    mtime_cached,
+    write_bytes_atomic,
+)
+
+try:
+    import holidays as _holidays
+except Exception:  # библиотека праздников опциональна: без неё подсвечиваются только выходные
+    _holidays = None
+
+# Задержка поиска при вводе: запрос к БД/индексу уходит только после паузы в наборе
+SEARCH_DEBOUNCE_SEC = 0.2
+
+UI_SETTINGS_PATH = Path('config') / 'ui_settings.json'
+
+# Предзагрузка соседних страниц сетки плана: задержка после отрисовки и размер кэша страниц
+PAGE_PREFETCH_DELAY_SEC = 0.5
+PAGE_CACHE_SIZE = 4
+
+# LRU-кэш результатов поиска: (запрос в casefold, limit) -> (сигнатура источников, время, список записей).
+# Запись устаревает при изменении БД/индекса номенклатуры (mtime/размер файлов) или через SEARCH_CACHE_TTL_SEC.
+SEARCH_CACHE_SIZE = 128
+SEARCH_CACHE_TTL_SEC = 60.0
+_SEARCH_CACHE: 'OrderedDict[tuple, tuple]' = OrderedDict()
+_SEARCH_SOURCES = (DEFAULT_DB_PATH, DEFAULT_DB_PATH.with_name(DEFAULT_DB_PATH.name + '-wal'), NOMENCLATURE_INDEX_PATH)
+
+
+def _load_ui_settings() -> dict:
+    try:
+        data = json_loads(UI_SETTINGS_PATH.read_bytes() or b'{}')
+    except Exception:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def _save_ui_settings(data: dict) -> None:
+    UI_SETTINGS_PATH.parent.mkdir(parents=True, exist_ok=True)
+    UI_SETTINGS_PATH.write_bytes(json_dumps(data))
+
+
+def _search_sources_sig() -> tuple:
+    """(mtime_ns, size) файлов БД, её WAL и локального индекса: меняется после синхронизации номенклатуры."""
+    sig = []
+    for p in _SEARCH_SOURCES:
+        try:
+            st = p.stat()
+            sig.append((st.st_mtime_ns, st.st_size))
+        except OSError:
+            sig.append(None)
+    return tuple(sig)
+
+
+def _search_cached(q: str, limit: int) -> list:
+    """
+    search_items_with_index с кэшем по запросу. Результаты всегда получены самим сервисом поиска
+    (его сопоставление и ранжирование); кэш сбрасывается при изменении БД или индекса и по TTL.
+    """
+    q = (q or '').strip()
+    q_norm = q.casefold()
+    if len(q_norm) < 2:
+        return []
+    key = (q_norm, limit)
+    sig = _search_sources_sig()
+    hit = _SEARCH_CACHE.get(key)
+    if hit is not None and hit[0] == sig and time.monotonic() - hit[1] < SEARCH_CACHE_TTL_SEC:
+        _SEARCH_CACHE.move_to_end(key)
+        return hit[2]
+    results = search_items_with_index(q, limit=limit)
+    _SEARCH_CACHE[key] = (sig, time.monotonic(), results)
+    _SEARCH_CACHE.move_to_end(key)
+    if len(_SEARCH_CACHE) > SEARCH_CACHE_SIZE:
+        _SEARCH_CACHE.popitem(last=False)
+    return results
+
+
+# CSS для выходных/праздников в сетке плана
+_PLAN_GRID_CSS = '''
+<style>
+  .weekend-col .ag-header-cell-label { background: #f2f2f2 !important; }
+  .weekend-cell { background: #fafafa !important; }
+  .holiday-col .ag-header-cell-label { background: #e8f0fe !important; }
+  .holiday-cell { background: #f3f8ff !important; }
+</style>
+'''
+
+# Ширина колонки-дня (фиксированная, без замера по содержимому) и сохранённое состояние колонок в localStorage
+DAY_COLUMN_WIDTH = 64
+# Пауза в правках сетки, после которой накопленные изменения отправляются автоматически (мс)
+AUTO_SAVE_DELAY_MS = 2000
+_COL_STATE_KEY = 'pp_col_state'
+_AUTOSIZE_COLUMNS = ('item_name', 'item_article', 'month_plan')
+
+
+def _js_list(values) -> str:
+    return json.dumps(list(values), ensure_ascii=False)
+
+
+# Базовые колонки сетки плана
+_BASE_COLUMNS = (
+    {'headerName': 'Изделие', 'field': 'item_name', 'pinned': 'left', 'minWidth': 200},
+    {'headerName': 'Артикул', 'field': 'item_article', 'minWidth': 120},
+    {'headerName': 'План на месяц', 'field': 'month_plan', 'type': 'rightAligned', 'minWidth': 120},
+    {'headerName': 'ID', 'field': 'item_id', 'hide': True},
+)
+
+def _grid_rows(rows: list, dates: list) -> list:
+    """
+    Строки для AG-Grid: только поля, которые сетка показывает или использует (item_id — ключ правок).
+    Дни передаются массивом в порядке dates, без повторения ключей-дат в каждой строке.
+    """
+    out = []
+    for r in rows:
+        days = r.get('days') or {}
+        out.append({
+            'item_id': r.get('item_id'),
+            'item_name': r.get('item_name'),
+            'item_article': r.get('item_article') or '',
+            'month_plan': r.get('month_plan'),
+            'days': [days.get(ds, 0) for ds in dates],
+        })
+    return out
+
+
+# Общий valueSetter для всех колонок-дней: значения дней в строке — массив data.days, выровненный по датам окна;
+# колонка читает его по field 'days.<индекс>', дата для сохранения берётся из colDef.colId.
+# month_plan — сумма по тому же окну дат, поэтому при правке ячейки он корректируется на разницу, без обхода дней
+_DAY_VALUE_SETTER = (
+    "function(params){ "
+    "  const nv = Number(params.newValue) || 0; "
+    "  if(!Number.isFinite(nv) || nv < 0) return false; "
+    "  const ds = params.colDef.colId; "
+    "  const i = Number(params.colDef.field.slice(5)); "
+    "  const prev = Number(params.data.days[i] || 0); "
+    "  params.data.days[i] = Math.floor(nv); "
+    "  params.data['month_plan'] = Number(params.data['month_plan'] || 0) - prev + Math.floor(nv); "
+    "  try{ window.__pp_add_change && window.__pp_add_change(params.data.item_id, ds, Math.floor(nv)); }catch(__e){} "
+    "  return true; "
+    "}"
+)
+
+
+# Классы подсветки колонки-дня: (заголовок, ячейка)
+_DAY_CLS_HOLIDAY = ('holiday-col', 'holiday-cell')
+_DAY_CLS_WEEKEND = ('weekend-col', 'weekend-cell')
+_DAY_CLS_NONE = ('', '')
+
+
+@lru_cache(maxsize=16)
+def _ru_holidays(years: tuple) -> frozenset:
+    """Праздники РФ за указанные годы (пустое множество без библиотеки holidays)."""
+    if _holidays is None or not years:
+        return frozenset()
+    try:
+        return frozenset(_holidays.country_holidays('RU', years=list(years)).keys())
+    except Exception:
+        return frozenset()
+
+
+@lru_cache(maxsize=32)
+def _build_day_columns(dates: tuple) -> tuple:
+    """Колонки по дням (заголовок dd.mm, подсветка выходных и праздников РФ) для набора дат."""
+    parsed = {}
+    for ds in dates:
+        try:
+            parsed[ds] = _dt.date.fromisoformat(ds)
+        except Exception:
+            pass
+    ru = _ru_holidays(tuple(sorted({d.year for d in parsed.values()})))
+    # (класс заголовка, класс ячейки) на каждую дату — одним проходом
+    class_by_ds = {
+        ds: _DAY_CLS_HOLIDAY if d in ru else (_DAY_CLS_WEEKEND if d.weekday() >= 5 else _DAY_CLS_NONE)
+        for ds, d in parsed.items()
+    }
+
+    cols = []
+    for i, ds in enumerate(dates):
+        d = parsed.get(ds)
+        header_class, cell_class = class_by_ds.get(ds, _DAY_CLS_NONE)
+        cols.append({
+            'headerName': d.strftime('%d.%m') if d else ds,
+            'colId': ds,                 # идентификатор дня для логики сохранения
+            'field': f'days.{i}',        # позиция дня в массиве data.days
+            'type': 'rightAligned',
+            'width': DAY_COLUMN_WIDTH,
+            'editable': True,
+            'cellEditor': 'agNumberCellEditor',
+            'cellEditorParams': {'min': 0, 'precision': 0, 'step': 1},
+            'valueSetter': _DAY_VALUE_SETTER,
+            'valueFormatter': "params.value != null ? String(params.value) : '0'",
+            'headerClass': header_class,
+            'cellClass': cell_class,
+        })
+    return tuple(cols)
+
+
+# Клиентские функции страницы плана (определяются один раз на страницу):
+# - window.PP.log — отладочный лог, включается флагом window.__pp_debug (Ctrl+Alt+D, хранится в localStorage)
+# - window.PP.save — отправка накопленных правок сетки (кнопка «Сохранить изменения»)
+# - window.PP.flush / scheduleAutoSave — автосохранение fetch(keepalive) после паузы в правках: из очереди убираются
+#   только отправленные правки и только после ответа status=ok (ошибка сервера не теряет изменения)
+# - после status=ok — emitEvent('plan_saved' / 'plan_autosaved') на сервер: предзагруженные страницы сбрасываются
+# - при уходе со страницы (pagehide) — navigator.sendBeacon: ответ уже некому показать
+_PLAN_PAGE_JS = (
+    '<script>'
+    "window.PP = window.PP || {}; "
+    "window.__pp_debug = localStorage.getItem('pp_debug') === '1'; "
+    "window.PP.log = (...a) => { if (window.__pp_debug) console.log(...a); }; "
+    "document.addEventListener('keydown', (ev) => { if (ev.ctrlKey && ev.altKey && (ev.key === 'd' || ev.key === 'D')) { "
+    " window.__pp_debug = !window.__pp_debug; localStorage.setItem('pp_debug', window.__pp_debug ? '1' : '0'); "
+    " console.log('[PP] debug', window.__pp_debug); } }); "
+    "window.PP.ack = (sent) => { const m = window.__pp_pending_map; if(!m) return; "
+    " for (const [k, v] of sent) { if (m.get(k) === v) m.delete(k); } }; "
+    "window.PP.flush = () => { const m = window.__pp_pending_map; if(!m || !m.size || window.__pp_flushing) return; "
+    " const sent = Array.from(m.entries()); const body = JSON.stringify({entries: sent.map(([, v]) => v)}); "
+    " window.__pp_flushing = true; "
+    " fetch('/api/plan/bulk_upsert', {method:'POST', headers:{'Content-Type':'application/json'}, body, keepalive: body.length < 60000})"
+    " .then(r => r.json())"
+    " .then(j => { if(j && j.status==='ok'){ window.PP.ack(sent); emitEvent('plan_autosaved'); window.PP.log('[PP] autosaved', j.saved); }"
+    "  else { window.$nicegui?.notify?.('Ошибка автосохранения: ' + (j && j.message ? j.message : 'unknown'), 'negative'); } })"
+    " .catch(e => { console.error('[PP] autosave error', e); window.$nicegui?.notify?.('Ошибка автосохранения: ' + e, 'negative'); })"
+    " .finally(() => { window.__pp_flushing = false; }); }; "
+    "window.PP.scheduleAutoSave = () => { clearTimeout(window.__pp_save_t); "
+    f" window.__pp_save_t = setTimeout(window.PP.flush, {AUTO_SAVE_DELAY_MS}); }}; "
+    "window.addEventListener('pagehide', () => { const m = window.__pp_pending_map; if(!m || !m.size) return; "
+    " navigator.sendBeacon('/api/plan/bulk_upsert', new Blob([JSON.stringify({entries: Array.from(m.values())})], {type: 'application/json'})); }); "
+    "window.PP.save = () => { clearTimeout(window.__pp_save_t); const sent = window.__pp_pending_map ? Array.from(window.__pp_pending_map.entries()) : []; "
+    "const pending = sent.map(([, v]) => v); window.PP.log('[PP] pending before save', pending);"
+    "if(!pending.length){ window.$nicegui?.notify?.('Нет изменений для сохранения'); return; }"
+    "fetch('/api/plan/bulk_upsert', {method:'POST', headers:{'Content-Type':'application/json'}, body: JSON.stringify({entries: pending})})"
+    ".then(r => (window.PP.log('[PP] bulk_upsert status', r.status), r.json()))"
+    ".then(j => {"
+    " window.PP.log('[PP] bulk_upsert response', j);"
+    " if(j && j.status==='ok'){ window.$nicegui?.notify?.('Сохранено записей: ' + (j.saved||0)); window.PP.ack(sent); emitEvent('plan_saved'); }"
+    " else { window.$nicegui?.notify?.('Ошибка сохранения: ' + (j && j.message ? j.message : 'unknown'), 'negative'); }"
+    "})"
+    ".catch(e => { console.error('[PP] bulk_upsert error', e); window.$nicegui?.notify?.('Ошибка сохранения: ' + e, 'negative'); }); };"
+    '</script>'
+)
+
+
+# Колонки таблицы выбора групп номенклатуры
+_GROUP_COLUMNS = [
+    {'name': 'code', 'label': 'Код', 'field': 'code', 'align': 'left', 'sortable': True},
+    {'name': 'name', 'label': 'Наименование', 'field': 'name', 'align': 'left', 'sortable': True},
+]
+
+# JS страницы настроек 1С: подключается один раз при загрузке страницы, обработчики кнопок вызывают
+# только window.odata.<метод>() вместо передачи исходника скрипта по websocket на каждый клик
+_ODATA_PAGE_JS = '''<script>
+window.odata = {
+  reindex() {
+    return fetch('/api/odata/reindex', {method: 'POST', headers: {'Content-Type': 'application/json'}})
+      .then(r => r.json())
+      .then(j => window.$nicegui.notify(j.message || JSON.stringify(j)))
+      .catch(e => window.$nicegui.notify('Ошибка запуска переиндексации: ' + e, 'negative'));
+  },
+  // Выгрузка групп номенклатуры с прогрессом в общем диалоге (#prog_bar / #prog_lbl)
+  exportGroups() {
+    const p = document.getElementById('prog_bar');
+    const l = document.getElementById('prog_lbl');
+    if (p) p.value = 5; if (l) l.textContent = '5%';
+    if (p) p.value = 15; if (l) l.textContent = '15%';
+    return fetch('/api/odata/categories/export_groups', {
+      method: 'POST',
+      headers: {'Content-Type': 'application/json'},
+      body: JSON.stringify({})
+    })
+    .then(r => {
+      if (p) p.value = 60; if (l) l.textContent = '60%';
+      if (!r.ok) throw new Error('HTTP ' + r.status);
+      return r.json();
+    })
+    .then(j => {
+      if (p) p.value = 90; if (l) l.textContent = '90%';
+      window.$nicegui.notify((j.message || 'Готово') + ' • всего: ' + (j.total || 0));
+    })
+    .catch(e => window.$nicegui.notify('Ошибка выгрузки групп: ' + e, 'negative'))
+    .finally(() => {
+      if (p) p.value = 100; if (l) l.textContent = '100%';
+      window.dispatchEvent(new CustomEvent('prog_close'));
+      setTimeout(() => window.dispatchEvent(new CustomEvent('prog_close')), 150);
+    });
+  },
+  // Запуск синхронизации номенклатуры и опрос статуса (#prog_bar / #prog_lbl)
+  startSync() {
+    const p = document.getElementById('prog_bar');
+    const l = document.getElementById('prog_lbl');
+    if (p) p.value = 0; if (l) l.textContent = 'Начало синхронизации...';
+    return fetch('/api/nomenclature/sync', {
+      method: 'POST',
+      headers: {'Content-Type': 'application/json'}
+    })
+    .then(r => { if (!r.ok) throw new Error('HTTP ' + r.status); return r.json(); })
+    .then(_ => {
+      // Опрос статуса с экспоненциальной паузой 0.5 → 5 с; перерисовка только при изменении
+      let delay = 500, last = null;
+      const done = () => window.dispatchEvent(new CustomEvent('prog_close'));
+      const tick = () => fetch('/api/nomenclature/sync/status')
+        .then(r => r.json())
+        .then(status => {
+          const v = Math.max(0, Math.min(100, Number(status.progress || 0)));
+          const key = v + '|' + (status.message || '');
+          if (key !== last) {
+            last = key;
+            if (p) p.value = v;
+            if (l) l.textContent = status.message || (v + '%');
+          }
+          if (status && status.running === false && (v === 0 || String(status.message || '').includes('завершена'))) {
+            return done();
+          }
+          delay = Math.min(5000, delay * 1.3);
+          setTimeout(tick, delay);
+        })
+        .catch(e => {
+          console.error('sync status error', e);
+          window.$nicegui?.notify?.('Ошибка статуса синхронизации: ' + e, 'negative');
+          done();
+        });
+      setTimeout(tick, delay);
+    })
+    .catch(e => {
+      window.$nicegui?.notify?.('Ошибка запуска синхронизации: ' + e, 'negative');
+      window.dispatchEvent(new CustomEvent('prog_close'));
+    });
+  },
+};
+</script>'''
+
+class _ProgressDialog:
+    """
+    Диалог с нативным HTML progress (#prog_bar / #prog_lbl), который обновляется из JS страницы.
+    Закрывается по событию prog_close.
+    """
+
+    def __init__(self) -> None:
+        self.dlg = ui.dialog()
+        with self.dlg, ui.card():
+            self.title = ui.label('')
+            ui.html('<progress id="prog_bar" max="100" value="0" style="width: 400px;"></progress>')
+            ui.html('<div id="prog_lbl" class="text-caption">0%</div>')
+        ui.on('prog_close', lambda _: self.dlg.close())
+
+    def open(self, title: str) -> None:
+        self.title.text = title
+        self.dlg.open()
+
+
+def _parse_folder_groups(path: Path) -> dict:
+    """
+    Группы номенклатуры (IsFolder=true) из выгрузки OData: {id: {'id', 'code', 'name'}}
+    в порядке кода и наименования.
+    """
+    data = json_loads(path.read_bytes())
+    vals = data.get('value', data) if isinstance(data, dict) else data
+    if isinstance(vals, dict):
+        vals = [vals]
+    groups = [
+        {
+            'id': str(g.get('Ref_Key') or ''),
+            'code': str(g.get('Code') or ''),
+            'name': str(g.get('Description') or ''),
+        }
+        for g in vals
+        if isinstance(g, dict) and (g.get('IsFolder') is True)
+    ]
+    groups.sort(key=lambda x: (x['code'], x['name']))
+    return {g['id']: g for g in groups}
+
+
+def _parse_folder_list(path: Path) -> dict:
+    """Готовый список групп [{id, code, name}] (уже отобран и отсортирован при выгрузке) -> {id: группа}."""
+    data = json_loads(path.read_bytes())
+    return {str(g.get('id') or ''): g for g in data if isinstance(g, dict)} if isinstance(data, list) else {}
+
+
+def _parse_json_list(path: Path) -> tuple:
+    return tuple(json_loads(path.read_bytes()) or [])
+
+
+def _render_result_row(rec: dict, on_add) -> None:
+    """Строка результата поиска номенклатуры: наименование, артикул, код и кнопка «Добавить»."""
+    article = str(rec.get('item_article') or '')
+    with ui.row().classes('items-center gap-2 w-full'):
+        ui.label(str(rec.get('item_name') or '') or '—').classes('flex-1')
+        ui.label(article if article.strip() else '—').classes('text-caption')
+        ui.label(str(rec.get('item_code') or '')).classes('text-caption text-grey-7')
+        ui.button('Добавить', on_click=lambda _e: on_add(rec)).props('dense color=primary outline')
 
 
 def register_routes() -> None:
@@ -31,45 +439,13 @@ def register_routes() -> None:
             ui.label('Начните работу со страницы "План выпуска техники"')
             # Панель быстрых операций (дублирует кнопки из хедера/дроуера — для явной видимости)
             with ui.row().classes('gap-2'):
-                ui.button(
-                    'Проверка API',
-                    on_click=lambda: ui.run_javascript(
-                        "fetch('/api/health')"
-                        ".then(r => r.json())"
-                        ".then(j => window.$nicegui.notify(JSON.stringify(j)))"
-                        ".catch(e => window.$nicegui.notify('Health error: ' + e, 'negative'))"
-                    ),
-                ).props('outline color=primary')
-                ui.button(
-                    'Обновить остатки',
-                    on_click=lambda: ui.run_javascript(
-                        "fetch('/api/sync/stock-history', {"
-                        "  method: 'POST',"
-                        "  headers: {'Content-Type': 'application/json'},"
-                        "  body: JSON.stringify({dir: 'ostatki', dry_run: false})"
-                        "})"
-                        ".then(r => r.json())"
-                        ".then(j => window.$nicegui.notify(j.message || JSON.stringify(j)))"
-                        ".catch(e => window.$nicegui.notify('Ошибка sync-stock-history: ' + e, 'negative'))"
-                    ),
-                ).props('outline color=blue')
-                ui.button(
-                    'Сгенерировать план',
-                    on_click=lambda: ui.run_javascript(
-                        "fetch('/api/generate/plan', {"
-                        "  method: 'POST',"
-                        "  headers: {'Content-Type': 'application/json'},"
-                        "  body: JSON.stringify({days: 30})"
-                        "})"
-                        ".then(r => r.json())"
-                        ".then(j => window.$nicegui.notify(j.message || JSON.stringify(j)))"
-                        ".catch(e => window.$nicegui.notify('Ошибка generate-plan: ' + e, 'negative'))"
-                    ),
-                ).props('color=positive')
+                action_button(ACT_HEALTH, 'outline color=primary')
+                action_button(ACT_SYNC_STOCK, 'outline color=blue')
+                action_button(ACT_GENERATE_PLAN, 'color=positive')
             ui.link('Перейти к плану', '/plan').classes('text-primary')
 
     @ui.page('/plan')
-    def plan_page() -> None:
+    async def plan_page() -> None:
         shell(active='plan')
         # Панель операций на странице плана убрана (кнопки доступны в header/drawer)
 
@@ -81,34 +457,88 @@ def register_routes() -> None:
             'limit': 200,           # для совместимости; не используется в server-side
             'page': 1,
             'page_size': 30,
-            'total': 0,
+            'has_next': False,
             'sort_by': 'item_name',
             'sort_dir': 'asc',
             'selected_item_id': None,
         }
         state['search_q'] = ''
         state['search_results'] = []
-
-        # Загрузка глобальной настройки горизонта из config/ui_settings.json
+        # Предзагруженные страницы матрицы плана: _page_key(page) -> ответ query_plan_matrix_paginated
+        state['_page_cache'] = {}
+        # Курсоры страниц матрицы: _page_key(page) -> next_cursor предыдущей страницы
+        state['_cursors'] = {}
+        state['_render_lock'] = asyncio.Lock()
+
+        # Загрузка глобальной настройки горизонта из config/ui_settings.json (один раз на страницу, вне event loop)
+        state['_ui_cfg'] = await asyncio.to_thread(_load_ui_settings)
         try:
-            from pathlib import Path as _Path
-            import json as _json
-            _ui_cfg_path = _Path('config') / 'ui_settings.json'
-            if _ui_cfg_path.exists():
-                _cfg = _json.loads(_ui_cfg_path.read_text('utf-8') or '{}')
-                if isinstance(_cfg, dict) and 'plan_horizon_days' in _cfg:
-                    state['days'] = int(_cfg.get('plan_horizon_days') or state['days'])
+            if 'plan_horizon_days' in state['_ui_cfg']:
+                state['days'] = int(state['_ui_cfg'].get('plan_horizon_days') or state['days'])
         except Exception:
             pass
 
-        def _run_search():
-            q = (state.get('search_q') or '').strip()
-            try:
-                state['search_results'] = search_items_with_index(q, limit=10) if len(q) >= 2 else []
-            except Exception as e:
-                ui.notify(f'Ошибка поиска: {e}', type='negative')
-                state['search_results'] = []
-            render_search_results.refresh()
+        def _stage_filter():
+            return None if state['stage_id'] in (0, None, '') else int(state['stage_id'])
+
+        def _page_key(p: int) -> tuple:
+            return (int(p), int(state['page_size']), _stage_filter(), int(state['days']),
+                    state['sort_by'], state['sort_dir'], state['start'])
+
+        def _query_page(p: int) -> dict:
+            # Курсор известен, если предыдущая страница уже загружалась: выборка по ключу (keyset) вместо OFFSET
+            data = query_plan_matrix_paginated(
+                start_date_str=state['start'],
+                days=int(state['days']),
+                stage_id=_stage_filter(),
+                page=int(p),
+                page_size=int(state['page_size']),
+                sort_by=state['sort_by'],
+                sort_dir=state['sort_dir'],
+                with_total=False,   # без COUNT: достаточно признака следующей страницы
+                cursor=state['_cursors'].get(_page_key(p)) if p > 1 else None,
+            )
+            if data.get('next_cursor'):
+                state['_cursors'][_page_key(p + 1)] = data['next_cursor']
+            return data
+
+        async def _prefetch_adjacent():
+            # Соседние страницы грузятся в фоне, чтобы ◀/▶ отрисовывались без запроса к БД
+            cache = state['_page_cache']
+            pages = [state['page'] + 1] if state['has_next'] else []
+            if state['page'] > 1:
+                pages.append(state['page'] - 1)
+            for p in pages:
+                key = _page_key(p)
+                if key in cache:
+                    continue
+                try:
+                    cache[key] = await asyncio.to_thread(_query_page, p)
+                except Exception:
+                    continue
+                while len(cache) > PAGE_CACHE_SIZE:
+                    cache.pop(next(iter(cache)))
+
+        async def _run_refresh():
+            if state.pop('_refresh_pending', False):
+                await render_table()
+
+        def _schedule_refresh():
+            # Несколько запросов на обновление за один тик (сохранение + горизонт и т.п.) сливаются в одно
+            if state.get('_refresh_pending'):
+                return
+            state['_refresh_pending'] = True
+            with grid_container:
+                ui.timer(0, _run_refresh, once=True)
+
+        def _drop_page_cache():
+            # Данные или параметры выборки изменились — предзагруженные страницы и курсоры неактуальны
+            state['_page_cache'].clear()
+            state['_cursors'].clear()
+
+        def _reload_table():
+            _drop_page_cache()
+            _schedule_refresh()
 
         def _add_item_to_plan(rec: dict):
             try:
@@ -119,27 +549,13 @@ def register_routes() -> None:
                     ui.notify('Не удалось определить код изделия', type='warning'); return
                 # Гарантируем наличие items и строки плана (root_products), как это делал Streamlit
                 ensure_root_product_by_code(item_code=code, item_name=name, item_article=article)
+                # Новая запись в items меняет результаты поиска (item_id) — кэш больше не актуален
+                _SEARCH_CACHE.clear()
                 ui.notify(f'Добавлено: {name or code}', type='positive')
-                render_table.refresh()
+                _reload_table()
             except Exception as e:
                 ui.notify(f'Ошибка добавления: {e}', type='negative')
 
-        @ui.refreshable
-        def render_search_results():
-            results = state.get('search_results') or []
-            with ui.column().classes('w-full gap-1'):
-                if not results:
-                    return
-                for r in results:
-                    name = str(r.get('item_name') or '')
-                    code = str(r.get('item_code') or '')
-                    article = str(r.get('item_article') or '')
-                    with ui.row().classes('items-center gap-2 w-full'):
-                        ui.label(name or '—').classes('flex-1')
-                        ui.label(article if article.strip() else '—').classes('text-caption')
-                        ui.label(code).classes('text-caption text-grey-7')
-                        ui.button('Добавить', on_click=lambda _e, rec=r: _add_item_to_plan(rec)).props('dense color=primary outline')
-
         # Диалог «Добавить изделие» с автокомплитом (строковый + семантический фолбэк по индексу)
         add_item_dlg = ui.dialog()
         with add_item_dlg:
@@ -153,60 +569,58 @@ def register_routes() -> None:
                     results = state.get('search_results') or []
                     if not results:
                         return
-                    for r in results:
-                        name = str(r.get('item_name') or '')
-                        code = str(r.get('item_code') or '')
-                        article = str(r.get('item_article') or '')
-                        with ui.row().classes('items-center gap-2 w-full'):
-                            ui.label(name or '—').classes('flex-1')
-                            ui.label(article if article.strip() else '—').classes('text-caption')
-                            ui.label(code).classes('text-caption text-grey-7')
-                            ui.button('Добавить',
-                                      on_click=lambda _e, rec=r: (_add_item_to_plan(rec), add_item_dlg.close())
-                                      ).props('dense color=primary outline')
+                    with results_box:
+                        for r in results:
+                            _render_result_row(r, lambda rec: (_add_item_to_plan(rec), add_item_dlg.close()))
 
-                def _on_add_query_change(e):
+                def _do_search(q: str, render: bool = True):
                     try:
-                        new_q = str(getattr(e, 'value', '') or getattr(e, 'args', '') or (add_search_input.value or ''))
-                        state['search_q'] = new_q
-                        state['search_results'] = search_items_with_index(new_q, limit=20) if len(new_q) >= 2 else []
-                        _render_add_results()
+                        state['search_q'] = q
+                        state['search_results'] = _search_cached(q, 20)
                     except Exception as _e:
                         ui.notify(f'Ошибка поиска: {_e}', type='negative')
                         state['search_results'] = []
+                    if render:
                         _render_add_results()
 
+                def _on_add_query_change(e):
+                    new_q = str(getattr(e, 'value', '') or getattr(e, 'args', '') or (add_search_input.value or ''))
+                    _schedule_search(new_q)
+
                 add_search_input.on('update:model-value', _on_add_query_change)
                 with ui.row().classes('justify-end w-full mt-2 gap-2'):
                     ui.button('Закрыть', on_click=add_item_dlg.close).props('outline')
 
+        def _cancel_search_timer():
+            t = state.pop('_search_timer', None)
+            if t is not None:
+                t.cancel()
+
+        def _schedule_search(q: str, render: bool = True):
+            # Каждое нажатие отменяет предыдущий таймер — до поиска доходит только последний запрос
+            _cancel_search_timer()
+            with add_item_dlg:
+                state['_search_timer'] = ui.timer(SEARCH_DEBOUNCE_SEC, lambda: _do_search(q, render), once=True)
+
+        add_item_dlg.on('hide', lambda _: _cancel_search_timer())
+
         def _open_add_dialog():
             state['search_q'] = ''
             state['search_results'] = []
             add_item_dlg.open()
 
         # Обработчик применения горизонта (должен быть определён до использования в верхней панели)
-        def _apply_horizon():
+        async def _apply_horizon():
             try:
                 new_days = int(horizon_input.value or state['days'])
                 if new_days < 1:
                     new_days = 1
                 state['days'] = new_days
-                # Сохраняем глобально в config/ui_settings.json
-                from pathlib import Path as _Path
-                import json as _json
-                p = _Path('config') / 'ui_settings.json'
-                p.parent.mkdir(parents=True, exist_ok=True)
-                data = {}
-                try:
-                    if p.exists():
-                        data = _json.loads(p.read_text('utf-8') or '{}') or {}
-                except Exception:
-                    data = {}
-                data['plan_horizon_days'] = new_days
-                p.write_text(_json.dumps(data, ensure_ascii=False, indent=2), encoding='utf-8')
+                # Сохраняем глобально в config/ui_settings.json: меняется только ключ в уже прочитанном словаре
+                state['_ui_cfg']['plan_horizon_days'] = new_days
+                await asyncio.to_thread(_save_ui_settings, dict(state['_ui_cfg']))
                 ui.notify('Горизонт обновлён', type='positive')
-                render_table.refresh()
+                _reload_table()
             except Exception as e:
                 ui.notify(f'Ошибка применения: {e}', type='negative')
         # Открытие диалога добавления по кастомному событию (Enter на последней строке)
@@ -221,42 +635,28 @@ def register_routes() -> None:
                                  .classes('min-w-[280px] max-w-[420px]')
 
             def _save_changes():
-                js = (
-                    "(()=>{ const pending = Array.isArray(window.__pp_pending) ? window.__pp_pending : []; "
-                    "console.log('[PP] pending before save', pending);"
-                    "if(!pending.length){ window.$nicegui?.notify?.('Нет изменений для сохранения'); return; }"
-                    "fetch('/api/plan/bulk_upsert', {method:'POST', headers:{'Content-Type':'application/json'}, body: JSON.stringify({entries: pending})})"
-                    ".then(r => (console.log('[PP] bulk_upsert status', r.status), r.json()))"
-                    ".then(j => {"
-                    " console.log('[PP] bulk_upsert response', j);"
-                    " if(j && j.status==='ok'){ window.$nicegui?.notify?.('Сохранено записей: ' + (j.saved||0)); window.__pp_pending = []; window.dispatchEvent(new CustomEvent('plan_saved')); }"
-                    " else { window.$nicegui?.notify?.('Ошибка сохранения: ' + (j && j.message ? j.message : 'unknown'), 'negative'); }"
-                    "})"
-                    ".catch(e => { console.error('[PP] bulk_upsert error', e); window.$nicegui?.notify?.('Ошибка сохранения: ' + e, 'negative'); }); })()"
-                )
-                ui.run_javascript(js)
+                ui.run_javascript('window.PP.save()')
 
             def _open_add_from_top():
                 try:
                     q = str(top_search_input.value or '').strip()
-                    state['search_q'] = q
-                    # префилл поля диалога и вычисление результатов
+                    _cancel_search_timer()
+                    # префилл поля диалога; результаты уже посчитаны отложенным поиском, если запрос не менялся
                     add_search_input.value = q
+                    if q != state.get('search_q'):
+                        _do_search(q, render=False)
                     try:
-                        state['search_results'] = search_items_with_index(q, limit=20) if len(q) >= 2 else []
-                    except Exception:
-                        state['search_results'] = []
-                    # перерисовать список результатов в диалоге
-                    try:
-                        # _render_add_results определён выше, внутри диалога
-                        # вызовем через его замыкание
-                        # если по какой-то причине отсутствует, просто откроем диалог
-                        pass
+                        _render_add_results()
                     finally:
                         add_item_dlg.open()
                 except Exception:
                     add_item_dlg.open()
 
+            # Отложенный поиск при вводе: к открытию диалога результаты уже готовы
+            top_search_input.on(
+                'update:model-value',
+                lambda e: _schedule_search(str(getattr(e, 'args', '') or '').strip(), render=False),
+            )
             # Enter в поле поиска открывает диалог «Добавить»
             top_search_input.on('keydown.enter', lambda e: _open_add_from_top())
 
@@ -273,43 +673,21 @@ def register_routes() -> None:
 
 
         # Перерисовать таблицу после успешного сохранения
-        ui.on('plan_saved', lambda _: render_table.refresh())
-
-        # Управление горизонтом (глобальная настройка)
-        def _apply_horizon():
-            try:
-                new_days = int(horizon_input.value or state['days'])
-                if new_days < 1:
-                    new_days = 1
-                state['days'] = new_days
-                # Сохраняем глобально в config/ui_settings.json
-                from pathlib import Path as _Path
-                import json as _json
-                p = _Path('config') / 'ui_settings.json'
-                p.parent.mkdir(parents=True, exist_ok=True)
-                data = {}
-                try:
-                    if p.exists():
-                        data = _json.loads(p.read_text('utf-8') or '{}') or {}
-                except Exception:
-                    data = {}
-                data['plan_horizon_days'] = new_days
-                p.write_text(_json.dumps(data, ensure_ascii=False, indent=2), encoding='utf-8')
-                ui.notify('Горизонт обновлён', type='positive')
-                render_table.refresh()
-            except Exception as e:
-                ui.notify(f'Ошибка применения: {e}', type='negative')
+        ui.on('plan_saved', lambda _: _reload_table())
+        # Автосохранение: сетка уже показывает правки, перерисовка не нужна (сбила бы редактирование),
+        # но соседние страницы могли быть предзагружены до записи в БД
+        ui.on('plan_autosaved', lambda _: _drop_page_cache())
 
         # (панель объединена выше в единый ряд)
 
 
         def _apply_filters():
             state['page'] = 1
-            render_table.refresh()
+            _reload_table()
 
         def _set_page(p: int):
             state['page'] = int(max(1, p))
-            render_table.refresh()
+            _schedule_refresh()
 
         def _export(fmt: str):
             stage_id = None if state['stage_id'] in (0, None, '') else int(state['stage_id'])
@@ -319,152 +697,101 @@ def register_routes() -> None:
             ui.run_javascript(f"window.open('/api/plan/export?{qs}', '_blank')")
 
         # Справочник этапов
-        stage_map = {0: 'Все этапы'}
-        try:
-            _stages = fetch_stages()
-            stage_map.update({int(s['value']): str(s['label']) for s in _stages})
-        except Exception as e:
-            ui.notify(f'Ошибка загрузки этапов: {e}', type='warning')
+        state['stage_map'] = {0: 'Все этапы'}
+
+        async def _load_stages():
+            # Загружается один раз после подключения клиента, не блокируя построение страницы
+            try:
+                _stages = await asyncio.to_thread(fetch_stages)
+                state['stage_map'].update({int(s['value']): str(s['label']) for s in _stages})
+            except Exception as e:
+                ui.notify(f'Ошибка загрузки этапов: {e}', type='warning')
+
+        ui.timer(0, _load_stages, once=True)
 
         # Вынести за пределы функции!
         grid_container = ui.column().classes('w-full')
 
-        @ui.refreshable
-        def render_table() -> None:
-            import datetime as _dt
-            # Загружаем матрицу плана по дням (левый столбец — сегодня)
+        # CSS для выходных/праздников: один раз на страницу, а не на каждый refresh таблицы
+        ui.add_head_html(_PLAN_GRID_CSS)
+        ui.add_body_html(_PLAN_PAGE_JS)
+
+        def _update_pager():
+            state['page_label'].text = f"Страница {state['page']}"
+            state['next_btn'].set_enabled(bool(state['has_next']))
+
+        def _arm_prefetch():
+            # Предзагрузка соседних страниц после каждой отрисовки; предыдущий неотработавший таймер отменяется
+            t = state.pop('_prefetch_timer', None)
+            if t is not None:
+                t.cancel()
+            with grid_container:
+                state['_prefetch_timer'] = ui.timer(PAGE_PREFETCH_DELAY_SEC, _prefetch_adjacent, once=True)
+
+        def _update_grid(grid, rows: list, dates: list, js_stage: str) -> None:
+            # Обновление на месте: колонки меняются только при смене набора дат, строки — через setGridOption
+            if tuple(dates) != state.get('_grid_dates'):
+                column_defs = list(_BASE_COLUMNS) + list(_build_day_columns(tuple(dates)))
+                grid.options['columnDefs'] = column_defs
+                grid.run_grid_method('setGridOption', 'columnDefs', column_defs)
+                state['_grid_dates'] = tuple(dates)
+            grid.options['rowData'] = rows
+            grid.run_grid_method('setGridOption', 'rowData', rows)
+            sel = state.get('selected_item_id')
+            ui.run_javascript(
+                f"(()=>{{ try{{ window.__pp_stage = {js_stage}; "
+                f"const g = getElement({grid.id}); const api = g && (g.api || (g.gridOptions && g.gridOptions.api)); "
+                f"const sel = {'null' if sel is None else int(sel)}; "
+                "if(api && sel !== null){ api.forEachNode(n => { if(n.data && n.data.item_id === sel) n.setSelected(true); }); } "
+                "}catch(e){} })()"
+            )
+
+        async def render_table() -> None:
+            # Отрисовки идут по очереди: иначе первая загрузка и ранний refresh создали бы две сетки
+            async with state['_render_lock']:
+                await _render_table()
+
+        async def _render_table() -> None:
+            # Загружаем матрицу плана по дням (левый столбец — сегодня); запрос к БД — в отдельном потоке
             try:
                 # Самый левый день всегда текущий: перед каждым рендером фиксируем старт = сегодня
                 state['start'] = _date.today().isoformat()
-                stage_id = None if state['stage_id'] in (0, None, '') else int(state['stage_id'])
-                data = query_plan_matrix_paginated(
-                    start_date_str=state['start'],
-                    days=int(state['days']),
-                    stage_id=stage_id,
-                    page=int(state['page']),
-                    page_size=int(state['page_size']),
-                    sort_by=state['sort_by'],
-                    sort_dir=state['sort_dir'],
-                )
-                rows = data.get('rows', [])
+                stage_id = _stage_filter()
+                # Страница могла быть предзагружена после предыдущей отрисовки
+                data = state['_page_cache'].pop(_page_key(state['page']), None)
+                if data is None:
+                    data = await asyncio.to_thread(_query_page, state['page'])
                 dates = [str(d) for d in (data.get('dates') or [])]
-                state['total'] = int(data.get('total', 0))
-                # Трансформируем rows в плоский вид полей по дням (чтобы AG‑Grid редактировал field, а не valueGetter)
-                rows2 = []
-                try:
-                    for r in (rows or []):
-                        r2 = dict(r)
-                        r_days = dict(r.get('days') or {})
-                        for ds in dates:
-                            try:
-                                r2[f"d_{ds}"] = int(r_days.get(ds, 0))
-                            except Exception:
-                                r2[f"d_{ds}"] = 0
-                        rows2.append(r2)
-                except Exception:
-                    rows2 = rows
+                rows = _grid_rows(data.get('rows') or [], dates)
+                state['has_next'] = bool(data.get('has_next'))
             except Exception as e:
                 rows = []
                 dates = []
                 ui.notify(f'Ошибка загрузки плана: {e}', type='negative')
 
-            # CSS для выходных/праздников
-            ui.add_head_html('''
-            <style>
-              .weekend-col .ag-header-cell-label { background: #f2f2f2 !important; }
-              .weekend-cell { background: #fafafa !important; }
-              .holiday-col .ag-header-cell-label { background: #e8f0fe !important; }
-              .holiday-cell { background: #f3f8ff !important; }
-            </style>
-            ''')
-
-            # Определяем выходные и праздники РФ
-            weekends = set()
-            holidays_ru = set()
-            try:
-                import holidays as _hol
-                years = set()
-                for ds in dates:
-                    try:
-                        d = _dt.date.fromisoformat(ds); years.add(d.year)
-                    except Exception:
-                        pass
-                ru = _hol.country_holidays('RU', years=sorted(years)) if years else set()
-            except Exception:
-                ru = set()
-
-            for ds in dates:
-                try:
-                    d = _dt.date.fromisoformat(ds)
-                    if d.weekday() >= 5:
-                        weekends.add(ds)
-                    if ru and d in ru:
-                        holidays_ru.add(ds)
-                except Exception:
-                    pass
-
-            # Базовые колонки
-            column_defs = [
-                {'headerName': 'Изделие', 'field': 'item_name', 'pinned': 'left', 'minWidth': 200},
-                {'headerName': 'Артикул', 'field': 'item_article', 'minWidth': 120},
-                {'headerName': 'Код', 'field': 'item_code', 'minWidth': 120, 'hide': True},
-                {'headerName': 'План на месяц', 'field': 'month_plan', 'type': 'rightAligned', 'minWidth': 120},
-                {'headerName': 'ID', 'field': 'item_id', 'hide': True},
-            ]
-
-            # Динамические колонки по дням
             js_stage = 'null' if stage_id is None else str(stage_id)
-            for ds in dates:
-                try:
-                    d = _dt.date.fromisoformat(ds); header = d.strftime('%d.%m')
-                except Exception:
-                    header = ds
-                is_weekend = ds in weekends
-                is_holiday = ds in holidays_ru
-                header_class = 'holiday-col' if is_holiday else ('weekend-col' if is_weekend else '')
-                cell_class = 'holiday-cell' if is_holiday else ('weekend-cell' if is_weekend else '')
-                # Поле данных для редактирования этой даты: d_YYYY-MM-DD (заполнено в rows2)
-                field_key = f"d_{ds}"
-                value_setter = (
-                    "function(params){ "
-                    "  const nv = Number(params.newValue) || 0; "
-                    "  if(!Number.isFinite(nv) || nv < 0) return false; "
-                    f"  params.data['d_{ds}'] = Math.floor(nv); "
-                    "  try { let sum = 0; for(const k in params.data){ if(k && k.startsWith('d_')) sum += Number(params.data[k]||0); } params.data['month_plan'] = sum; } catch(_e) {} "
-                    f"  try{{ window.__pp_add_change && window.__pp_add_change(params.data.item_id, '{ds}', Math.floor(nv)); }}catch(__e){{}} "
-                    "  return true; "
-                    "}"
-                )
-                column_defs.append({
-                    'headerName': header,
-                    'colId': ds,                 # идентификатор дня для логики сохранения
-                    'field': field_key,          # редактируемое поле данных
-                    'type': 'rightAligned',
-                    'editable': True,
-                    'cellEditor': 'agNumberCellEditor',
-                    'cellEditorParams': {'min': 0, 'precision': 0, 'step': 1},
-                    'valueSetter': value_setter,
-                    'valueFormatter': "params.value != null ? String(params.value) : '0'",
-                    'headerClass': header_class,
-                    'cellClass': cell_class,
-                })
-
-            total_pages = max(1, (state['total'] + state['page_size'] - 1) // state['page_size'])
-
-            # Очищаем контейнер перед перерисовкой
+
+            # Сетка уже создана — обновляем данные без пересоздания ui.aggrid
+            grid = state.get('grid')
+            if grid is not None:
+                _update_grid(grid, rows, dates, js_stage)
+                _update_pager()
+                _arm_prefetch()
+                return
+
+            # Базовые колонки + колонки по дням (кэшируются по набору дат)
+            column_defs = list(_BASE_COLUMNS) + list(_build_day_columns(tuple(dates)))
+            state['_grid_dates'] = tuple(dates)
+
+            # Убираем скелетон, показанный до первой загрузки
             grid_container.clear()
-            
             with grid_container:
                 grid_options = {
                     'columnDefs': column_defs,
-                    'rowData': rows2,
+                    'rowData': rows,
                     'defaultColDef': {
                         'resizable': True,
                     },
-                    'autoSizeStrategy': {
-                        'type': 'fitCellContents',
-                        'skipHeader': False,
-                    },
                     'rowHeight': 26,
                     'suppressColumnVirtualisation': False,
                     'singleClickEdit': True,
@@ -475,54 +802,67 @@ def register_routes() -> None:
                     'undoRedoCellEditing': True,
                     'enableCellTextSelection': True,
                     'rowSelection': 'single',
+                    # Рендер только видимой области (+5 строк буфера) и без анимаций
+                    'rowBuffer': 5,
+                    'animateRows': False,
+                    'suppressRowHoverHighlight': True,
+                    'suppressColumnMoveAnimation': True,
+                    'cellFlashDelay': 0,
                 }
                 
                 # Авторазмер с фолбэком (единый обработчик) и вспомогательные события
                 grid_options['onFirstDataRendered'] = (
                     f"(p)=>{{ "
-                    f" try{{ window.__pp_pending = []; window.__pp_stage = {js_stage}; }}catch(e){{}} "
+                    f" try{{ window.__pp_pending_map = new Map(); window.__pp_stage = {js_stage}; }}catch(e){{}} "
+                    # Ширины колонок: замер по содержимому только для базовых колонок и только при первом открытии,
+                    # дальше — из localStorage (колонки-дни имеют фиксированную ширину и не измеряются)
                     " setTimeout(()=>{ try{ "
-                    "  if(p.columnApi && p.columnApi.autoSizeAllColumns){ p.columnApi.autoSizeAllColumns(); } "
-                    "  else if(p.api && p.api.sizeColumnsToFit){ p.api.sizeColumnsToFit(); } "
+                    "  const capi = p.columnApi || p.api; "
+                    f"  const saved = localStorage.getItem('{_COL_STATE_KEY}'); "
+                    "  if(saved){ capi.applyColumnState({state: JSON.parse(saved), applyOrder: false}); } "
+                    "  else { "
+                    f"   if(capi.autoSizeColumns){{ capi.autoSizeColumns({_js_list(_AUTOSIZE_COLUMNS)}); }} "
+                    "   window.__pp_save_col_state && window.__pp_save_col_state(capi); "
+                    "  } "
                     " }catch(e){} }, 0); "
+                    " try{ window.__pp_save_col_state = function(capi){ try{ "
+                    "   const st = capi.getColumnState().filter(c => !/^\\d{4}-\\d{2}-\\d{2}$/.test(String(c.colId))); "
+                    f"   localStorage.setItem('{_COL_STATE_KEY}', JSON.stringify(st)); "
+                    " }catch(err){} }; }catch(e){} "
                     " try{ window.__pp_add_change = function(item_id, date, qty){ "
-                    "   try{ if(!Array.isArray(window.__pp_pending)) window.__pp_pending = []; "
-                    "       const key = String(item_id)+'|'+String(date)+'|'+String(window.__pp_stage??'null'); "
-                    "       let found=false; "
-                    "       for(let i=0;i<window.__pp_pending.length;i++){ const e=window.__pp_pending[i]; "
-                    "           const ek = String(e.item_id)+'|'+String(e.date)+'|'+String(e.stage_id??'null'); "
-                    "           if(ek===key){ window.__pp_pending[i].qty = qty; found=true; break; } } "
-                    "       if(!found){ window.__pp_pending.push({item_id:item_id, date:date, qty:qty, stage_id:(window.__pp_stage??null)}); } "
+                    "   try{ if(!window.__pp_pending_map) window.__pp_pending_map = new Map(); "
+                    "       const stage = (window.__pp_stage ?? null); "
+                    "       const key = String(item_id)+'|'+String(date)+'|'+String(stage??'null'); "
+                    "       window.__pp_pending_map.set(key, {item_id:item_id, date:date, qty:qty, stage_id:stage}); "
                     "   }catch(err){} "
                     " }; }catch(e){} "
                     "}"
                 )
-                grid_options['onGridSizeChanged'] = "(p)=>{}"
+                # Ручное изменение ширины сохраняется для следующих открытий страницы
+                grid_options['onColumnResized'] = (
+                    "(e)=>{ try{ if(e && e.finished && String(e.source||'').startsWith('ui')){ "
+                    " window.__pp_save_col_state && window.__pp_save_col_state(e.columnApi || e.api); } }catch(err){} }"
+                )
                 grid_options['onCellClicked'] = (
                     "(e)=>{ try{ const id = e && e.colDef && e.colDef.colId; "
                     "if(id && /^\\d{4}-\\d{2}-\\d{2}$/.test(String(id))){ "
-                    " e.api.startEditingCell({ rowIndex: e.node.rowIndex, colKey: 'd_'+id }); } }catch(err){} }"
+                    " e.api.startEditingCell({ rowIndex: e.node.rowIndex, colKey: String(id) }); } }catch(err){} }"
                 )
-                grid_options['onGridReady'] = "(p)=>{}"
-                grid_options['onCellEditingStarted'] = "(e)=>console.log('Edit started:', e?.column?.colId || e?.column?.getColId?.(), 'value:', e?.value)"
-                grid_options['onCellEditingStopped']  = "(e)=>console.log('Edit stopped:',  e?.column?.colId || e?.column?.getColId?.(), 'new:', e?.newValue)"
+                grid_options['onCellEditingStarted'] = "(e)=>window.__pp_debug && window.PP.log('Edit started:', e?.column?.colId || e?.column?.getColId?.(), 'value:', e?.value)"
+                grid_options['onCellEditingStopped']  = "(e)=>window.__pp_debug && window.PP.log('Edit stopped:',  e?.column?.colId || e?.column?.getColId?.(), 'new:', e?.newValue)"
                 # Логирование и дублирование добавления в буфер изменений
                 grid_options['onCellValueChanged'] = (
                     "(e)=>{ try{ const colId = e && e.colDef && e.colDef.colId; const field = e && e.colDef && e.colDef.field; "
-                    " console.log('[PP] cellValueChanged', {colId, field, item_id: e?.data?.item_id, old: e.oldValue, new: e.newValue}); "
+                    " if(window.__pp_debug) window.PP.log('[PP] cellValueChanged', {colId, field, item_id: e?.data?.item_id, old: e.oldValue, new: e.newValue}); "
                     " if(colId && /^\\d{4}-\\d{2}-\\d{2}$/.test(String(colId))){ "
                     "   const newQty = Number(e.newValue||0); "
                     "   if(!Number.isFinite(newQty) || newQty < 0){ return; } "
-                    "   if(!Array.isArray(window.__pp_pending)) window.__pp_pending = []; "
+                    "   if(!window.__pp_pending_map) window.__pp_pending_map = new Map(); "
                     "   const stage = (window.__pp_stage ?? null); "
                     "   const key = String(e.data.item_id)+'|'+String(colId)+'|'+String(stage??'null'); "
-                    "   let found=false; "
-                    "   for(let i=0;i<window.__pp_pending.length;i++){ const x=window.__pp_pending[i]; "
-                    "     const k = String(x.item_id)+'|'+String(x.date)+'|'+String(x.stage_id??'null'); "
-                    "     if(k===key){ window.__pp_pending[i].qty = Math.floor(newQty); found=true; break; } "
-                    "   } "
-                    "   if(!found){ window.__pp_pending.push({item_id:e.data.item_id, date:String(colId), qty:Math.floor(newQty), stage_id:stage}); } "
-                    "   console.log('[PP] pending updated', window.__pp_pending); "
+                    "   window.__pp_pending_map.set(key, {item_id:e.data.item_id, date:String(colId), qty:Math.floor(newQty), stage_id:stage}); "
+                    "   if(window.__pp_debug) window.PP.log('[PP] pending updated', window.__pp_pending_map.size); "
+                    "   window.PP && window.PP.scheduleAutoSave && window.PP.scheduleAutoSave(); "
                     " } "
                     "}catch(ex){ console.error('[PP] onCellValueChanged error', ex);} }"
                 )
@@ -553,17 +893,21 @@ def register_routes() -> None:
                 
                 # Проверка версии AG Grid
                 ui.run_javascript(
-                    "console.log('AG Grid version:', window.agGrid?.VERSION || window.agGrid?.version || 'unknown');"
+                    "window.PP.log('AG Grid version:', window.agGrid?.VERSION || window.agGrid?.version || 'unknown');"
                 )
 
+                state['grid'] = grid
+
                 # Пагинация и статус
                 with ui.row().classes('items-center justify-between w-full mt-2'):
-                    ui.label(f"Страница {state['page']} из {total_pages} • Всего записей: {state['total']}")
+                    state['page_label'] = ui.label()
                     with ui.row().classes('gap-2'):
                         ui.button('⏮', on_click=lambda: _set_page(1)).props('dense outline')
                         ui.button('◀', on_click=lambda: _set_page(max(1, state['page'] - 1))).props('dense outline')
-                        ui.button('▶', on_click=lambda: _set_page(min(total_pages, state['page'] + 1))).props('dense outline')
-                        ui.button('⏭', on_click=lambda: _set_page(total_pages)).props('dense outline')
+                        state['next_btn'] = ui.button('▶', on_click=lambda: _set_page(state['page'] + 1)).props('dense outline')
+                _update_pager()
+
+            _arm_prefetch()
 
         # Макет страницы: таблица и редактор
         with ui.row().classes('w-full items-start gap-4'):
@@ -571,7 +915,10 @@ def register_routes() -> None:
 
             # Правая колонка: таблица и действия
             with ui.column().classes('flex-1'):
-                render_table()
+                # Скелетон на месте таблицы; сама таблица строится после подключения клиента без блокировки страницы
+                with grid_container:
+                    ui.skeleton('rect').classes('w-full h-[70vh]')
+                ui.timer(0, render_table, once=True)
                 # Авто-рефреш отключён: таблица статична до явных действий (Сохранить/Добавить/Применить)
 
 
@@ -595,16 +942,13 @@ def register_routes() -> None:
 @ui.page('/settings/odata')
 def odata_settings_page() -> None:
     shell(active='settings')
+    ui.add_body_html(_ODATA_PAGE_JS)
+    # Один диалог прогресса на страницу: выгрузка групп и синхронизация показываются в нём по очереди
+    progress = _ProgressDialog()
     ui.label('Настройки синхронизации 1С').classes('text-h6 mb-2')
 
-    # Загрузка текущего конфига для предзаполнения полей
-    try:
-        from pathlib import Path as _Path
-        import json as _json
-        _cfg_path = _Path('config') / 'odata_config.json'
-        _cfg = _json.loads(_cfg_path.read_text('utf-8')) if _cfg_path.exists() else {}
-    except Exception:
-        _cfg = {}
+    # Загрузка текущего конфига для предзаполнения полей (кэш по mtime: без разбора JSON на каждый заход)
+    _cfg = load_json_cached(ODATA_CONFIG_PATH)
 
     with ui.card().classes('w-full max-w-2xl'):
         with ui.column().classes('gap-2'):
@@ -612,157 +956,95 @@ def odata_settings_page() -> None:
             user_input = ui.input('Имя пользователя (username)', value=str(_cfg.get('username', '') or '')).props('dense')
             pass_input = ui.input('Пароль (password)', value=str(_cfg.get('password', '') or '')).props('type=password dense')
 
+            def _get_client() -> OData1CClient:
+                # Клиент на urllib не держит соединений — создаётся на каждое действие из текущих полей
+                return OData1CClient(
+                    base_url=base_input.value,
+                    username=(user_input.value or '').strip() or None,
+                    password=pass_input.value or None,
+                    token=None,
+                )
+
             def _save_cfg():
                 try:
-                    from pathlib import Path as _Path
-                    import json as _json
-                    _p = _Path('config') / 'odata_config.json'
-                    _p.parent.mkdir(parents=True, exist_ok=True)
-                    _base = (base_input.value or '').strip().rstrip('/')
-                    if _base.lower().endswith('$metadata'):
-                        _base = _base[: -len('$metadata')].rstrip('/')
+                    _p = ODATA_CONFIG_PATH
+                    _base = normalize_base_url(base_input.value)
                     _data = {
                         'base_url': _base,
                         'username': (user_input.value or '').strip(),
                         'password': pass_input.value or '',
                         # сохраняем совместимые поля, если файл уже есть:
                     }
-                    try:
-                        if _p.exists():
-                            old = _json.loads(_p.read_text('utf-8')) or {}
-                            # переносим дополнительные поля (например, entity_name, select_fields), если они были
-                            for k in ('entity_name', 'select_fields'):
-                                if k in old and k not in _data:
-                                    _data[k] = old[k]
-                    except Exception:
-                        pass
-                    _p.write_text(_json.dumps(_data, ensure_ascii=False, indent=2), encoding='utf-8')
+                    # переносим дополнительные поля (например, entity_name, select_fields), если они были;
+                    # разобранный файл берётся из кэша по mtime и перечитывается, только если файл изменился
+                    old = load_json_cached(_p)
+                    for k in ('entity_name', 'select_fields'):
+                        if k in old and k not in _data:
+                            _data[k] = old[k]
+                    write_bytes_atomic(_p, json_dumps(_data))
                     ui.notify('Настройки сохранены в config/odata_config.json', type='positive')
                 except Exception as e:
                     ui.notify(f'Ошибка сохранения настроек: {e}', type='negative')
 
-            def _js_escape(s: str) -> str:
-                return (str(s or '')).replace('\\', '\\\\').replace("'", "\\'")
-
-            def _test_conn():
+            # Запросы к 1С блокирующие (urllib): выполняются в пуле потоков, цикл событий UI не блокируется
+            async def _test_conn():
                 try:
-                    from src.odata_client import OData1CClient as _Client
-                    base = (base_input.value or '').strip()
-                    if base.lower().endswith('$metadata'):
-                        base = base[: -len('$metadata')].rstrip('/')
-                    client = _Client(
-                        base_url=base,
-                        username=(user_input.value or '').strip() or None,
-                        password=pass_input.value or None,
-                        token=None,
-                    )
-                    resp = client._make_request('$metadata')
+                    client = _get_client()
+                    resp = await asyncio.to_thread(client._make_request, '$metadata')
+                    # Размер берётся из ответа клиента, без повторного кодирования/сериализации тела
                     if isinstance(resp, dict) and '_raw' in resp:
-                        raw = str(resp.get('_raw') or '')
-                        ui.notify(f'Подключение успешно • $metadata {len(raw.encode("utf-8", "ignore"))} bytes', type='positive')
+                        ui.notify(f'Подключение успешно • $metadata {resp.get("_bytes", 0)} bytes', type='positive')
                     else:
-                        import json as _json
-                        ui.notify(f'Подключение успешно • JSON ({len(_json.dumps(resp, ensure_ascii=False))} bytes)', type='positive')
+                        vals = resp.get('value') if isinstance(resp, dict) else resp
+                        count = f' • записей: {len(vals)}' if isinstance(vals, list) else ''
+                        ui.notify(f'Подключение успешно • JSON{count}', type='positive')
                 except Exception as e:
                     ui.notify(f'Ошибка теста подключения: {e}', type='negative')
 
-            def _fetch_metadata():
+            async def _fetch_metadata():
                 try:
-                    from src.odata_client import OData1CClient as _Client
-                    from pathlib import Path as _Path
-                    import json as _json
-                    base = (base_input.value or '').strip()
-                    if base.lower().endswith('$metadata'):
-                        base = base[: -len('$metadata')].rstrip('/')
-                    client = _Client(
-                        base_url=base,
-                        username=(user_input.value or '').strip() or None,
-                        password=pass_input.value or None,
-                        token=None,
-                    )
-                    resp = client._make_request('$metadata')
-                    if isinstance(resp, dict) and '_raw' in resp:
-                        xml_text = str(resp.get('_raw') or '')
-                    else:
-                        xml_text = f'<!-- non-XML response -->\n{_json.dumps(resp, ensure_ascii=False, indent=2)}'
-                    out_xml = _Path('output') / 'odata_metadata.xml'
-                    out_sum = _Path('output') / 'odata_metadata_summary.json'
-                    out_xml.parent.mkdir(parents=True, exist_ok=True)
-                    out_xml.write_text(xml_text, encoding='utf-8')
-                    # simple summary
-                    summary = {"entities": [], "entity_sets": []}
-                    try:
-                        for line in xml_text.splitlines():
-                            s = line.strip()
-                            if 'EntitySet Name=' in s and 'EntityType=' in s:
-                                i = s.find('Name="') + 6; j = s.find('"', i)
-                                if i > 5 and j > i:
-                                    summary["entity_sets"].append(s[i:j])
-                            elif '<EntityType Name=' in s:
-                                i = s.find('Name="') + 6; j = s.find('"', i)
-                                if i > 5 and j > i:
-                                    summary["entities"].append(s[i:j])
-                    except Exception:
-                        pass
-                    out_sum.write_text(_json.dumps(summary, ensure_ascii=False, indent=2), encoding='utf-8')
+                    client = _get_client()
+                    out_xml = OUTPUT_XML
+                    out_sum = OUTPUT_SUMMARY
+
+                    def _download():
+                        # Условный GET: при неизменных метаданных сервер отвечает 304 без тела
+                        v = load_json_cached(OUTPUT_XML_VALIDATORS) if out_xml.exists() and out_sum.exists() else {}
+                        headers = {'If-None-Match': v.get('etag'), 'If-Modified-Since': v.get('last_modified')}
+                        # Валидаторы снимаются до загрузки: если она не завершится, следующий запрос будет полным
+                        OUTPUT_XML_VALIDATORS.unlink(missing_ok=True)
+                        # Тело ответа пишется потоком в <xml>.part и заменяет XML только целиком
+                        resp = client._make_request('$metadata', stream_to=out_xml, extra_headers=headers)
+                        if resp.get('_not_modified'):
+                            write_bytes_atomic(OUTPUT_XML_VALIDATORS, json_dumps(v))
+                            return None
+                        summary = metadata_summary_file(out_xml)
+                        write_bytes_atomic(out_sum, json_dumps(summary))
+                        write_bytes_atomic(OUTPUT_XML_VALIDATORS, json_dumps({
+                            'etag': resp.get('_etag'),
+                            'last_modified': resp.get('_last_modified'),
+                        }))
+                        return summary
+
+                    summary = await asyncio.to_thread(_download)
+                    if summary is None:
+                        ui.notify(f'Метаданные не изменились • XML: {out_xml}', type='info')
+                        return
                     ui.notify(f'Метаданные выгружены • XML: {out_xml} • EntitySets: {len(summary.get("entity_sets", []))}', type='positive')
                 except Exception as e:
                     ui.notify(f'Ошибка выгрузки метаданных: {e}', type='negative')
 
             def _force_reindex():
-                ui.run_javascript(
-                    "fetch('/api/odata/reindex', {method:'POST', headers:{'Content-Type':'application/json'}})"
-                    ".then(r => r.json())"
-                    ".then(j => window.$nicegui.notify(j.message || JSON.stringify(j)))"
-                    ".catch(e => window.$nicegui.notify('Ошибка запуска переиндексации: ' + e, 'negative'))"
-                )
-
-            # Диалог прогресса и обработчик для выгрузки групп номенклатуры (IsFolder=true)
-            progress_dlg = ui.dialog()
-            with progress_dlg:
-                with ui.card():
-                    ui.label('Выгрузка групп номенклатуры…')
-                    ui.html('<progress id="odata_exp_prog" max="100" value="0" style="width: 400px;"></progress>')
-                    ui.html('<div id="odata_exp_lbl" class="text-caption">0%</div>')
+                ui.run_javascript('window.odata.reindex()')
 
+            # Выгрузка групп номенклатуры (IsFolder=true) с прогрессом в общем диалоге
             def _export_groups():
                 try:
-                    progress_dlg.open()
-                    js = (
-                        "(() => {"
-                        "  const p = document.getElementById('odata_exp_prog');"
-                        "  const l = document.getElementById('odata_exp_lbl');"
-                        "  if (p) p.value = 5; if (l) l.textContent = '5%';"
-                        "  if (p) p.value = 15; if (l) l.textContent = '15%';"
-                        "  return fetch('/api/odata/categories/export_groups', {"
-                        "    method: 'POST',"
-                        "    headers: {'Content-Type': 'application/json'},"
-                        "    body: JSON.stringify({})"
-                        "  })"
-                        "  .then(r => {"
-                        "    if (p) p.value = 60; if (l) l.textContent = '60%';"
-                        "    if (!r.ok) throw new Error('HTTP ' + r.status);"
-                        "    return r.json();"
-                        "  })"
-                        "  .then(j => {"
-                        "    if (p) p.value = 90; if (l) l.textContent = '90%';"
-                        "    window.$nicegui.notify((j.message || 'Готово') + ' • всего: ' + (j.total || 0));"
-                        "  })"
-                        "  .catch(e => window.$nicegui.notify('Ошибка выгрузки групп: ' + e, 'negative'))"
-                        "  .finally(() => {"
-                        "    if (p) p.value = 100; if (l) l.textContent = '100%';"
-                        "    window.dispatchEvent(new CustomEvent('close_progress'));"
-                        "    setTimeout(() => window.dispatchEvent(new CustomEvent('close_progress')), 150);"
-                        "  });"
-                        "})()"
-                    )
-                    ui.run_javascript(js)
+                    progress.open('Выгрузка групп номенклатуры…')
+                    ui.run_javascript('window.odata.exportGroups()')
                 except Exception as e:
                     ui.notify(f'Ошибка запуска выгрузки: {e}', type='negative')
 
-            # Закрытие диалога после завершения JS-фетча (через custom event)
-            ui.on('close_progress', lambda _: progress_dlg.close())
-
             with ui.row().classes('gap-2'):
                 ui.button('Сохранить настройки', on_click=_save_cfg).props('outline')
                 ui.button('Тест подключения', on_click=_test_conn).props('color=primary')
@@ -775,13 +1057,7 @@ def odata_settings_page() -> None:
         ui.label('Синхронизация номенклатуры').classes('text-h6 mb-2')
         
         # Загрузка текущих настроек синхронизации
-        try:
-            from pathlib import Path as _Path
-            import json as _json
-            _sync_cfg_path = _Path('config') / 'nomenclature_sync_config.json'
-            _sync_cfg = _json.loads(_sync_cfg_path.read_text('utf-8')) if _sync_cfg_path.exists() else {}
-        except Exception:
-            _sync_cfg = {}
+        _sync_cfg = load_json_cached(SYNC_CONFIG_PATH)
         
         with ui.column().classes('gap-2'):
             # Поля ввода для периодичности и времени старта
@@ -790,28 +1066,14 @@ def odata_settings_page() -> None:
             time_input = ui.input('Время старта синхронизации (Ч:ММ)',
                                   value=str(_sync_cfg.get('start_time', '09:00'))).props('type=time dense')
             
-            # Прогресс бар для синхронизации
-            # Диалог с нативным HTML progress для устойчивого обновления из JS
-            progress_dlg_sync = ui.dialog()
-            with progress_dlg_sync:
-                with ui.card():
-                    ui.label('Синхронизация номенклатуры…')
-                    ui.html('<progress id="nom_sync_prog" max="100" value="0" style="width: 400px;"></progress>')
-                    ui.html('<div id="nom_sync_lbl" class="text-caption">0%</div>')
-            # Закрытие диалога после завершения (через custom event из JS)
-            ui.on('close_sync_progress', lambda _: progress_dlg_sync.close())
-            
             def _save_sync_settings():
                 try:
-                    from pathlib import Path as _Path
-                    import json as _json
-                    _p = _Path('config') / 'nomenclature_sync_config.json'
-                    _p.parent.mkdir(parents=True, exist_ok=True)
+                    _p = SYNC_CONFIG_PATH
                     _data = {
                         'interval_hours': int(interval_input.value or 1),
                         'start_time': str(time_input.value or '09:0'),
                     }
-                    _p.write_text(_json.dumps(_data, ensure_ascii=False, indent=2), encoding='utf-8')
+                    write_bytes_atomic(_p, json_dumps(_data))
                     ui.notify('Настройки синхронизации сохранены', type='positive')
                 except Exception as e:
                     ui.notify(f'Ошибка сохранения настроек: {e}', type='negative')
@@ -819,45 +1081,8 @@ def odata_settings_page() -> None:
             def _start_sync_now():
                 try:
                     # Открываем диалог и запускаем процесс + опрос статуса
-                    progress_dlg_sync.open()
-                    js = (
-                        "(() => {"
-                        " const p = document.getElementById('nom_sync_prog');"
-                        "  const l = document.getElementById('nom_sync_lbl');"
-                        "  if (p) p.value = 0; if (l) l.textContent = 'Начало синхронизации...';"
-                        "  return fetch('/api/nomenclature/sync', {"
-                        "    method: 'POST',"
-                        "    headers: {'Content-Type': 'application/json'}"
-                        "  })"
-                        "  .then(r => { if (!r.ok) throw new Error('HTTP ' + r.status); return r.json(); })"
-                        "  .then(_ => {"
-                        "    const iv = setInterval(() => {"
-                        "      fetch('/api/nomenclature/sync/status')"
-                        "      .then(r => r.json())"
-                        "      .then(status => {"
-                        "        const v = Math.max(0, Math.min(100, Number(status.progress || 0)));"
-                        "        if (p) p.value = v;"
-                        "        if (l) l.textContent = status.message || (v + '%');"
-                        "        if (status && status.running === false && (v === 0 || String(status.message||').includes('завершена'))) {"
-                        "          clearInterval(iv);"
-                        "          window.dispatchEvent(new CustomEvent('close_sync_progress'));"
-                        "        }"
-                        "      })"
-                        "      .catch(e => {"
-                        "        console.error('sync status error', e);"
-                        "        clearInterval(iv);"
-                        "        window.$nicegui?.notify?.('Ошибка статуса синхронизации: ' + e, 'negative');"
-                        "        window.dispatchEvent(new CustomEvent('close_sync_progress'));"
-                        "      });"
-                        "    }, 500);"
-                        "  })"
-                        "  .catch(e => {"
-                        "    window.$nicegui?.notify?.('Ошибка запуска синхронизации: ' + e, 'negative');"
-                        "    window.dispatchEvent(new CustomEvent('close_sync_progress'));"
-                        "  });"
-                        "})()"
-                    )
-                    ui.run_javascript(js)
+                    progress.open('Синхронизация номенклатуры…')
+                    ui.run_javascript('window.odata.startSync()')
                 except Exception as e:
                     ui.notify(f'Ошибка синхронизации: {e}', type='negative')
             
@@ -874,56 +1099,52 @@ def odata_settings_page() -> None:
     # Просмотр сохранённых групп и выбор для индексации
     with ui.expansion('Группы номенклатуры для индексации', value=False).classes('mt-2 w-full max-w-2xl'):
         try:
-            from pathlib import Path as _Path
-            import json as _json
-            _groups_path = _Path('output') / 'odata_groups_nomenclature.json'
-            _sel_path = _Path('config') / 'odata_groups_selected.json'
-            _groups = []
-            if _groups_path.exists():
-                _data = _json.loads(_groups_path.read_text('utf-8'))
-                _vals = _data.get('value', _data)
-                if isinstance(_vals, dict):
-                    _vals = [_vals]
-                _groups = [
-                    {
-                        'id': str(g.get('Ref_Key') or ''),
-                        'code': str(g.get('Code') or ''),
-                        'name': str(g.get('Description') or ''),
-                    }
-                    for g in _vals
-                    if isinstance(g, dict) and (g.get('IsFolder') is True)
-                ]
-                _groups.sort(key=lambda x: (x['code'], x['name']))
+            _folders_path = OUTPUT_GROUPS_FOLDERS
+            _groups_path = OUTPUT_GROUPS
+            _sel_path = GROUPS_SELECTED_PATH
+            # Разобранные файлы кэшируются по (mtime, size): повторные заходы на страницу не парсят JSON заново.
+            # Предпочитается готовый список групп; полная выгрузка — для файлов, выгруженных ранее
+            _groups_by_id = mtime_cached(_folders_path, _parse_folder_list)
+            if _groups_by_id is None:
+                _groups_by_id = mtime_cached(_groups_path, _parse_folder_groups) or {}
             _selected_ids = set()
-            if _sel_path.exists():
-                try:
-                    _selected_ids = set(_json.loads(_sel_path.read_text('utf-8')) or [])
-                except Exception:
-                    _selected_ids = set()
+            try:
+                _selected_ids = set(mtime_cached(_sel_path, _parse_json_list) or [])
+            except Exception:
+                _selected_ids = set()
         except Exception as _e:
-            _groups = []
+            _groups_by_id = {}
             _selected_ids = set()
             ui.notify(f'Ошибка чтения сохранённых групп: {_e}', type='warning')
+        _groups = list(_groups_by_id.values())
 
         # Статистика и операции
         stats_label = ui.label(f'Всего групп: {len(_groups)} • Выбрано: {len(_selected_ids)}').classes('mb-2')
 
+        def _update_stats(_e=None):
+            stats_label.text = f'Всего групп: {len(_groups)} • Выбрано: {len(groups_table.selected)}'
+
         def _select_all():
-            nonlocal _selected_ids
-            _selected_ids = {g['id'] for g in _groups}
-            groups_panel.refresh()
-            stats_label.text = f'Всего групп: {len(_groups)} • Выбрано: {len(_selected_ids)}'
+            groups_table.selected = list(_groups)
+            groups_table.update()
+            _update_stats()
 
         def _clear_all():
-            nonlocal _selected_ids
-            _selected_ids = set()
-            groups_panel.refresh()
-            stats_label.text = f'Всего групп: {len(_groups)} • Выбрано: {len(_selected_ids)}'
+            groups_table.selected = []
+            groups_table.update()
+            _update_stats()
+
+        # Последний сохранённый выбор: повторное сохранение без изменений не пишет файл
+        _saved = {'ids': tuple(sorted(_selected_ids))}
 
         def _save_selection():
             try:
-                _sel_path.parent.mkdir(parents=True, exist_ok=True)
-                _sel_path.write_text(_json.dumps(sorted(list(_selected_ids)), ensure_ascii=False, indent=2), encoding='utf-8')
+                ids = tuple(sorted({str(r.get('id')) for r in groups_table.selected}))
+                if ids == _saved['ids'] and _sel_path.exists():
+                    ui.notify('Выбор групп без изменений', type='info')
+                    return
+                write_bytes_atomic(_sel_path, json_dumps(list(ids)))
+                _saved['ids'] = ids
                 ui.notify('Выбор групп сохранён: config/odata_groups_selected.json', type='positive')
             except Exception as e:
                 ui.notify(f'Ошибка сохранения выбора: {e}', type='negative')
@@ -933,17 +1154,15 @@ def odata_settings_page() -> None:
             ui.button('Снять все', on_click=_clear_all).props('outline')
             ui.button('Сохранить выбор', on_click=_save_selection).props('color=primary')
 
-        @ui.refreshable
-        def groups_panel():
-            with ui.column().classes('max-h-80 overflow-auto w-full gap-1'):
-                for g in _groups:
-                    value = g['id'] in _selected_ids
-                    cb = ui.checkbox(f"{g['code']} — {g['name']}", value=value).props('dense')
-                    def _on_change(ev, _gid=g['id']):
-                        if ev.value:
-                            _selected_ids.add(_gid)
-                        else:
-                            _selected_ids.discard(_gid)
-                        stats_label.text = f'Всего групп: {len(_groups)} • Выбрано: {len(_selected_ids)}'
-                    cb.on('update:model-value', _on_change)
-        groups_panel()
+        # Одна таблица с выбором строк: Quasar рисует только текущую страницу, выбор живёт на клиенте
+        # и приходит на сервер одним событием, без callback на каждый флажок
+        groups_table = ui.table(
+            columns=_GROUP_COLUMNS,
+            rows=_groups,
+            row_key='id',
+            selection='multiple',
+            pagination={'rowsPerPage': 50},
+            on_select=_update_stats,
+        ).props('dense flat').classes('w-full')
+        # Выбор собирается по индексу id -> группа: O(выбранных), без прохода по всем группам
+        groups_table.selected = [_groups_by_id[i] for i in _selected_ids if i in _groups_by_id]
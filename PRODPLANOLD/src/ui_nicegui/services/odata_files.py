@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""
+Файлы конфигурации и выгрузок 1С для NiceGUI-приложения (общие для API app.py и страниц routes.py):
+- пути файлов config/ и output/;
+- (де)сериализация JSON (orjson);
+- атомарная запись файлов;
+- кэш разобранных файлов по (mtime, size);
+- краткая сводка $metadata (имена EntityType/EntitySet).
+"""
+from __future__ import annotations
+
+import os
+import re
+import time
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+import orjson
+
+# Настройки подключения к OData 1С
+ODATA_CONFIG_PATH = Path('config') / 'odata_config.json'
+# Настройки расписания автосинхронизации номенклатуры
+SYNC_CONFIG_PATH = Path('config') / 'nomenclature_sync_config.json'
+# (опционально) выбранные группы каталога Номенклатура
+GROUPS_SELECTED_PATH = Path('config') / 'odata_groups_selected.json'
+# Файл отметки времени последней синхронизации
+LAST_SYNC_PATH = Path('config') / 'last_sync_time.json'
+OUTPUT_XML = Path('output') / 'odata_metadata.xml'
+OUTPUT_SUMMARY = Path('output') / 'odata_metadata_summary.json'
+# Валидаторы последней выгрузки $metadata (ETag / Last-Modified) для условного GET
+OUTPUT_XML_VALIDATORS = Path('output') / 'odata_metadata.etag.json'
+OUTPUT_GROUPS = Path('output') / 'odata_groups_nomenclature.json'
+# Только группы (IsFolder=true) в виде [{id, code, name}], отсортированные по коду и наименованию — для UI
+OUTPUT_GROUPS_FOLDERS = Path('output') / 'odata_groups_nomenclature_folders.json'
+
+# Сколько секунд результат stat() файла считается актуальным в кэше разобранных файлов
+FILE_STAT_TTL_SEC = 1.0
+
+# Кэш разобранных файлов: путь -> (mtime_ns, size, время проверки, результат разбора)
+_FILE_CACHE: dict = {}
+
+
+def json_loads(data: bytes) -> Any:
+    """Разбор JSON из UTF-8 байтов."""
+    return orjson.loads(data)
+
+
+def json_dumps(obj: Any) -> bytes:
+    """JSON с отступом 2 и без экранирования кириллицы, в UTF-8 байтах."""
+    return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+
+
+def write_bytes_atomic(path: Path, data: bytes) -> None:
+    """Запись через временный файл и os.replace: читатели не видят недописанный файл."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + '.tmp')
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+    _FILE_CACHE.pop(str(path), None)
+
+
+def write_json(path: Path, obj: Any) -> None:
+    """Атомарная запись JSON (см. json_dumps, write_bytes_atomic)."""
+    write_bytes_atomic(path, json_dumps(obj))
+
+
+def mtime_cached(path: Path, parse: Callable[[Path], Any]) -> Optional[Any]:
+    """
+    parse(path) с кэшем по (mtime, size) файла; None, если файла нет.
+    В пределах FILE_STAT_TTL_SEC после проверки файл повторно не stat-ится.
+    """
+    now = time.monotonic()
+    cached = _FILE_CACHE.get(str(path))
+    if cached and now - cached[2] < FILE_STAT_TTL_SEC:
+        return cached[3]
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    key = (st.st_mtime_ns, st.st_size)
+    value = cached[3] if cached and cached[:2] == key else parse(path)
+    _FILE_CACHE[str(path)] = (*key, now, value)
+    return value
+
+
+def _parse_json_dict(path: Path) -> dict:
+    data = json_loads(path.read_bytes())
+    return data if isinstance(data, dict) else {}
+
+
+def load_json_cached(path: Path) -> dict:
+    """
+    Словарь из JSON-файла с кэшем по (mtime, size). Возвращается копия (вызывающие стороны её меняют);
+    пустой словарь при отсутствии файла или ошибке разбора.
+    """
+    try:
+        return dict(mtime_cached(path, _parse_json_dict) or {})
+    except Exception:
+        return {}
+
+
+# Размер порции при потоковой записи и разборе $metadata
+METADATA_CHUNK_BYTES = 64 * 1024
+
+# <EntitySet ... Name="..."> / <EntityType ... Name="..."> в $metadata, с префиксом пространства имён
+# (<edm:EntitySet>) или без — запасной разбор невалидного XML (один проход regex-движка)
+_RX_METADATA_NAMES = re.compile(r'<(?:\w+:)?(EntitySet|EntityType)\b[^>]*?\bName="([^"]+)"')
+
+
+def parse_metadata_summary(xml: str) -> dict:
+    """Сводка $metadata по тексту документа регулярным выражением."""
+    summary = {
+        "entities": [],
+        "entity_sets": [],
+        "functions": [],
+        "actions": [],
+    }
+    for kind, name in _RX_METADATA_NAMES.findall(xml):
+        summary['entities' if kind == 'EntityType' else 'entity_sets'].append(name)
+    return summary
+
+
+class MetadataSummaryFeed:
+    """
+    Инкрементальный разбор $metadata: имена EntityType/EntitySet собираются по мере поступления
+    порций XML, без хранения полного документа. При невалидном XML — фолбэк на регулярку по файлу.
+    """
+
+    def __init__(self):
+        self._parser = ET.XMLPullParser(events=('start', 'end'))
+        self._failed = False
+        self.summary = parse_metadata_summary('')
+
+    def feed(self, chunk: bytes) -> None:
+        if self._failed:
+            return
+        try:
+            self._parser.feed(chunk)
+            self._drain()
+        except ET.ParseError:
+            self._failed = True
+
+    def _drain(self) -> None:
+        for event, elem in self._parser.read_events():
+            if event == 'end':
+                elem.clear()  # освобождаем разобранные узлы
+                continue
+            kind = elem.tag.rpartition('}')[2]
+            if kind in ('EntityType', 'EntitySet'):
+                name = elem.get('Name')
+                if name:
+                    self.summary['entities' if kind == 'EntityType' else 'entity_sets'].append(name)
+
+    def close(self, path: Path) -> dict:
+        if not self._failed:
+            try:
+                self._parser.close()
+                self._drain()
+            except ET.ParseError:
+                self._failed = True
+        if self._failed:
+            return parse_metadata_summary(path.read_text(encoding='utf-8', errors='replace'))
+        return self.summary
+
+
+def metadata_summary_file(path: Path) -> dict:
+    """Сводка уже сохранённого файла $metadata: чтение порциями через MetadataSummaryFeed."""
+    feed = MetadataSummaryFeed()
+    with path.open('rb') as f:
+        while chunk := f.read(METADATA_CHUNK_BYTES):
+            feed.feed(chunk)
+    return feed.close(path)
@@ -1,12 +1,20 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 
+import base64
+import json
+import os
+from contextlib import contextmanager
 from dataclasses import asdict, dataclass
+from functools import lru_cache
 from datetime import date, timedelta
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
 import sqlite3
+import threading
+import time
 
 from src.database import get_connection, DEFAULT_DB_PATH
 
@@ -29,19 +37,355 @@ def _conn(db_path: Optional[str | Path] = None) -> sqlite3.Connection:
     return get_connection(Path(db_path))
 
 
+# Пул соединений для чтения: по одному на поток и файл БД (чтения выполняются в пуле потоков asyncio.to_thread).
+# Соединение переживает вызовы — PRAGMA и встроенный кэш подготовленных операторов sqlite3 не теряются.
+_READ_POOL = threading.local()
+# Дополнительно к PRAGMAS из src.database: чтение через mmap и запрет записи на общих соединениях
+READ_PRAGMAS = (
+    "PRAGMA mmap_size = 268435456;",
+    "PRAGMA query_only = ON;",
+)
+
+
+@contextmanager
+def _read_conn(db_path: Optional[str | Path] = None) -> Iterator[sqlite3.Connection]:
+    """
+    Соединение для чтения из пула текущего потока: строки — простые кортежи (распаковка по позиции
+    вместо sqlite3.Row). При ошибке SQLite соединение закрывается и убирается из пула.
+    """
+    key = str(Path(db_path) if db_path is not None else DEFAULT_DB_PATH)
+    conns = getattr(_READ_POOL, 'conns', None)
+    if conns is None:
+        conns = _READ_POOL.conns = {}
+    conn = conns.get(key)
+    if conn is None:
+        conn = _conn(db_path)
+        conn.row_factory = None
+        for pragma in READ_PRAGMAS:
+            conn.execute(pragma)
+        conns[key] = conn
+    try:
+        yield conn
+    except sqlite3.Error:
+        conns.pop(key, None)
+        conn.close()
+        raise
+
+
+def _plan_rows(rows) -> List[Dict[str, Any]]:
+    """
+    Кортежи (item_id, item_code, item_name, item_article, month_plan) -> словари с полями PlanRow.
+    Словари собираются напрямую, без промежуточного PlanRow и asdict() на каждую строку.
+    """
+    return [
+        {
+            "item_id": int(iid),
+            "item_code": str(code),
+            "item_name": str(name),
+            "item_article": str(article) if article is not None else None,
+            "month_plan": float(plan or 0.0),
+        }
+        for iid, code, name, article, plan in rows
+    ]
+
+
+# --- Тексты SQL: собираются при импорте (или один раз на вариант через lru_cache), чтобы каждый вызов
+# передавал в sqlite3 один и тот же текст и попадал во встроенный кэш подготовленных операторов соединения ---
+
+_SQL_STAGES = """
+SELECT stage_id, stage_name
+FROM production_stages
+ORDER BY COALESCE(stage_order, 9999), stage_name
+"""
+
+# Фильтр этапа: вариант без этапа / с этапом (ключ — stage_id is not None)
+_STAGE_JOIN_CLAUSE = {False: "", True: "AND p.stage_id = :stage_id"}
+
+# Агрегат плана по изделиям за окно [:start, :end); {stage_clause}, {where}/{having}, {order}, {limit} — варианты запроса
+_SQL_OVERVIEW_TMPL = """
+SELECT
+    i.item_id,
+    i.item_code,
+    i.item_name,
+    i.item_article,
+    COALESCE(SUM(p.planned_qty), 0) AS month_plan
+FROM items i
+LEFT JOIN production_plan_entries p
+    ON p.item_id = i.item_id
+   AND p.date >= :start
+   AND p.date <  :end
+   {stage_clause}
+{where}
+GROUP BY i.item_id
+{having}
+ORDER BY {order}
+{limit}
+"""
+
+_SQL_PLAN_OVERVIEW = {
+    k: _SQL_OVERVIEW_TMPL.format(stage_clause=c, where="", having="", order="i.item_name", limit="LIMIT :limit")
+    for k, c in _STAGE_JOIN_CLAUSE.items()
+}
+_SQL_PLAN_DATASET = {
+    k: _SQL_OVERVIEW_TMPL.format(stage_clause=c, where="", having="", order="i.item_name", limit="")
+    for k, c in _STAGE_JOIN_CLAUSE.items()
+}
+
+_SQL_ITEMS_COUNT = "SELECT COUNT(1) AS cnt FROM items"
+
+
+# Выражения сортировки страницы агрегата (item_article может быть NULL — сравнение строк значений с NULL не работает)
+_OVERVIEW_SORT_EXPR = {
+    'item_name': 'i.item_name',
+    'item_code': 'i.item_code',
+    'item_article': "COALESCE(i.item_article, '')",
+    'month_plan': 'month_plan',
+}
+
+
+@lru_cache(maxsize=None)
+def _sql_overview_page(has_stage: bool, sort_by: str, sort_dir: str, keyset: bool = False) -> str:
+    """
+    Страница агрегата; sort_by/sort_dir уже проверены по белому списку.
+    Порядок детерминирован (sort_by, item_id). keyset=True — продолжение после (:after_val, :after_id)
+    вместо OFFSET: для полей items это WHERE до группировки (поиск по индексу), для month_plan — HAVING.
+    """
+    expr = _OVERVIEW_SORT_EXPR[sort_by]
+    where = having = ""
+    if keyset:
+        pred = f"({expr}, i.item_id) {'<' if sort_dir == 'desc' else '>'} (:after_val, :after_id)"
+        if sort_by == 'month_plan':
+            having = f"HAVING {pred}"
+        else:
+            where = f"WHERE {pred}"
+    return _SQL_OVERVIEW_TMPL.format(
+        stage_clause=_STAGE_JOIN_CLAUSE[has_stage],
+        where=where,
+        having=having,
+        order=f"{expr} {sort_dir}, i.item_id {sort_dir}",
+        limit="LIMIT :limit" if keyset else "LIMIT :limit OFFSET :offset",
+    )
+
+
+def _encode_cursor(sort_value: Any, item_id: int) -> str:
+    """Непрозрачный курсор страницы: base64(JSON [значение сортировки, item_id]) последней строки."""
+    raw = json.dumps([sort_value, int(item_id)], ensure_ascii=False, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def _decode_cursor(cursor: Optional[str]) -> Optional[Tuple[Any, int]]:
+    """(значение сортировки, item_id) из курсора; None для пустого или повреждённого курсора."""
+    if not cursor:
+        return None
+    try:
+        val, iid = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+        return val, int(iid)
+    except Exception:
+        return None
+
+
+# Множество строк матрицы: корневые изделия, «динамические корни» по BOM и изделия с планом в окне
+_SQL_ROOTS_UNION_TMPL = """
+    SELECT item_id FROM root_products
+    UNION
+    SELECT DISTINCT b.parent_item_id AS item_id
+      FROM bom b
+     WHERE b.parent_item_id NOT IN (SELECT child_item_id FROM bom)
+    UNION
+    SELECT DISTINCT p.item_id
+      FROM production_plan_entries p
+     WHERE p.date >= :start
+       AND p.date <  :end
+       {stage_clause}
+"""
+
+
+# Выражения сортировки матрицы: внутри страницы (i.*, s.*) и во внешнем запросе по дням (pg.*)
+_MATRIX_SORT_EXPR = {
+    'item_name': 'i.item_name',
+    'item_code': 'i.item_code',
+    'item_article': "COALESCE(i.item_article, '')",
+    'month_plan': 'COALESCE(s.month_plan, 0)',
+}
+_MATRIX_OUTER_SORT_EXPR = {
+    'item_name': 'pg.item_name',
+    'item_code': 'pg.item_code',
+    'item_article': "COALESCE(pg.item_article, '')",
+    'month_plan': 'pg.month_plan',
+}
+
+
+@lru_cache(maxsize=None)
+def _sql_matrix_page(has_stage: bool, sort_by: str, sort_dir: str, keyset: bool = False) -> str:
+    """
+    Страница строк матрицы; sort_by/sort_dir уже проверены по белому списку.
+    keyset=True — строки после (:after_val, :after_id) вместо OFFSET: roots_union и суммы
+    не агрегируются заново ради пропущенных страниц.
+    """
+    stage_clause = _STAGE_JOIN_CLAUSE[has_stage]
+    expr = _MATRIX_SORT_EXPR[sort_by]
+    where = ""
+    if keyset:
+        where = f"WHERE ({expr}, i.item_id) {'<' if sort_dir == 'desc' else '>'} (:after_val, :after_id)"
+    return f"""
+    WITH sums AS (
+        SELECT
+            p.item_id,
+            COALESCE(SUM(p.planned_qty), 0) AS month_plan
+        FROM production_plan_entries p
+        WHERE p.date >= :start
+          AND p.date <  :end
+          {stage_clause}
+        GROUP BY p.item_id
+    ),
+    roots_union AS (SELECT value AS item_id FROM json_each(:roots))
+    SELECT
+        i.item_id,
+        i.item_code,
+        i.item_name,
+        i.item_article,
+        COALESCE(s.month_plan, 0) AS month_plan
+    FROM roots_union r
+    JOIN items i ON i.item_id = r.item_id
+    LEFT JOIN sums s ON s.item_id = i.item_id
+    {where}
+    ORDER BY {expr} {sort_dir}, i.item_id {sort_dir}
+    {"LIMIT :limit" if keyset else "LIMIT :limit OFFSET :offset"}
+    """
+
+
+# Множество строк матрицы целиком (id изделий); страницы получают его готовым через json_each(:roots)
+_SQL_ROOTS_UNION = {k: _SQL_ROOTS_UNION_TMPL.format(stage_clause=c) for k, c in _STAGE_JOIN_CLAUSE.items()}
+
+# Кэш множества строк матрицы между страницами:
+# (БД, start, end, stage_id, версия, сигнатура файлов БД) -> (item_id, время расчёта).
+# Версия растёт при записи через invalidate_roots_cache(); сигнатура (mtime/размер БД и -wal) ловит
+# коммиты из других процессов (Streamlit UI, скрипты импорта BOM). TTL — последняя страховка.
+ROOTS_CACHE_TTL_SEC = 60.0
+ROOTS_CACHE_SIZE = 32
+_ROOTS_CACHE: Dict[tuple, Tuple[List[int], float]] = {}
+_ROOTS_LOCK = threading.Lock()
+_roots_version = 0
+
+
+def invalidate_roots_cache() -> None:
+    """Сбрасывает кэш множества строк матрицы после записи плана, корневых изделий или BOM."""
+    global _roots_version
+    with _ROOTS_LOCK:
+        _roots_version += 1
+        _ROOTS_CACHE.clear()
+
+
+def _db_signature(db_file: str) -> tuple:
+    """(mtime_ns, size) файла БД и журнала WAL: меняется при любом коммите, в т.ч. из другого процесса."""
+    sig = []
+    for f in (db_file, db_file + '-wal'):
+        try:
+            st = os.stat(f)
+            sig.append((st.st_mtime_ns, st.st_size))
+        except OSError:
+            sig.append(None)
+    return tuple(sig)
+
+
+def _roots_union_ids(conn: sqlite3.Connection, db_path: Optional[str | Path], params: Dict[str, Any], has_stage: bool) -> List[int]:
+    """id изделий матрицы для окна params (start/end/stage_id): из кэша или одним запросом."""
+    db_file = str(db_path or DEFAULT_DB_PATH)
+    now = time.monotonic()
+    with _ROOTS_LOCK:
+        key = (db_file, params["start"], params["end"], params.get("stage_id"), _roots_version, _db_signature(db_file))
+        hit = _ROOTS_CACHE.get(key)
+    if hit is not None and now - hit[1] < ROOTS_CACHE_TTL_SEC:
+        return hit[0]
+    ids = [r[0] for r in conn.execute(_SQL_ROOTS_UNION[has_stage], params)]
+    with _ROOTS_LOCK:
+        # Запись за время запроса сменила версию — результат мог устареть, не кэшируем
+        if key[4] == _roots_version:
+            _ROOTS_CACHE[key] = (ids, now)
+            while len(_ROOTS_CACHE) > ROOTS_CACHE_SIZE:
+                _ROOTS_CACHE.pop(next(iter(_ROOTS_CACHE)))
+    return ids
+
+# Фолбэк матрицы: корневые изделия (как в Excel), если в окне дат нет ни одной записи плана
+_SQL_ROOTS_COUNT = """
+SELECT COUNT(1) AS cnt
+  FROM root_products rp
+  JOIN items i ON i.item_id = rp.item_id
+"""
+_SQL_ROOTS_PAGE = """
+SELECT i.item_id, i.item_code, i.item_name, i.item_article, 0.0 AS month_plan
+  FROM root_products rp
+  JOIN items i ON i.item_id = rp.item_id
+ ORDER BY i.item_name, i.item_id
+ LIMIT :limit OFFSET :offset
+"""
+
+
+# До скольких дней окна план по дням разворачивается в колонки прямо в SQL (дальше — длинный формат)
+MATRIX_PIVOT_MAX_DAYS = 62
+
+
+@lru_cache(maxsize=None)
+def _sql_matrix_with_days(page_sql: str, outer_order: str, has_stage: bool, pivot_days: int = 0) -> str:
+    """
+    Страница строк матрицы вместе с планом по дням за один запрос; outer_order сохраняет порядок страницы.
+
+    pivot_days > 0 — сводная форма: по строке на изделие, колонки d0..d{pivot_days-1} с суммой плана
+    на день :start + k (номер дня считается от :start, поэтому текст запроса не зависит от дат окна).
+    pivot_days = 0 — длинный формат: по строке на изделие и день с планом (без плана — одна строка с date = NULL).
+    """
+    stage_clause = "AND stage_id = :stage_id" if has_stage else ""
+    if pivot_days > 0:
+        day_cols = ",\n               ".join(
+            f"SUM(CASE WHEN k = {k} THEN planned_qty END) AS d{k}" for k in range(pivot_days)
+        )
+        return f"""
+    WITH page AS ({page_sql}),
+    entries AS (
+        SELECT item_id, CAST(julianday(date) - julianday(:start) AS INTEGER) AS k, planned_qty
+          FROM production_plan_entries
+         WHERE item_id IN (SELECT item_id FROM page)
+           AND date >= :start
+           AND date <  :end
+           {stage_clause}
+    ),
+    piv AS (
+        SELECT item_id,
+               {day_cols}
+          FROM entries
+         GROUP BY item_id
+    )
+    SELECT pg.item_id, pg.item_code, pg.item_name, pg.item_article, pg.month_plan,
+           {", ".join(f"piv.d{k}" for k in range(pivot_days))}
+      FROM page pg
+      LEFT JOIN piv ON piv.item_id = pg.item_id
+     ORDER BY {outer_order}
+    """
+    return f"""
+    WITH page AS ({page_sql}),
+    days AS (
+        SELECT item_id, date, COALESCE(SUM(planned_qty), 0) AS qty
+          FROM production_plan_entries
+         WHERE item_id IN (SELECT item_id FROM page)
+           AND date >= :start
+           AND date <  :end
+           {stage_clause}
+         GROUP BY item_id, date
+    )
+    SELECT pg.item_id, pg.item_code, pg.item_name, pg.item_article, pg.month_plan, d.date, d.qty
+      FROM page pg
+      LEFT JOIN days d ON d.item_id = pg.item_id
+     ORDER BY {outer_order}
+    """
+
+
 def fetch_stages(db_path: Optional[str | Path] = None) -> List[Dict[str, Any]]:
     """
     Возвращает список этапов производства: [{'value': stage_id, 'label': stage_name}, ...]
     """
-    with _conn(db_path) as conn:
-        rows = conn.execute(
-            """
-            SELECT stage_id, stage_name
-            FROM production_stages
-            ORDER BY COALESCE(stage_order, 9999), stage_name
-            """
-        ).fetchall()
-        return [{"value": int(r["stage_id"]), "label": str(r["stage_name"])} for r in rows]
+    with _read_conn(db_path) as conn:
+        rows = conn.execute(_SQL_STAGES).fetchall()
+        return [{"value": int(sid), "label": str(name)} for sid, name in rows]
 
 
 def fetch_plan_overview(
@@ -65,40 +409,12 @@ def fetch_plan_overview(
         "end": end.isoformat(),
         "limit": int(limit),
     }
-    stage_clause = ""
     if stage_id is not None:
-        stage_clause = "AND p.stage_id = :stage_id"
         params["stage_id"] = stage_id
-
-    sql = f"""
-    SELECT
-        i.item_id,
-        i.item_code,
-        i.item_name,
-        i.item_article,
-        COALESCE(SUM(p.planned_qty), 0) AS month_plan
-    FROM items i
-    LEFT JOIN production_plan_entries p
-        ON p.item_id = i.item_id
-       AND p.date >= :start
-       AND p.date <  :end
-       {stage_clause}
-    GROUP BY i.item_id
-    ORDER BY i.item_name
-    LIMIT :limit
-    """
-    with _conn(db_path) as conn:
+    sql = _SQL_PLAN_OVERVIEW[stage_id is not None]
+    with _read_conn(db_path) as conn:
         rows = conn.execute(sql, params).fetchall()
-        result = [
-            PlanRow(
-                item_id=int(r["item_id"]),
-                item_code=str(r["item_code"]),
-                item_name=str(r["item_name"]),
-                item_article=str(r["item_article"]) if r["item_article"] is not None else None,
-                month_plan=float(r["month_plan"] or 0.0),
-            ).as_dict()
-            for r in rows
-        ]
+        result = _plan_rows(rows)
         return result
 
 
@@ -110,10 +426,9 @@ def upsert_plan_entry(
     db_path: Optional[str | Path] = None,
 ) -> None:
     """
-    Идемпотентно вставляет/обновляет запись плана на указанную дату.
-    НЕ использует ON CONFLICT (нет уникального индекса), вместо этого:
-      1) UPDATE по (item_id, COALESCE(stage_id,-1), date)
-      2) если обновлено 0 строк — INSERT
+    Идемпотентно вставляет/обновляет запись плана на указанную дату одним
+    INSERT ... ON CONFLICT по ключу (item_id, COALESCE(stage_id,-1), date)
+    (без уникального индекса — UPDATE + INSERT, см. _upsert_plan_rows).
     """
     # Валидации и нормализация
     try:
@@ -123,56 +438,73 @@ def upsert_plan_entry(
     qty = float(planned_qty or 0.0)
 
     with _conn(db_path) as conn:
-        # UPDATE сначала
-        cur = conn.execute(
-            """
-            UPDATE production_plan_entries
-               SET planned_qty = :planned_qty,
-                   updated_at  = datetime('now')
-             WHERE item_id = :item_id
-               AND date    = :date
-               AND COALESCE(stage_id, -1) = COALESCE(:stage_id, -1)
-            """,
-            {
-                "item_id": int(item_id),
-                "stage_id": stage_id,
-                "date": d.isoformat(),
-                "planned_qty": qty,
-            },
-        )
-        if int(getattr(cur, "rowcount", 0) or 0) == 0:
-            # INSERT если UPDATE не затронул ни одной строки
-            conn.execute(
-                """
-                INSERT INTO production_plan_entries
-                    (item_id, stage_id, date, planned_qty, completed_qty, status, notes, updated_at)
-                VALUES
-                    (:item_id, :stage_id, :date, :planned_qty, 0.0, 'GREEN', NULL, datetime('now'))
-                """,
-                {
-                    "item_id": int(item_id),
-                    "stage_id": stage_id,
-                    "date": d.isoformat(),
-                    "planned_qty": qty,
-                },
-            )
+        _upsert_plan_rows(conn, [{
+            "item_id": int(item_id),
+            "stage_id": stage_id,
+            "date": d.isoformat(),
+            "planned_qty": qty,
+        }])
         conn.commit()
-
-# --- Bulk upsert: пакетная запись изменений плана (в одной транзакции) ---
-def bulk_upsert_plan_entries(
-    entries: List[Dict[str, Any]],
-    db_path: Optional[str | Path] = None,
-) -> int:
+    invalidate_roots_cache()
+
+# --- Bulk upsert: пакетная запись изменений плана (executemany, порциями) ---
+# Размер порции для executemany: ограничивает память на нормализованные записи, транзакция одна на весь запрос
+PLAN_BULK_CHUNK = 5000
+
+# Один оператор на запись: ключ (item_id, COALESCE(stage_id,-1), date) — уникальный индекс
+# ux_plan_item_stagekey_date (см. src.database._ensure_plan_entries_key)
+_SQL_PLAN_UPSERT = """
+INSERT INTO production_plan_entries
+    (item_id, stage_id, date, planned_qty, completed_qty, status, notes, updated_at)
+VALUES
+    (:item_id, :stage_id, :date, :planned_qty, 0.0, 'GREEN', NULL, datetime('now'))
+ON CONFLICT(item_id, COALESCE(stage_id, -1), date) DO UPDATE
+   SET planned_qty = excluded.planned_qty,
+       updated_at  = datetime('now')
+"""
+
+# Запасной путь, если уникального индекса нет (миграция не выполнилась): UPDATE, затем INSERT недостающих
+_SQL_PLAN_UPDATE = """
+UPDATE production_plan_entries
+   SET planned_qty = :planned_qty,
+       updated_at  = datetime('now')
+ WHERE item_id = :item_id
+   AND date    = :date
+   AND COALESCE(stage_id, -1) = COALESCE(:stage_id, -1)
+"""
+_SQL_PLAN_INSERT_MISSING = """
+INSERT INTO production_plan_entries
+    (item_id, stage_id, date, planned_qty, completed_qty, status, notes, updated_at)
+SELECT :item_id, :stage_id, :date, :planned_qty, 0.0, 'GREEN', NULL, datetime('now')
+ WHERE NOT EXISTS (
+       SELECT 1 FROM production_plan_entries
+        WHERE item_id = :item_id
+          AND date    = :date
+          AND COALESCE(stage_id, -1) = COALESCE(:stage_id, -1)
+ )
+"""
+
+
+def _upsert_plan_rows(conn: sqlite3.Connection, rows: Iterable[Dict[str, Any]]) -> None:
     """
-    Пакетное сохранение записей плана в одной транзакции.
-    entries: [{item_id: int, date: 'YYYY-MM-DD', qty: int, stage_id: Optional[int]}]
-    Возвращает количество успешно обработанных записей.
+    Запись строк плана (ключи item_id, stage_id, date, planned_qty) в текущей транзакции.
+    rows должен допускать повторный обход (список, dict.values()).
     """
-    if not entries:
-        return 0
+    try:
+        conn.executemany(_SQL_PLAN_UPSERT, rows)
+    except sqlite3.OperationalError as e:
+        # Ошибка подготовки оператора: нет индекса ux_plan_item_stagekey_date — ни одна строка не записана
+        if 'ON CONFLICT' not in str(e):
+            raise
+        conn.executemany(_SQL_PLAN_UPDATE, rows)
+        conn.executemany(_SQL_PLAN_INSERT_MISSING, rows)
+
 
-    # Предвалидация и нормализация
-    normalized: List[Dict[str, Any]] = []
+def _iter_plan_entries(entries: Iterable[Any]) -> Iterator[Dict[str, Any]]:
+    """
+    Ленивая валидация и нормализация сырых записей плана (как пришли в JSON).
+    Некорректные записи пропускаются.
+    """
     for e in entries:
         try:
             iid = int(e.get('item_id'))
@@ -184,63 +516,44 @@ def bulk_upsert_plan_entries(
             stg = int(stg) if (stg is not None and str(stg).strip() != '') else None
         except Exception:
             continue
-        normalized.append({'item_id': iid, 'date': d, 'qty': qty, 'stage_id': stg})
+        yield {'item_id': iid, 'date': d, 'planned_qty': float(qty), 'stage_id': stg}
+
 
-    if not normalized:
+def bulk_upsert_plan_entries(
+    entries: List[Dict[str, Any]],
+    db_path: Optional[str | Path] = None,
+) -> int:
+    """
+    Пакетное сохранение записей плана: executemany порциями по PLAN_BULK_CHUNK строк
+    в одной транзакции — при ошибке не сохраняется ничего, исключение пробрасывается вызывающему.
+    entries: [{item_id: int, date: 'YYYY-MM-DD', qty: int, stage_id: Optional[int]}]
+    Возвращает количество сохранённых записей (некорректные записи пропускаются).
+    """
+    if not entries:
         return 0
 
+    it = _iter_plan_entries(entries)
+    saved = 0
     with _conn(db_path) as conn:
         try:
             conn.execute("BEGIN")
-            saved = 0
-            for e in normalized:
-                # 1) UPDATE
-                cur = conn.execute(
-                    """
-                    UPDATE production_plan_entries
-                       SET planned_qty = :planned_qty,
-                           updated_at  = datetime('now')
-                     WHERE item_id = :item_id
-                       AND date    = :date
-                       AND COALESCE(stage_id, -1) = COALESCE(:stage_id, -1)
-                    """,
-                    {
-                        'item_id': e['item_id'],
-                        'stage_id': e['stage_id'],
-                        'date': e['date'],
-                        'planned_qty': float(e['qty'] or 0),
-                    },
-                )
-                rc = int(getattr(cur, "rowcount", 0) or 0)
-                if rc == 0:
-                    # 2) INSERT
-                    conn.execute(
-                        """
-                        INSERT INTO production_plan_entries
-                            (item_id, stage_id, date, planned_qty, completed_qty, status, notes, updated_at)
-                        VALUES
-                            (:item_id, :stage_id, :date, :planned_qty, 0.0, 'GREEN', NULL, datetime('now'))
-                        """,
-                        {
-                            'item_id': e['item_id'],
-                            'stage_id': e['stage_id'],
-                            'date': e['date'],
-                            'planned_qty': float(e['qty'] or 0),
-                        },
-                    )
-                saved += 1
+            while True:
+                # Повторы одного ключа внутри порции: побеждает последнее значение
+                by_key = {(e['item_id'], e['stage_id'], e['date']): e for e in islice(it, PLAN_BULK_CHUNK)}
+                if not by_key:
+                    break
+                # Один подготовленный оператор, привязанный к каждой строке порции (без промежуточного списка)
+                _upsert_plan_rows(conn, by_key.values())
+                saved += len(by_key)
             conn.commit()
-            return saved
         except Exception:
-            try:
-                conn.rollback()
-            except Exception:
-                pass
-            return 0
+            conn.rollback()
+            raise
+    if saved:
+        invalidate_roots_cache()
+    return saved
 # --- Шаг 2.2: server-side выборка и экспорт набора плана ---
 
-from typing import Tuple
-
 
 def query_plan_overview_paginated(
     start_date_str: str,
@@ -251,6 +564,7 @@ def query_plan_overview_paginated(
     sort_by: str = 'item_name',
     sort_dir: str = 'asc',
     db_path: Optional[str | Path] = None,
+    cursor: Optional[str] = None,
 ) -> Dict[str, Any]:
     """
     Возвращает страницу агрегированного плана с общим количеством строк.
@@ -258,8 +572,12 @@ def query_plan_overview_paginated(
     Поля сортировки (whitelist):
       - item_name
       - item_code
+      - item_article
       - month_plan
     Направление: asc|desc
+
+    cursor — значение next_cursor предыдущей страницы: страница берётся по ключу (keyset)
+    сразу после последней строки, без OFFSET. Без курсора — обычная страница page.
     """
     try:
         start = date.fromisoformat(start_date_str)
@@ -281,7 +599,6 @@ def query_plan_overview_paginated(
     ps = max(1, int(page_size or 50))
     offset = (p - 1) * ps
 
-    stage_clause = ""
     params: Dict[str, Any] = {
         "start": start.isoformat(),
         "end": end.isoformat(),
@@ -289,45 +606,26 @@ def query_plan_overview_paginated(
         "offset": offset,
     }
     if stage_id is not None:
-        stage_clause = "AND p.stage_id = :stage_id"
         params["stage_id"] = stage_id
+    after = _decode_cursor(cursor)
+    if after is not None:
+        params["after_val"], params["after_id"] = after
 
-    sql_rows = f"""
-    SELECT
-        i.item_id,
-        i.item_code,
-        i.item_name,
-        i.item_article,
-        COALESCE(SUM(p.planned_qty), 0) AS month_plan
-    FROM items i
-    LEFT JOIN production_plan_entries p
-        ON p.item_id = i.item_id
-       AND p.date >= :start
-       AND p.date <  :end
-       {stage_clause}
-    GROUP BY i.item_id
-    ORDER BY {sort_by} {sort_dir}
-    LIMIT :limit OFFSET :offset
-    """
-
+    sql_rows = _sql_overview_page(stage_id is not None, sort_by, sort_dir, after is not None)
     # Для суммарного количества возьмем количество изделий (как в overview: список по items)
-    sql_total = "SELECT COUNT(1) AS cnt FROM items"
+    sql_total = _SQL_ITEMS_COUNT
 
-    with _conn(db_path) as conn:
+    with _read_conn(db_path) as conn:
         rows = conn.execute(sql_rows, params).fetchall()
-        total = int(conn.execute(sql_total).fetchone()["cnt"])
-
-    result_rows = [
-        PlanRow(
-            item_id=int(r["item_id"]),
-            item_code=str(r["item_code"]),
-            item_name=str(r["item_name"]),
-            item_article=str(r["item_article"]) if r["item_article"] is not None else None,
-            month_plan=float(r["month_plan"] or 0.0),
-        ).as_dict()
-        for r in rows
-    ]
-    return {"rows": result_rows, "total": total, "page": p, "page_size": ps}
+        total = int(conn.execute(sql_total).fetchone()[0])
+
+    result_rows = _plan_rows(rows)
+    next_cursor = None
+    if len(result_rows) == ps:
+        last = result_rows[-1]
+        sort_value = last[sort_by] if sort_by != 'item_article' else (last['item_article'] or '')
+        next_cursor = _encode_cursor(sort_value, last['item_id'])
+    return {"rows": result_rows, "total": total, "page": p, "page_size": ps, "next_cursor": next_cursor}
 
 
 def fetch_plan_dataset(
@@ -349,39 +647,12 @@ def fetch_plan_dataset(
         "start": start.isoformat(),
         "end": end.isoformat(),
     }
-    stage_clause = ""
     if stage_id is not None:
-        stage_clause = "AND p.stage_id = :stage_id"
         params["stage_id"] = stage_id
-
-    sql = f"""
-    SELECT
-        i.item_id,
-        i.item_code,
-        i.item_name,
-        i.item_article,
-        COALESCE(SUM(p.planned_qty), 0) AS month_plan
-    FROM items i
-    LEFT JOIN production_plan_entries p
-        ON p.item_id = i.item_id
-       AND p.date >= :start
-       AND p.date <  :end
-       {stage_clause}
-    GROUP BY i.item_id
-    ORDER BY i.item_name
-    """
-    with _conn(db_path) as conn:
+    sql = _SQL_PLAN_DATASET[stage_id is not None]
+    with _read_conn(db_path) as conn:
         rows = conn.execute(sql, params).fetchall()
-    return [
-        PlanRow(
-            item_id=int(r["item_id"]),
-            item_code=str(r["item_code"]),
-            item_name=str(r["item_name"]),
-            item_article=str(r["item_article"]) if r["item_article"] is not None else None,
-            month_plan=float(r["month_plan"] or 0.0),
-        ).as_dict()
-        for r in rows
-    ]
+    return _plan_rows(rows)
 # --- Utility: ensure item exists and upsert basic fields ---
 def ensure_item_exists(
     item_code: str,
@@ -454,6 +725,7 @@ def ensure_root_product_by_code(
     with _conn(db_path) as conn:
         conn.execute("INSERT OR IGNORE INTO root_products (item_id) VALUES (?)", (int(item_id),))
         conn.commit()
+    invalidate_roots_cache()
     return item_id
 # --- Матрица плана по дням (server-side подготовка данных для AG-Grid) ---
 def query_plan_matrix_paginated(
@@ -465,9 +737,14 @@ def query_plan_matrix_paginated(
     sort_by: str = 'item_name',
     sort_dir: str = 'asc',
     db_path: Optional[str | Path] = None,
+    with_total: bool = True,
+    cursor: Optional[str] = None,
 ) -> Dict[str, Any]:
     """
     Возвращает страницу данных плана в виде матрицы по дням для заданного горизонта.
+    with_total=False — без COUNT по всему множеству изделий: выбирается page_size+1 строк,
+    наличие следующей страницы определяется по лишней строке (total в ответе = None).
+    cursor — next_cursor предыдущей страницы: строки берутся по ключу (sort_by, item_id) без OFFSET.
     На один ряд — одно изделие; внутри ряда словарь days[YYYY-MM-DD] -> qty (int).
 
     Возвращаемая структура:
@@ -484,9 +761,12 @@ def query_plan_matrix_paginated(
         ...
       ],
       'dates': ['YYYY-MM-DD', ...],           # список дат окна (для построения колонок на UI)
-      'total': int,                           # всего изделий (по таблице items)
+      'total': int | None,                    # всего изделий (None при with_total=False)
       'page': int,
       'page_size': int,
+      'has_next': bool,
+      'has_prev': bool,
+      'next_cursor': str | None,              # курсор следующей страницы (keyset)
     }
     """
     try:
@@ -510,196 +790,125 @@ def query_plan_matrix_paginated(
     ps = max(1, int(page_size or 30))
     offset = (p - 1) * ps
 
+    after = _decode_cursor(cursor)
+    # Без COUNT или по курсору берём одну лишнюю строку — признак следующей страницы
+    probe_next = not with_total or after is not None
+
     params: Dict[str, Any] = {
         "start": start.isoformat(),
         "end": end.isoformat(),
-        "limit": ps,
+        "limit": ps + 1 if probe_next else ps,
         "offset": offset,
     }
-    stage_join_clause = ""
     if stage_id is not None:
-        stage_join_clause = "AND p.stage_id = :stage_id"
         params["stage_id"] = stage_id
-
-    # Порядок сортировки: month_plan агрегат из sums, остальные поля из items (i.*)
-    order_field = 's.month_plan' if sort_by == 'month_plan' else f'i.{sort_by}'
-
-    # БАЗОВЫЙ НАБОР СТРОК — КОРНЕВЫЕ ИЗДЕЛИЯ (как в Excel) И/ИЛИ ИЗДЕЛИЯ С ПЛАНОМ В ОКНЕ
-    # Дополнительно учитываем "динамические корни" на основе BOM: parent, не встречающийся как child.
-    sql_page = f"""
-    WITH sums AS (
-        SELECT
-            p.item_id,
-            COALESCE(SUM(p.planned_qty), 0) AS month_plan
-        FROM production_plan_entries p
-        WHERE p.date >= :start
-          AND p.date <  :end
-          {stage_join_clause}
-        GROUP BY p.item_id
-    ),
-    roots_union AS (
-        SELECT item_id FROM root_products
-        UNION
-        SELECT DISTINCT b.parent_item_id AS item_id
-          FROM bom b
-         WHERE b.parent_item_id NOT IN (SELECT child_item_id FROM bom)
-        UNION
-        SELECT DISTINCT p.item_id
-          FROM production_plan_entries p
-         WHERE p.date >= :start
-           AND p.date <  :end
-           {stage_join_clause}
+    if after is not None:
+        params["after_val"], params["after_id"] = after
+
+    # БАЗОВЫЙ НАБОР СТРОК — КОРНЕВЫЕ ИЗДЕЛИЯ (как в Excel) И/ИЛИ ИЗДЕЛИЯ С ПЛАНОМ В ОКНЕ;
+    # план по дням приходит в том же запросе (длинный формат: изделие × день)
+    has_stage = stage_id is not None
+    pivot_days = horizon_days if horizon_days <= MATRIX_PIVOT_MAX_DAYS else 0
+    sql_page = _sql_matrix_with_days(
+        _sql_matrix_page(has_stage, sort_by, sort_dir, after is not None),
+        f"{_MATRIX_OUTER_SORT_EXPR[sort_by]} {sort_dir}, pg.item_id {sort_dir}",
+        has_stage,
+        pivot_days,
     )
-    SELECT
-        i.item_id,
-        i.item_code,
-        i.item_name,
-        i.item_article,
-        COALESCE(s.month_plan, 0) AS month_plan
-    FROM roots_union r
-    JOIN items i ON i.item_id = r.item_id
-    LEFT JOIN sums s ON s.item_id = i.item_id
-    ORDER BY {order_field} {sort_dir}
-    LIMIT :limit OFFSET :offset
-    """
-
-    # Общее количество — по объединённому множеству изделий
-    sql_total = f"""
-    SELECT COUNT(1) AS cnt
-      FROM (
-        SELECT item_id FROM root_products
-        UNION
-        SELECT DISTINCT b.parent_item_id AS item_id
-          FROM bom b
-         WHERE b.parent_item_id NOT IN (SELECT child_item_id FROM bom)
-        UNION
-        SELECT DISTINCT p.item_id
-          FROM production_plan_entries p
-         WHERE p.date >= :start
-           AND p.date <  :end
-           {stage_join_clause}
-      ) AS roots_union
-    """
 
-    with _conn(db_path) as conn:
-        page_rows = conn.execute(sql_page, params).fetchall()
-        total = int(conn.execute(sql_total, params).fetchone()["cnt"])
+    with _read_conn(db_path) as conn:
+        # Множество строк не зависит от страницы — считается один раз на окно и переиспользуется при листании
+        roots = _roots_union_ids(conn, db_path, params, has_stage)
+        params["roots"] = json.dumps(roots)
+        long_rows = conn.execute(sql_page, params).fetchall() if roots else []
+        total = len(roots) if with_total else None
+        empty = not roots
 
         # Fallback: если в окне дат нет ни одной записи плана, показываем корневые изделия (как в Excel)
-        if total == 0:
+        if empty:
             # total по корневым изделиям
-            total_row = conn.execute(
-                """
-                SELECT COUNT(1) AS cnt
-                  FROM root_products rp
-                  JOIN items i ON i.item_id = rp.item_id
-                """
-            ).fetchone()
-            total = int(total_row["cnt"]) if total_row and "cnt" in total_row.keys() else 0
-
-            if total > 0:
-                page_rows = conn.execute(
-                    """
-                    SELECT i.item_id, i.item_code, i.item_name, i.item_article, 0.0 AS month_plan
-                      FROM root_products rp
-                      JOIN items i ON i.item_id = rp.item_id
-                     ORDER BY i.item_name
-                     LIMIT :limit OFFSET :offset
-                    """,
-                    {"limit": params["limit"], "offset": params["offset"]},
+            if with_total:
+                total_row = conn.execute(_SQL_ROOTS_COUNT).fetchone()
+                total = int(total_row[0]) if total_row else 0
+
+            if total is None or total > 0:
+                long_rows = conn.execute(
+                    _sql_matrix_with_days(_SQL_ROOTS_PAGE, "pg.item_name, pg.item_id", has_stage, pivot_days),
+                    params,
                 ).fetchall()
 
     # Список дат окна (ISO)
     date_list = [(start + timedelta(days=k)).isoformat() for k in range(horizon_days)]
 
-    if not page_rows:
+    # Строки страницы в порядке выдачи: item_id -> (item_code, item_name, item_article, month_plan, days)
+    page_rows: Dict[int, Any] = {}
+    if pivot_days:
+        # Сводная форма: (item_id, item_code, item_name, item_article, month_plan, d0, d1, ...)
+        for iid, code, name, article, plan, *vals in long_rows:
+            days_row = dict(zip(date_list, [int(round(v)) if v else 0 for v in vals]))
+            page_rows[iid] = (code, name, article, plan, days_row)
+    else:
+        # Длинный формат: (item_id, item_code, item_name, item_article, month_plan, date, qty);
+        # нули по всем дням окна один раз, поверх — дни с планом
+        empty_days = dict.fromkeys(date_list, 0)
+        days_map: Dict[int, Dict[str, int]] = {}
+        for iid, code, name, article, plan, ds, qty in long_rows:
+            if iid not in page_rows:
+                days_map[iid] = {}
+                page_rows[iid] = (code, name, article, plan, days_map[iid])
+            if ds is not None:
+                days_map[iid][str(ds)] = int(round(float(qty or 0.0)))
+        for iid, d in days_map.items():
+            page_rows[iid] = (*page_rows[iid][:4], empty_days | d)
+
+    if probe_next and not empty:
+        has_next = len(page_rows) > ps
+    elif with_total:
+        has_next = p * ps < total
+    else:
+        has_next = len(page_rows) > ps
+    page_items = list(page_rows.items())[:ps]
+
+    if not page_items:
         return {
             "rows": [],
             "dates": date_list,
             "total": total,
             "page": p,
             "page_size": ps,
+            "has_next": False,
+            "has_prev": p > 1,
+            "next_cursor": None,
         }
 
-    # Собираем item_ids страницы
-    item_ids = [int(r["item_id"]) for r in page_rows]
-
-    # Загружаем план по дням только для item_ids страницы
-    placeholders = ", ".join(["?"] * len(item_ids))
-    params_days: Dict[str, Any] = {"start": start.isoformat(), "end": end.isoformat()}
-    stage_where_clause = ""
-    if stage_id is not None:
-        stage_where_clause = "AND stage_id = :stage_id"
-        params_days["stage_id"] = stage_id
-
-    sql_days = f"""
-    SELECT item_id, date, COALESCE(SUM(planned_qty), 0) AS qty
-      FROM production_plan_entries
-     WHERE item_id IN ({placeholders})
-       AND date >= :start
-       AND date <  :end
-       {stage_where_clause}
-     GROUP BY item_id, date
-    """
-
-    # В sqlite параметров два вида: позиционные ? и именованные :name; смешивать нельзя.
-    # Поэтому выполняем через execute с tuple для ? и затем привяжем именованные вручную.
-    # Упростим: построим временный SQL с подстановкой ? и выполним через два вызова.
-    # 1) Сначала формируем базовый кортеж параметров: (item_ids...,)
-    # 2) Затем используем conn.execute с dict-like, но sqlite3 не поддерживает комбинирование.
-    # Решение: сформировать весь SQL через ? без именованных для start/end, передав полный кортеж.
-    # Для надёжности создадим альтернативную версию запроса с позиционными параметрами.
-    params_pos = list(item_ids) + [params_days["start"], params_days["end"]]
-    if stage_id is not None:
-        sql_days_pos = f"""
-        SELECT item_id, date, COALESCE(SUM(planned_qty), 0) AS qty
-          FROM production_plan_entries
-         WHERE item_id IN ({placeholders})
-           AND date >= ?
-           AND date <  ?
-           AND stage_id = ?
-         GROUP BY item_id, date
-        """
-        params_pos.append(stage_id)
-    else:
-        sql_days_pos = f"""
-        SELECT item_id, date, COALESCE(SUM(planned_qty), 0) AS qty
-          FROM production_plan_entries
-         WHERE item_id IN ({placeholders})
-           AND date >= ?
-           AND date <  ?
-         GROUP BY item_id, date
-        """
-
-    days_map: Dict[int, Dict[str, int]] = {iid: {} for iid in item_ids}
-    with _conn(db_path) as conn:
-        for r in conn.execute(sql_days_pos, tuple(params_pos)).fetchall():
-            iid = int(r["item_id"])
-            ds = str(r["date"])
-            q = int(round(float(r["qty"] or 0.0)))
-            if iid in days_map:
-                days_map[iid][ds] = q
-
     # Собираем результатные строки
     result_rows: List[Dict[str, Any]] = []
-    for r in page_rows:
-        iid = int(r["item_id"])
-        row_days = {d: int(days_map.get(iid, {}).get(d, 0)) for d in date_list}
+    for iid, (code, name, article, plan, days_row) in page_items:
         result_rows.append({
-            "item_id": iid,
-            "item_code": str(r["item_code"]),
-            "item_name": str(r["item_name"]),
-            "item_article": str(r["item_article"]) if r["item_article"] is not None else None,
-            "month_plan": float(r["month_plan"] or 0.0),
-            "days": row_days,
+            "item_id": int(iid),
+            "item_code": str(code),
+            "item_name": str(name),
+            "item_article": str(article) if article is not None else None,
+            "month_plan": float(plan or 0.0),
+            "days": days_row,
         })
 
+    # Курсор только для основного набора: fallback по корневым изделиям листается страницами
+    next_cursor = None
+    if has_next and not empty:
+        last = result_rows[-1]
+        sort_value = last[sort_by] if sort_by != 'item_article' else (last['item_article'] or '')
+        next_cursor = _encode_cursor(sort_value, last['item_id'])
+
     return {
         "rows": result_rows,
         "dates": date_list,
         "total": total,
         "page": p,
         "page_size": ps,
+        "has_next": has_next,
+        "has_prev": p > 1,
+        "next_cursor": next_cursor,
     }
 
 # --- Удаление строк плана для изделия в пределах окна дат ---
@@ -744,4 +953,5 @@ def delete_plan_rows_for_item(
                 (int(item_id), int(stage_id), start.isoformat(), end.isoformat()),
             )
         conn.commit()
-        return int(cur.rowcount or 0)
+    invalidate_roots_cache()
+    return int(cur.rowcount or 0)
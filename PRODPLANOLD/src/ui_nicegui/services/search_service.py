@@ -4,6 +4,7 @@ from __future__ import annotations
 from typing import List, Dict, Any, Optional, Tuple
 from pathlib import Path
 import json
+import heapq
 from src.database import get_connection
 
 # Локальные утилиты нормализации (без зависимости от Streamlit UI)
@@ -144,8 +145,6 @@ def _load_index_items(path: Path) -> List[Dict[str, Any]]:
     Поля записи: Code|item_code|code, Description|item_name|name, Артикул|item_article|article
     """
     try:
-        if not path.exists():
-            return []
         raw = path.read_bytes()
         data = None
         # пробуем UTF-8
@@ -184,39 +183,68 @@ def _load_index_items(path: Path) -> List[Dict[str, Any]]:
     except Exception:
         return []
 
-def _rank_index(query: str, items: List[Dict[str, Any]], limit: int = 20) -> List[Dict[str, Any]]:
+# Локальный индекс номенклатуры (выгрузка 1С) для семантического фолбэка поиска
+NOMENCLATURE_INDEX_PATH = Path('output') / 'nomenclature_index.json'
+
+# Разобранный локальный индекс с предвычисленными ключами сравнения; инвалидация по (mtime, size) файла
+_INDEX_CACHE: Dict[str, Any] = {'key': None, 'entries': []}
+
+
+def _index_entries(path: Path) -> List[Tuple]:
+    """
+    Записи индекса в виде кортежей (item, n_low, c_low, a_low, c_norm, a_norm).
+    Файл читается и нормализуется один раз, а не на каждый поисковый запрос.
+    """
+    try:
+        st = path.stat()
+    except OSError:
+        return []
+    key = (str(path), st.st_mtime_ns, st.st_size)
+    if _INDEX_CACHE['key'] != key:
+        entries = []
+        for it in _load_index_items(path):
+            code = str(it.get('item_code') or '')
+            article = str(it.get('item_article') or '')
+            entries.append((
+                it,
+                str(it.get('item_name') or '').lower(),
+                code.lower(),
+                article.lower(),
+                _normalize_for_match(code),
+                _normalize_for_match(article),
+            ))
+        _INDEX_CACHE['key'] = key
+        _INDEX_CACHE['entries'] = entries
+    return _INDEX_CACHE['entries']
+
+def _rank_index(query: str, entries: List[Tuple], limit: int = 20) -> List[Dict[str, Any]]:
     q = (query or '').strip()
     if len(q) < 2:
         return []
     q_low = q.lower()
     q_norm = _normalize_for_match(q)
-    def _score(rec: Dict[str, Any]) -> int:
-        name = str(rec.get("item_name") or "")
-        code = str(rec.get("item_code") or "")
-        article = str(rec.get("item_article") or "")
+    def _sort_key(e: Tuple) -> Tuple:
+        it, n_low, c_low, a_low, c_norm, a_norm = e
         score = 0
-        a_low = article.lower()
-        c_low = code.lower()
-        n_low = name.lower()
-        a_norm = _normalize_for_match(article)
-        c_norm = _normalize_for_match(code)
-        if article and (a_low == q_low or a_norm == q_norm):
+        if a_low and (a_low == q_low or a_norm == q_norm):
             score += 100
-        if code and (c_low == q_low or c_norm == q_norm):
+        if c_low and (c_low == q_low or c_norm == q_norm):
             score += 90
-        if article and (q_low in a_low or q_norm in a_norm):
+        if a_low and (q_low in a_low or q_norm in a_norm):
             score += 60
-        if code and (q_low in c_low or q_norm in c_norm):
+        if c_low and (q_low in c_low or q_norm in c_norm):
             score += 50
-        if name and (q_low in n_low):
+        if n_low and (q_low in n_low):
             score += 30
-        if article:
+        if a_low:
             score += 5
-        return score
-    arr = [it for it in items]
-    arr.sort(key=lambda x: (-_score(x), x.get('item_name') or '', x.get('item_code') or ''))
+        return (-score, it.get('item_name') or '', it.get('item_code') or '')
+    # Частичная сортировка: нужны только первые limit записей (O(N log limit) вместо полной сортировки).
+    # Подсчёт очков остаётся на Python (numba в проекте нет): основное время уходило не на него,
+    # а на повторное чтение индекса, которое снимает _index_entries()
+    top = heapq.nsmallest(max(1, int(limit)), entries, key=_sort_key)
     # Возвращаем только поля item_name/item_code/item_article (без item_id — его найдём по БД при добавлении)
-    return arr[: max(1, int(limit))]
+    return [e[0] for e in top]
 
 def search_items_with_index(query: str, limit: int = 10, db_path=None) -> List[Dict[str, Any]]:
     """
@@ -232,9 +260,8 @@ def search_items_with_index(query: str, limit: int = 10, db_path=None) -> List[D
         return primary
 
     # 2) Локальный индекс
-    index_path = Path('output') / 'nomenclature_index.json'
-    idx_items = _load_index_items(index_path)
-    ranked = _rank_index(query, idx_items, limit=limit * 3)  # возьмём больше для объединения
+    index_path = NOMENCLATURE_INDEX_PATH
+    ranked = _rank_index(query, _index_entries(index_path), limit=limit * 3)  # возьмём больше для объединения
 
     # Объединение и дедупликация по item_code
     by_code: Dict[str, Dict[str, Any]] = {}
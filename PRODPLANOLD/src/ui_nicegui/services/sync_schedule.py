@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+"""
+Расписание автосинхронизации номенклатуры: разбор настроек и решение о запуске (без I/O).
+Файлы конфигурации и отметки последней синхронизации читает app.py.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime, time as dt_time
+from typing import Any, Dict, Optional
+
+
+@dataclass(frozen=True, slots=True)
+class ScheduleCfg:
+    interval_s: int
+    start_time: dt_time
+
+
+def parse_schedule_cfg(sync_cfg: Dict[str, Any]) -> ScheduleCfg:
+    """Настройки из config/nomenclature_sync_config.json: start_time 'HH:MM' и interval_hours (не меньше 1)."""
+    try:
+        start_time = datetime.strptime(str(sync_cfg.get('start_time', '09:00')), '%H:%M').time()
+    except ValueError:
+        start_time = dt_time(9, 0)  # По умолчанию 09:00
+    return ScheduleCfg(max(1, int(sync_cfg.get('interval_hours', 1))) * 3600, start_time)
+
+
+def should_run(now: datetime, last_sync: Optional[datetime], cfg: ScheduleCfg) -> bool:
+    """
+    Нужно ли запускать синхронизацию:
+    - сегодня синхронизации не было — как только наступило start_time;
+    - была — когда с последней прошло interval.
+    """
+    if last_sync is None or last_sync.date() != now.date():
+        return now.time() >= cfg.start_time
+    return (now - last_sync).total_seconds() >= cfg.interval_s
@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from src.database import get_connection, init_database
+from src.ui_nicegui.services import plan_service
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    """Временная БД со схемой проекта: 7 изделий (повторяющиеся названия, часть без артикула), изделие 1 — корневое."""
+    path = tmp_path / 'plan.db'
+    init_database(path)
+    with get_connection(path) as conn:
+        for k in range(7):
+            conn.execute(
+                "INSERT INTO items(item_code, item_name, item_article) VALUES (?, ?, ?)",
+                (f'C{k}', f'Изделие {k % 3}', None if k % 2 else f'A{k}'),
+            )
+        conn.execute("INSERT INTO root_products(item_id) VALUES (1)")
+        conn.commit()
+    plan_service.invalidate_roots_cache()
+    return path
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+import logging
+import sqlite3
+
+import pytest
+
+from src.database import _ensure_plan_entries_key, get_connection
+from src.ui_nicegui.services import plan_service
+
+
+def _plan_rows(db_path):
+    with get_connection(db_path) as conn:
+        return conn.execute(
+            "SELECT item_id, stage_id, date, planned_qty FROM production_plan_entries ORDER BY item_id, date"
+        ).fetchall()
+
+
+@pytest.mark.parametrize('with_index', [True, False])
+def test_bulk_upsert_without_stage_keeps_one_row_per_key(db_path, with_index):
+    if not with_index:
+        # Старая БД без уникального ключа: путь UPDATE + INSERT недостающих
+        with get_connection(db_path) as conn:
+            conn.execute("DROP INDEX ux_plan_item_stagekey_date")
+            conn.commit()
+    entries = [
+        {'item_id': 2, 'date': '2026-01-02', 'qty': 4},
+        {'item_id': 2, 'date': '2026-01-02', 'qty': 7},  # повтор ключа в одной порции
+        {'item_id': 3, 'date': '2026-01-02', 'qty': 1, 'stage_id': None},
+    ]
+    assert plan_service.bulk_upsert_plan_entries(entries, db_path=db_path) == 2
+    assert plan_service.bulk_upsert_plan_entries([{'item_id': 3, 'date': '2026-01-02', 'qty': 5}], db_path=db_path) == 1
+    assert [tuple(r) for r in _plan_rows(db_path)] == [
+        (2, None, '2026-01-02', 7.0),
+        (3, None, '2026-01-02', 5.0),
+    ]
+
+
+def test_bulk_upsert_is_all_or_nothing(db_path):
+    entries = [
+        {'item_id': 2, 'date': '2026-01-02', 'qty': 4},
+        {'item_id': 999, 'date': '2026-01-02', 'qty': 4},  # нет такого изделия: нарушение FK
+    ]
+    with pytest.raises(sqlite3.IntegrityError):
+        plan_service.bulk_upsert_plan_entries(entries, db_path=db_path)
+    assert _plan_rows(db_path) == []
+
+
+def test_plan_key_migration_merges_duplicates_once(db_path, caplog):
+    with get_connection(db_path) as conn:
+        conn.execute("DROP INDEX ux_plan_item_stagekey_date")
+        conn.execute("PRAGMA user_version = 0")
+        conn.executemany(
+            "INSERT INTO production_plan_entries(item_id, stage_id, date, planned_qty) VALUES (?, NULL, ?, ?)",
+            [(2, '2026-01-02', 1), (2, '2026-01-02', 3), (3, '2026-01-02', 2)],
+        )
+        conn.commit()
+        with caplog.at_level(logging.WARNING, logger='prodplan.db'):
+            _ensure_plan_entries_key(conn)
+            _ensure_plan_entries_key(conn)
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == 1
+    assert len([r for r in caplog.records if r.name == 'prodplan.db']) == 1
+    assert [tuple(r) for r in _plan_rows(db_path)] == [
+        (2, None, '2026-01-02', 3.0),
+        (3, None, '2026-01-02', 2.0),
+    ]
+
+
+def _matrix_ids(db_path, **kwargs):
+    return [r['item_id'] for r in plan_service.query_plan_matrix_paginated('2026-01-01', 10, db_path=db_path, **kwargs)['rows']]
+
+
+@pytest.mark.parametrize('sort_by', ['item_name', 'item_code', 'item_article', 'month_plan'])
+@pytest.mark.parametrize('sort_dir', ['asc', 'desc'])
+def test_matrix_cursor_pages_match_offset_pages(db_path, sort_by, sort_dir):
+    # Одинаковые названия и объёмы: порядок внутри равных значений держит item_id
+    plan_service.bulk_upsert_plan_entries(
+        [{'item_id': iid, 'date': '2026-01-03', 'qty': iid % 2 + 1} for iid in range(1, 8)],
+        db_path=db_path,
+    )
+    order = dict(sort_by=sort_by, sort_dir=sort_dir, page_size=3)
+    expected = [_matrix_ids(db_path, page=p, **order) for p in (1, 2, 3)]
+    assert sorted(sum(expected, [])) == list(range(1, 8))
+
+    pages, cursor = [], None
+    for p in (1, 2, 3):
+        res = plan_service.query_plan_matrix_paginated(
+            '2026-01-01', 10, db_path=db_path, page=p, cursor=cursor, with_total=cursor is None, **order
+        )
+        pages.append([r['item_id'] for r in res['rows']])
+        cursor = res['next_cursor']
+    assert pages == expected
+    assert cursor is None  # последняя страница
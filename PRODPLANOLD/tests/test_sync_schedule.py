@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+from datetime import datetime, time, timedelta
+
+from src.ui_nicegui.services.sync_schedule import ScheduleCfg, parse_schedule_cfg, should_run
+
+CFG = ScheduleCfg(interval_s=2 * 3600, start_time=time(9, 0))
+
+
+def test_first_run_of_the_day_waits_for_start_time():
+    assert not should_run(datetime(2026, 3, 2, 8, 59, 59), None, CFG)
+    assert should_run(datetime(2026, 3, 2, 9, 0), None, CFG)
+
+
+def test_sync_yesterday_counts_as_no_sync_today():
+    last = datetime(2026, 3, 1, 23, 30)
+    assert not should_run(datetime(2026, 3, 2, 0, 30), last, CFG)
+    assert should_run(datetime(2026, 3, 2, 9, 0), last, CFG)
+
+
+def test_interval_boundary():
+    last = datetime(2026, 3, 2, 9, 0)
+    assert not should_run(last + timedelta(hours=2, seconds=-1), last, CFG)
+    assert should_run(last + timedelta(hours=2), last, CFG)
+
+
+def test_parse_schedule_cfg_defaults_and_minimum_interval():
+    assert parse_schedule_cfg({}) == ScheduleCfg(3600, time(9, 0))
+    assert parse_schedule_cfg({'start_time': '25:99', 'interval_hours': 0}) == ScheduleCfg(3600, time(9, 0))
+    assert parse_schedule_cfg({'start_time': '07:30', 'interval_hours': 6}) == ScheduleCfg(6 * 3600, time(7, 30))